@@ -1,36 +1,41 @@
 """
 Sistema de autenticação com JWT e bcrypt.
 Inclui rate limiting e validação de senhas fortes.
+O bcrypt roda no executor dedicado de app/utils/password_hasher.py;
+sessões são renovadas por refresh tokens rotacionados (tabela refresh_tokens).
 """
 
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+import hashlib
 import re
+import secrets
+import uuid
 
 from app.config import settings
-from app.database import get_db
+from app.database import AsyncSessionLocal, get_db
 from app import models
-
-# Configuração de hash de senhas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.utils.password_hasher import PasswordHasherBusy, password_hasher, pwd_context
+from app.utils.principal_cache import Principal, principal_cache
 
 # OAuth2 scheme para autenticação
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/admin/auth/login")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifica se a senha corresponde ao hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verifica se a senha corresponde ao hash (executor dedicado; bloqueia a thread atual)"""
+    return password_hasher.verify_sync(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """Gera hash bcrypt da senha"""
-    return pwd_context.hash(password)
+    """Gera hash bcrypt da senha (executor dedicado; bloqueia a thread atual)"""
+    return password_hasher.hash_sync(password)
 
 
 def validate_password_strength(password: str) -> tuple[bool, str]:
@@ -73,35 +78,197 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[models.User]:
+def create_user_token(user: models.User) -> str:
+    """
+    Token de acesso do usuário, com a versão atual (claim "ver").
+    """
+    return create_access_token(data={"sub": user.email, "ver": user.token_version or 0})
+
+
+def revoke_user_tokens(user: models.User):
+    """
+    Revoga os tokens já emitidos, de acesso e refresh (incrementa
+    token_version). Não faz commit; depois do commit, chame
+    principal_cache.invalidate(user.email).
+    """
+    user.token_version = (user.token_version or 0) + 1
+
+
+def _refresh_token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_refresh_token(db, user: models.User, family_id: Optional[str] = None) -> str:
+    """
+    Emite um refresh token (nova família = novo login). Só faz db.add:
+    serve para Session e AsyncSession; o chamador faz o commit.
+    Retorna o valor opaco (não fica no banco).
+    """
+    token = secrets.token_urlsafe(32)
+    db.add(models.RefreshToken(
+        user_id=user.id,
+        token_hash=_refresh_token_hash(token),
+        family_id=family_id or uuid.uuid4().hex,
+        token_version=user.token_version or 0,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.refresh_token_expire_days)
+    ))
+    return token
+
+
+def token_response(user: models.User, refresh_token: str) -> dict:
+    """Corpo de TokenResponse (login, refresh e troca de senha)."""
+    return {
+        "access_token": create_user_token(user),
+        "refresh_token": refresh_token,
+        "token_type": "bearer"
+    }
+
+
+async def _revoke_family(db: AsyncSession, family_id: str, now: datetime):
+    await db.execute(
+        update(models.RefreshToken).where(
+            models.RefreshToken.family_id == family_id,
+            models.RefreshToken.revoked_at.is_(None)
+        ).values(revoked_at=now)
+    )
+
+
+async def rotate_refresh_token(db: AsyncSession, token: str) -> Tuple[models.User, str]:
+    """
+    Troca um refresh token válido por outro da mesma família (faz commit).
+    Token já usado/revogado, expirado, de usuário inativo ou anterior à
+    última troca de senha: 401 (reuso e usuário inválido revogam a família).
+    """
+    credentials_exception = _credentials_exception()
+    now = datetime.now(timezone.utc)
+
+    row = (await db.execute(
+        select(models.RefreshToken).where(models.RefreshToken.token_hash == _refresh_token_hash(token))
+    )).scalar_one_or_none()
+
+    if row is None:
+        raise credentials_exception
+
+    # SQLite devolve datetimes sem fuso
+    expires_at = row.expires_at if row.expires_at.tzinfo else row.expires_at.replace(tzinfo=timezone.utc)
+    if row.revoked_at is not None or expires_at <= now:
+        if row.revoked_at is not None:
+            # Token já rotacionado reapresentado: quem tem a família não é confiável
+            await _revoke_family(db, row.family_id, now)
+            await db.commit()
+        raise credentials_exception
+
+    user = await db.get(models.User, row.user_id)
+    if user is None or not user.is_active or row.token_version != (user.token_version or 0):
+        await _revoke_family(db, row.family_id, now)
+        await db.commit()
+        raise credentials_exception
+
+    # Condicional: de dois refresh simultâneos com o mesmo token, só um vence
+    result = await db.execute(
+        update(models.RefreshToken).where(
+            models.RefreshToken.id == row.id,
+            models.RefreshToken.revoked_at.is_(None)
+        ).values(revoked_at=now)
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        await _revoke_family(db, row.family_id, now)
+        await db.commit()
+        raise credentials_exception
+
+    new_token = issue_refresh_token(db, user, row.family_id)
+    await db.commit()
+    return user, new_token
+
+
+async def revoke_refresh_token(db: AsyncSession, token: str):
+    """Logout: revoga a família do token (demais sessões do usuário continuam). Faz commit."""
+    row = (await db.execute(
+        select(models.RefreshToken.family_id).where(
+            models.RefreshToken.token_hash == _refresh_token_hash(token)
+        )
+    )).first()
+
+    if row is not None:
+        await _revoke_family(db, row.family_id, datetime.now(timezone.utc))
+        await db.commit()
+
+
+def purge_refresh_tokens(db: Session) -> int:
+    """Apaga refresh tokens expirados (chamado pelo worker). Não faz commit."""
+    result = db.execute(
+        delete(models.RefreshToken).where(
+            models.RefreshToken.expires_at < datetime.now(timezone.utc)
+        )
+    )
+    return result.rowcount
+
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[models.User]:
     """
     Autentica usuário por email e senha.
     Retorna User se válido, None caso contrário.
+    O bcrypt roda no executor dedicado: não ocupa o event loop nem o
+    threadpool das rotas (PasswordHasherBusy se a fila estiver cheia).
     """
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = (await db.execute(
+        select(models.User).where(models.User.email == email)
+    )).scalar_one_or_none()
 
     if not user:
         return None
 
-    if not verify_password(password, user.hashed_password):
+    if not await password_hasher.verify(password, user.hashed_password):
         return None
 
     return user
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> models.User:
-    """
-    Dependency para obter usuário autenticado pelo token JWT.
-    """
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar credenciais",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+async def _load_principal(email: str) -> Optional[Principal]:
+    """Lê só as colunas do Principal (engine assíncrono, sessão própria)."""
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(
+                models.User.id,
+                models.User.email,
+                models.User.is_admin,
+                models.User.is_active,
+                models.User.token_version
+            ).where(models.User.email == email)
+        )).first()
+
+    if row is None:
+        return None
+    return Principal(
+        id=row.id,
+        email=row.email,
+        is_admin=bool(row.is_admin),
+        is_active=bool(row.is_active),
+        token_version=row.token_version or 0
+    )
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme)
+) -> Principal:
+    """
+    Dependency para obter o usuário autenticado pelo token JWT.
+    Retorna um Principal (id, email, is_admin, is_active, token_version) do
+    cache por processo (app/utils/principal_cache.py); só consulta o banco
+    quando a entrada não existe ou expirou. Rotas que leem ou alteram o
+    perfil carregam o User com load_user(db, current_user).
+    """
+    credentials_exception = _credentials_exception()
+
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         email: str = payload.get("sub")
@@ -112,20 +279,38 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.email == email).first()
+    principal, generation = principal_cache.get(email)
+    if principal is None:
+        principal = await _load_principal(email)
+        if principal is None:
+            raise credentials_exception
+        principal_cache.put(email, principal, generation)
 
-    if user is None:
+    # Tokens sem "ver" são anteriores à coluna token_version (versão 0)
+    if payload.get("ver", 0) != principal.token_version:
         raise credentials_exception
 
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(status_code=400, detail="Usuário inativo")
 
+    return principal
+
+
+def load_user(db: Session, principal: Principal) -> models.User:
+    """
+    User completo do principal na sessão síncrona da rota.
+    """
+    user = db.get(models.User, principal.id)
+
+    if user is None:
+        raise _credentials_exception()
+
     return user
 
 
 async def get_current_admin(
-    current_user: models.User = Depends(get_current_user)
-) -> models.User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """
     Dependency para validar que o usuário é admin.
     """
@@ -23,6 +23,8 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    refresh_token_expire_days: int = 14  # Validade de cada refresh token (renovado a cada uso)
+    refresh_token_purge_interval: int = 3600  # Segundos entre limpezas dos expirados feitas pelo worker
 
     # CORS - Aceita string com vírgulas ou lista
     # Inclui localhost para desenvolvimento
@@ -33,6 +35,77 @@ class Settings(BaseSettings):
     upload_dir: str = "uploads"
     allowed_extensions: List[str] = ["xml", "pdf"]
 
+    # Armazenamento dos arquivos (endereçado por SHA-256, ver app/utils/file_store.py)
+    file_store_backend: str = "local"  # local | s3
+    file_store_dir: str = ""  # Backend local. Vazio = {upload_dir}/store
+    file_store_s3_bucket: str = ""
+    file_store_s3_prefix: str = "files"
+    file_store_s3_endpoint_url: str = ""  # S3 compatível (ex: MinIO). Vazio = AWS
+    file_store_s3_region: str = ""
+    file_store_staging_max_age: int = 3600  # Validade do preview até a confirmação (segundos)
+    file_store_gc_grace_seconds: int = 24 * 3600  # Arquivos sem referência há mais que isso são apagados
+    file_store_gc_interval: int = 3600  # Segundos entre limpezas feitas pelo worker
+    file_store_compression: str = "zstd"  # zstd | gzip | none (XMLs gravados comprimidos)
+    file_store_compression_level: int = 0  # 0 = padrão do codec (zstd 3, gzip 6)
+
+    # Dashboard admin: contadores em stat_counters (ver app/utils/dashboard_stats.py)
+    stats_cache_ttl: float = 15.0  # Segundos que cada processo reaproveita os contadores lidos
+    stats_reconcile_interval: int = 3600  # Segundos entre reconstruções feitas pelo worker
+
+    # Parsing de NF-e em lote (pool de processos)
+    parse_pool_workers: int = 0  # 0 = número de CPUs da máquina
+    parse_pool_min_batch: int = 8  # Lotes menores são processados em série
+    xml_streaming_threshold: int = 1024 * 1024  # XMLs a partir deste tamanho usam iterparse
+    upload_pool_threshold: int = 256 * 1024  # Uploads a partir deste tamanho (e PDFs) são parseados no pool
+
+    # Upload em lote (ZIP)
+    batch_max_upload_size: int = 200 * 1024 * 1024  # 200MB (ZIP compactado)
+    batch_max_files: int = 5000  # Arquivos por ZIP
+    batch_max_total_size: int = 1024 * 1024 * 1024  # 1GB descompactado no total
+    batch_max_compression_ratio: int = 100  # Proteção contra zip bomb
+
+    # Cache de parsing (chave = SHA-256 do arquivo + versão do parser)
+    parse_cache_enabled: bool = True
+    parse_cache_max_entries: int = 512  # Entradas no LRU em memória (por processo)
+    parse_cache_disk: bool = True  # Nível em disco compartilhado entre processos
+    parse_cache_dir: str = ""  # Vazio = {upload_dir}/.cache
+    parse_cache_disk_max_bytes: int = 1024 * 1024 * 1024  # Tamanho máximo do nível em disco (0 = sem limite)
+    parse_cache_disk_max_age: int = 30 * 24 * 3600  # Entradas sem uso há mais que isso são apagadas (0 = sem limite)
+
+    # Importação do catálogo (CSV/XLSX)
+    catalog_import_max_size: int = 20 * 1024 * 1024  # 20MB
+    catalog_import_max_rows: int = 50000  # Linhas por arquivo
+
+    # Cache dos usuários autenticados (ver app/utils/principal_cache.py)
+    auth_cache_ttl: float = 30.0  # Segundos que cada processo reaproveita o usuário do token (0 = desligado)
+    auth_cache_max_entries: int = 10000  # Usuários mantidos em memória (por processo)
+
+    # Executor do bcrypt (ver app/utils/password_hasher.py)
+    password_hash_workers: int = 2  # Threads dedicadas a hash/verificação de senha (por processo)
+    password_hash_max_queue: int = 64  # Operações aguardando; acima disso, 503
+
+    # Cache do catálogo (snapshot por usuário, invalidado por users.catalog_version)
+    catalog_cache_max_entries: int = 256  # Usuários mantidos em memória (por processo)
+
+    # Cache de relatórios (chave = usuário, período, catalog_version e digest dos uploads)
+    report_cache_max_entries: int = 256  # Pares (usuário, período) em memória (por processo)
+
+    # Pool do engine assíncrono (asyncpg), usado pelas rotas async e pela autenticação
+    async_db_pool_size: int = 10
+    async_db_max_overflow: int = 20
+
+    # Threadpool das rotas síncronas (def) e monitor de atraso do event loop
+    threadpool_size: int = 40  # Requisições bloqueantes simultâneas por processo
+    event_loop_lag_interval: float = 0.25  # Segundos entre amostras
+    event_loop_lag_warn_ms: int = 250  # Atraso acima disso gera warning no log
+
+    # Fila de jobs (tabela jobs, executados por python -m app.worker)
+    job_max_attempts: int = 3
+    job_retry_base_seconds: int = 30  # Backoff exponencial: base * 2^(tentativa - 1)
+    job_retry_max_seconds: int = 3600
+    job_lease_seconds: int = 300  # Sem heartbeat por esse tempo = worker morto, job volta à fila
+    job_poll_interval: float = 2.0  # Segundos entre consultas quando a fila está vazia
+
     # Azure
     websites_port: int = 8000
 
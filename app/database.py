@@ -1,10 +1,17 @@
 """
 Configuração do banco de dados SQLAlchemy.
 Setup simples e direto com session factory.
+
+Dois engines para o mesmo banco:
+- síncrono (psycopg2/sqlite3): rotas def, worker e scripts (get_db);
+- assíncrono (asyncpg/aiosqlite): rotas async de leitura e autenticação
+  (get_async_db), sem ocupar threads do threadpool esperando o banco.
 """
 
 import logging
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
@@ -41,6 +48,56 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+
+def get_async_database_url(database_url: str) -> URL:
+    """
+    URL equivalente com driver assíncrono:
+    postgresql[+psycopg2] -> postgresql+asyncpg, sqlite -> sqlite+aiosqlite.
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+
+    if backend == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+
+    if backend == "postgresql":
+        # asyncpg não conhece sslmode (libpq); o equivalente é ssl
+        query = dict(url.query)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        return url.set(drivername="postgresql+asyncpg", query=query)
+
+    raise ValueError(f"Banco sem driver assíncrono configurado: {backend}")
+
+
+# Engine assíncrono (mesmo banco, pool próprio)
+try:
+    _async_url = get_async_database_url(settings.database_url)
+    if _async_url.get_backend_name() == "sqlite":
+        async_engine = create_async_engine(_async_url)
+    else:
+        async_engine = create_async_engine(
+            _async_url,
+            pool_pre_ping=True,
+            pool_size=settings.async_db_pool_size,
+            max_overflow=settings.async_db_max_overflow,
+            pool_recycle=300,
+            pool_timeout=30,
+            echo=False,
+        )
+    logger.info("✓ Async database engine created successfully")
+except Exception as e:
+    logger.error(f"❌ Failed to create async database engine: {e}")
+    raise
+
+# Objetos continuam utilizáveis após o commit (não há lazy load em AsyncSession)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base para models
 Base = declarative_base()
 
@@ -57,6 +114,20 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Dependency para obter sessão assíncrona do banco.
+    Uso: db: AsyncSession = Depends(get_async_db)
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    """Fecha as conexões do pool assíncrono (shutdown do app)."""
+    await async_engine.dispose()
+
+
 def init_db():
     """
     Inicializa o banco de dados (cria tabelas).
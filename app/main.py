@@ -9,15 +9,19 @@ from pathlib import Path
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from app.config import settings
-from app.database import init_db
+from app.database import dispose_async_engine, init_db
 from app.routers import admin, user
+from app.utils.batch_parser import shutdown_parse_pool
+from app.utils.event_loop import configure_threadpool, lag_monitor
+from app.utils.password_hasher import PasswordHasherBusy, password_hasher
+from app.utils.pagination import NEXT_CURSOR_HEADER
 
 # Configurar logging
 logging.basicConfig(
@@ -43,6 +47,16 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    """Fila do bcrypt cheia (pico de logins): o cliente tenta de novo em instantes."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Servidor ocupado, tente novamente em instantes"},
+        headers={"Retry-After": "1"}
+    )
+
 # CORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -50,6 +64,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],  # Cursor da próxima página das listagens
 )
 
 
@@ -127,6 +142,10 @@ async def startup_event():
     logger.info(f"🚀 Starting {settings.app_name} v{settings.app_version}")
     logger.info(f"Debug mode: {settings.debug}")
 
+    # Rotas síncronas rodam no threadpool; o monitor mede o atraso do loop
+    configure_threadpool()
+    lag_monitor.start()
+
     # Tentar inicializar DB (não-bloqueante)
     try:
         logger.info("Initializing database...")
@@ -146,6 +165,10 @@ async def startup_event():
 async def shutdown_event():
     """Cleanup ao desligar app"""
     logger.info("Shutting down application...")
+    await lag_monitor.stop()
+    await dispose_async_engine()
+    shutdown_parse_pool()
+    password_hasher.shutdown()
 
 
 # ============================================================================
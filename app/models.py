@@ -4,7 +4,7 @@ Arquitetura hierárquica: User -> Company -> Product
 """
 
 from sqlalchemy import (
-    Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index
+    Column, Integer, BigInteger, String, Boolean, DateTime, Float, Text, ForeignKey, Index, Numeric, JSON
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -26,6 +26,12 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
 
+    # Vai no claim "ver" do JWT; incrementado na troca de senha (revoga os tokens emitidos)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Incrementado a cada alteração de empresa/produto (invalida o cache do catálogo)
+    catalog_version = Column(Integer, nullable=False, default=0, server_default="0")
+
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -33,6 +39,9 @@ class User(Base):
     xml_uploads = relationship("XMLUpload", back_populates="user", cascade="all, delete-orphan")
     reports = relationship("Report", back_populates="user", cascade="all, delete-orphan")
     companies = relationship("Company", back_populates="user", cascade="all, delete-orphan")
+    upload_batches = relationship("UploadBatch", back_populates="user", cascade="all, delete-orphan")
+    jobs = relationship("Job", back_populates="user", cascade="all, delete-orphan")
+    refresh_tokens = relationship("RefreshToken", back_populates="user", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<User {self.email}>"
@@ -51,7 +60,7 @@ class Company(Base):
     company_name = Column(String(500), nullable=False, index=True)
     mapa_registration = Column(String(100), nullable=False)  # Ex: "PR-12345"
 
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relacionamentos
@@ -82,7 +91,7 @@ class Product(Base):
     mapa_registration = Column(String(100), nullable=False)  # Ex: "6.000001"
     product_reference = Column(String(500), nullable=True)  # Descrição amigável
 
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relacionamentos
@@ -108,9 +117,12 @@ class XMLUpload(Base):
 
     filename = Column(String(500), nullable=False)
     file_path = Column(String(1000), nullable=False)
-    upload_date = Column(DateTime(timezone=True), server_default=func.now())
+    upload_date = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     period = Column(String(20), nullable=True)  # Ex: "Q1-2025", "2024Q3"
-    # nfe_key = Column(String(44), nullable=True, index=True)  # DESABILITADO: Rodar migração primeiro!
+    nfe_key = Column(String(44), nullable=True)  # Chave de acesso (cópia de nfe_documents.chave_acesso)
+    # Conteúdo no file store (app/utils/file_store.py); nulo em uploads antigos (só file_path)
+    content_sha256 = Column(String(64), nullable=True, index=True)
+    compression_ratio = Column(Float, nullable=True)  # Tamanho original / gravado (nulo: desconhecido)
 
     status = Column(String(50), default="pending")  # pending, processed, error
     error_message = Column(Text, nullable=True)
@@ -118,16 +130,170 @@ class XMLUpload(Base):
     # Relacionamentos
     user = relationship("User", back_populates="xml_uploads")
     report = relationship("Report", back_populates="xml_upload", uselist=False)
+    nfe_document = relationship(
+        "NFeDocument", back_populates="xml_upload", uselist=False, cascade="all, delete-orphan"
+    )
+    report_facts = relationship("ReportFact", back_populates="xml_upload", cascade="all, delete-orphan")
 
-    # Índice composto para validação de duplicatas (DESABILITADO: Rodar migração primeiro!)
-    # __table_args__ = (
-    #     Index("ix_user_nfe_key", "user_id", "nfe_key"),
-    # )
+    # Índices compostos: duplicatas, relatório do período e listagem por data
+    __table_args__ = (
+        Index("ix_user_nfe_key", "user_id", "nfe_key"),
+        Index("ix_xml_upload_user_status_period", "user_id", "status", "period"),
+        Index("ix_xml_upload_user_date", "user_id", "upload_date", "id"),
+    )
 
     def __repr__(self):
         return f"<XMLUpload {self.filename} - {self.status}>"
 
 
+class NFeDocument(Base):
+    """
+    Cabeçalho da NF-e extraído uma única vez no upload.
+    Relatórios leem daqui em vez de re-parsear o arquivo a cada requisição.
+    """
+    __tablename__ = "nfe_documents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    xml_upload_id = Column(
+        Integer, ForeignKey("xml_uploads.id", ondelete="CASCADE"), nullable=False, unique=True
+    )
+
+    # Versão do NFeProcessor que gerou estes dados (re-extrair quando mudar)
+    parser_version = Column(Integer, nullable=False)
+    # Versão com que os report_facts do upload foram gerados (NULL = pendentes).
+    # Marca explícita: NF-e sem itens não gera fatos e mesmo assim está em dia.
+    facts_version = Column(Integer, nullable=True)
+
+    chave_acesso = Column(String(44), nullable=True, index=True)
+    numero_nota = Column(String(20), nullable=True)
+    serie = Column(String(10), nullable=True)
+    data_emissao = Column(String(10), nullable=True)  # YYYY-MM-DD
+
+    emitente_cnpj = Column(String(20), nullable=True)
+    emitente_razao_social = Column(String(500), nullable=True)
+    emitente_nome_fantasia = Column(String(500), nullable=True)
+    emitente_uf = Column(String(2), nullable=True)
+
+    destinatario_cnpj = Column(String(20), nullable=True)
+    destinatario_razao_social = Column(String(500), nullable=True)
+
+    extracted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relacionamentos
+    xml_upload = relationship("XMLUpload", back_populates="nfe_document")
+    items = relationship(
+        "NFeItem", back_populates="document", cascade="all, delete-orphan",
+        order_by="NFeItem.position"
+    )
+
+    def __repr__(self):
+        return f"<NFeDocument {self.chave_acesso}>"
+
+
+class NFeItem(Base):
+    """
+    Item (det) de uma NF-e extraído no upload.
+    """
+    __tablename__ = "nfe_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("nfe_documents.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)  # Ordem do item no XML
+
+    numero_item = Column(String(10), nullable=True)
+    codigo = Column(String(60), nullable=True)
+    descricao = Column(String(500), nullable=True)
+    ncm = Column(String(10), nullable=True)
+    cfop = Column(String(10), nullable=True)
+    unidade = Column(String(20), nullable=True)
+    quantidade = Column(Numeric(20, 4), nullable=True)
+    valor_unitario = Column(Numeric(25, 10), nullable=True)
+    valor_total = Column(Numeric(20, 2), nullable=True)
+    info_adicional = Column(Text, nullable=True)
+    registro_mapa = Column(String(100), nullable=True)
+    nutrientes = Column(JSON, nullable=True)  # Ex: {"N": "46"}
+
+    # Relacionamentos
+    document = relationship("NFeDocument", back_populates="items")
+
+    __table_args__ = (
+        Index("ix_nfe_item_document_position", "document_id", "position"),
+    )
+
+    def __repr__(self):
+        return f"<NFeItem {self.descricao}>"
+
+
+class ReportFact(Base):
+    """
+    Fato de relatório: um item de NF-e já convertido para toneladas.
+    Mantido junto com nfe_items (persist_nfe_data) para que o relatório do
+    período seja uma consulta agrupada, sem percorrer os uploads.
+    """
+    __tablename__ = "report_facts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    xml_upload_id = Column(
+        Integer, ForeignKey("xml_uploads.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    period = Column(String(20), nullable=True)  # Cópia de xml_uploads.period
+    position = Column(Integer, nullable=False)  # Ordem do item na NF-e
+
+    # Nomes como aparecem na NF-e (vínculo com o catálogo é feito na leitura)
+    company_name = Column(String(500), nullable=False)
+    product_name = Column(String(500), nullable=False)
+
+    is_import = Column(Boolean, nullable=False, default=False)  # emitente_uf == "EX"
+    quantity = Column(Numeric(20, 4), nullable=True)
+    unit = Column(String(20), nullable=True)
+    # Toneladas em miligramas: inteiro para que SUM seja exato em qualquer banco
+    quantity_mg = Column(BigInteger, nullable=False)
+    nfe_number = Column(String(20), nullable=True)
+
+    # Relacionamentos
+    xml_upload = relationship("XMLUpload", back_populates="report_facts")
+
+    __table_args__ = (
+        Index("ix_report_fact_user_period", "user_id", "period", "company_name", "product_name"),
+    )
+
+    def __repr__(self):
+        return f"<ReportFact {self.company_name} / {self.product_name}>"
+
+
+class UploadBatch(Base):
+    """
+    Job de importação em lote (ZIP com vários XMLs de NF-e).
+    Contadores são atualizados durante o processamento para acompanhamento.
+    """
+    __tablename__ = "upload_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    filename = Column(String(500), nullable=False)
+    status = Column(String(50), default="processing")  # processing, completed, failed
+
+    total_files = Column(Integer, default=0)
+    processed_files = Column(Integer, default=0)
+    created_count = Column(Integer, default=0)
+    duplicate_count = Column(Integer, default=0)
+    error_count = Column(Integer, default=0)
+
+    results = Column(JSON, nullable=True)  # Resultado por arquivo
+    error_message = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relacionamentos
+    user = relationship("User", back_populates="upload_batches")
+
+    def __repr__(self):
+        return f"<UploadBatch {self.filename} - {self.status}>"
+
+
 class Report(Base):
     """
     Relatório MAPA gerado a partir de XMLs processados.
@@ -136,15 +302,133 @@ class Report(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    xml_upload_id = Column(Integer, ForeignKey("xml_uploads.id", ondelete="CASCADE"), nullable=True)
+    xml_upload_id = Column(
+        Integer, ForeignKey("xml_uploads.id", ondelete="CASCADE"), nullable=True, index=True
+    )
 
     report_period = Column(String(20), nullable=False)  # Ex: "Q1-2025"
-    generated_at = Column(DateTime(timezone=True), server_default=func.now())
+    generated_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     file_path = Column(String(1000), nullable=True)
 
     # Relacionamentos
     user = relationship("User", back_populates="reports")
     xml_upload = relationship("XMLUpload", back_populates="report")
 
+    # Índice composto para a listagem por data
+    __table_args__ = (
+        Index("ix_report_user_generated", "user_id", "generated_at", "id"),
+    )
+
     def __repr__(self):
         return f"<Report {self.report_period}>"
+
+
+class Job(Base):
+    """
+    Job executado fora da API pelo worker (python -m app.worker).
+    A fila é a própria tabela: cada worker reserva o próximo job com
+    SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL) e renova locked_at
+    enquanto executa; jobs com lease expirado voltam para a fila.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
+
+    kind = Column(String(50), nullable=False)  # report, batch_upload, backfill_facts
+    payload = Column(JSON, nullable=True)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed
+
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime(timezone=True), nullable=False)  # Backoff entre tentativas
+
+    locked_by = Column(String(100), nullable=True)  # Worker que reservou o job
+    locked_at = Column(DateTime(timezone=True), nullable=True)  # Último heartbeat
+
+    result = Column(JSON, nullable=True)
+    artifact_path = Column(String(1000), nullable=True)  # Arquivo gerado (ex: PDF do relatório)
+    artifact_sha256 = Column(String(64), nullable=True)  # Artefato no file store
+    error_message = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Relacionamentos
+    user = relationship("User", back_populates="jobs")
+
+    __table_args__ = (
+        Index("ix_job_status_run_after", "status", "run_after"),
+    )
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.kind} - {self.status}>"
+
+
+class RefreshToken(Base):
+    """
+    Refresh token (valor opaco; só o SHA-256 fica no banco).
+    Cada uso revoga o token e emite outro na mesma família; reapresentar um
+    token já usado revoga a família inteira (vazamento provável). Vale só
+    enquanto users.token_version for a da emissão (troca de senha revoga).
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    family_id = Column(String(32), nullable=False, index=True)  # Sessão (login) de origem
+    token_version = Column(Integer, nullable=False, default=0)  # users.token_version na emissão
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)  # Usado (rotacionado) ou revogado
+
+    # Relacionamentos
+    user = relationship("User", back_populates="refresh_tokens")
+
+    def __repr__(self):
+        return f"<RefreshToken {self.id} user={self.user_id} family={self.family_id}>"
+
+
+class StoredBlob(Base):
+    """
+    Objeto do file store (endereçado pelo SHA-256 do conteúdo).
+    ref_count conta uploads, ZIPs na fila e artefatos que usam o objeto;
+    com zero referências há mais que a carência, o objeto é apagado.
+    """
+    __tablename__ = "stored_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)  # Conteúdo original
+    stored_size = Column(BigInteger, nullable=True)  # Como gravado; nulo: anterior à compressão
+    codec = Column(String(10), nullable=True)  # zstd, gzip ou nulo (não comprimido)
+    ref_count = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    released_at = Column(DateTime(timezone=True), nullable=True)  # Última referência removida (ou staging)
+
+    __table_args__ = (
+        Index("ix_stored_blob_unreferenced", "ref_count", "released_at"),
+    )
+
+    def __repr__(self):
+        return f"<StoredBlob {self.sha256[:12]} refs={self.ref_count}>"
+
+
+class StatCounter(Base):
+    """
+    Contador do dashboard admin (app/utils/dashboard_stats.py).
+    bucket "total" ou mês de criação ("2025-01"); mantido por um listener
+    do ORM e reconstruído periodicamente pelo worker.
+    """
+    __tablename__ = "stat_counters"
+
+    name = Column(String(50), primary_key=True)  # companies, products, uploads, reports, users
+    bucket = Column(String(10), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<StatCounter {self.name}/{self.bucket}={self.value}>"
@@ -1,17 +1,25 @@
 """
 Router de Admin - Autenticação e CRUD de Usuários.
+Rotas síncronas (def), executadas no threadpool como em routers/user.py;
+login/refresh/logout e o dashboard (/dashboard-stats) são async sobre o
+engine assíncrono (o bcrypt do login roda no executor de senhas).
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, load_only
+from typing import List, Optional
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 from app import models, schemas, auth
 from app.config import settings
-from app.database import get_db
+from app.database import get_async_db, get_db
+from app.utils.dashboard_stats import counts_query, global_counters, recent_query, split_counts
+from app.utils.file_store import release_blobs
+from app.utils.pagination import MAX_PAGE_SIZE, finish_page, keyset_page
 
 router = APIRouter()
 limiter = Limiter(key_func=get_remote_address)
@@ -26,29 +34,31 @@ limiter = Limiter(key_func=get_remote_address)
 async def login(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Login para admin ou usuário regular.
-    Retorna token JWT.
+    Retorna token JWT e refresh token (renovação em /auth/refresh, sem senha).
     """
     # Modo dev: aceita qualquer credencial e cria admin automaticamente
     if settings.dev_bypass_auth:
-        user = db.query(models.User).filter(models.User.email == form_data.username).first()
+        user = (await db.execute(
+            select(models.User).where(models.User.email == form_data.username)
+        )).scalar_one_or_none()
         if not user:
             user = models.User(
                 email=form_data.username,
-                hashed_password=auth.get_password_hash(form_data.password or "dev"),
+                hashed_password=await auth.password_hasher.hash(form_data.password or "dev"),
                 full_name="Dev Admin",
                 company_name="Dev",
                 is_active=True,
                 is_admin=True,
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
     else:
-        user = auth.authenticate_user(db, form_data.username, form_data.password)
+        user = await auth.authenticate_user(db, form_data.username, form_data.password)
 
     if not user:
         raise HTTPException(
@@ -57,17 +67,45 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Criar token
-    access_token = auth.create_access_token(data={"sub": user.email})
+    # Criar tokens (nova família de refresh tokens por login)
+    refresh_token = auth.issue_refresh_token(db, user)
+    await db.commit()
 
-    return {
-        "access_token": access_token,
-        "token_type": "bearer"
-    }
+    return auth.token_response(user, refresh_token)
+
+
+@router.post("/auth/refresh", response_model=schemas.TokenResponse)
+@limiter.limit("30/minute")
+async def refresh(
+    request: Request,
+    token_data: schemas.RefreshTokenRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Renova a sessão sem senha: troca o refresh token por um novo token de
+    acesso e um novo refresh token (o enviado deixa de valer).
+    Reapresentar um refresh token já usado revoga a sessão inteira.
+    """
+    user, refresh_token = await auth.rotate_refresh_token(db, token_data.refresh_token)
+
+    return auth.token_response(user, refresh_token)
+
+
+@router.post("/auth/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    token_data: schemas.RefreshTokenRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Encerra a sessão do refresh token (revoga a família). O token de acesso
+    continua válido até expirar (ACCESS_TOKEN_EXPIRE_MINUTES).
+    """
+    await auth.revoke_refresh_token(db, token_data.refresh_token)
+    return None
 
 
 @router.post("/auth/setup-first-admin", response_model=schemas.UserResponse)
-async def setup_first_admin(
+def setup_first_admin(
     user_data: schemas.UserCreate,
     db: Session = Depends(get_db)
 ):
@@ -138,13 +176,14 @@ async def setup_first_admin(
 
 
 @router.get("/me", response_model=schemas.UserResponse)
-async def get_current_user_info(
-    current_user: models.User = Depends(auth.get_current_user)
+def get_current_user_info(
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Retorna informações do usuário logado.
     """
-    return current_user
+    return auth.load_user(db, current_user)
 
 
 # ============================================================================
@@ -152,10 +191,10 @@ async def get_current_user_info(
 # ============================================================================
 
 @router.post("/users", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
-async def create_user(
+def create_user(
     user_data: schemas.UserCreate,
     db: Session = Depends(get_db),
-    current_admin: models.User = Depends(auth.get_current_admin)
+    current_admin: auth.Principal = Depends(auth.get_current_admin)
 ):
     """
     Cria novo usuário (apenas admin).
@@ -199,24 +238,42 @@ async def create_user(
 
 
 @router.get("/users", response_model=List[schemas.UserResponse])
-async def list_users(
-    skip: int = 0,
-    limit: int = 100,
+def list_users(
+    response: Response,
+    is_active: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
-    current_admin: models.User = Depends(auth.get_current_admin)
+    current_admin: auth.Principal = Depends(auth.get_current_admin)
 ):
     """
-    Lista todos os usuários (apenas admin).
+    Lista todos os usuários (apenas admin), mais recentes primeiro.
+    Filtro opcional: is_active.
+    PERFORMANCE: Paginação por keyset em (created_at, id), lendo só as
+    colunas da resposta; a próxima página vem do cursor no header X-Next-Cursor.
     """
-    users = db.query(models.User).offset(skip).limit(limit).all()
-    return users
+    query = db.query(models.User).options(load_only(
+        models.User.id,
+        models.User.email,
+        models.User.full_name,
+        models.User.company_name,
+        models.User.is_active,
+        models.User.is_admin,
+        models.User.created_at
+    ))
+
+    if is_active is not None:
+        query = query.filter(models.User.is_active == is_active)
+
+    query = keyset_page(db, query, models.User.created_at, models.User.id, cursor, limit)
+    return finish_page(query.all(), limit, response, "created_at")
 
 
 @router.get("/users/{user_id}", response_model=schemas.UserResponse)
-async def get_user(
+def get_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_admin: models.User = Depends(auth.get_current_admin)
+    current_admin: auth.Principal = Depends(auth.get_current_admin)
 ):
     """
     Obtém usuário por ID (apenas admin).
@@ -232,15 +289,18 @@ async def get_user(
     return user
 
 
-@router.patch("/users/{user_id}", response_model=schemas.UserResponse)
-async def update_user(
+@router.patch("/users/{user_id}", response_model=schemas.UserUpdateResponse)
+def update_user(
     user_id: int,
     user_update: schemas.UserUpdate,
     db: Session = Depends(get_db),
-    current_admin: models.User = Depends(auth.get_current_admin)
+    current_admin: auth.Principal = Depends(auth.get_current_admin)
 ):
     """
     Atualiza usuário (apenas admin).
+    Nova senha revoga os tokens do usuário; o cache de autenticação do
+    processo é invalidado (demais processos: após AUTH_CACHE_TTL). Quando o
+    admin troca a própria senha, a resposta traz os tokens da nova sessão.
     """
     user = db.query(models.User).filter(models.User.id == user_id).first()
 
@@ -252,6 +312,7 @@ async def update_user(
 
     # Atualizar campos fornecidos
     update_data = user_update.dict(exclude_unset=True)
+    refresh_token = None
 
     # SEGURANÇA: Definir explicitamente campos permitidos para prevenir mass assignment
     ALLOWED_UPDATE_FIELDS = {'full_name', 'company_name', 'is_active', 'is_admin'}
@@ -265,6 +326,9 @@ async def update_user(
                 detail=message
             )
         user.hashed_password = auth.get_password_hash(update_data.pop("password"))
+        auth.revoke_user_tokens(user)
+        if user.id == current_admin.id:
+            refresh_token = auth.issue_refresh_token(db, user)
 
     # SEGURANÇA: Aplicar apenas campos permitidos
     for field, value in update_data.items():
@@ -273,19 +337,26 @@ async def update_user(
 
     db.commit()
     db.refresh(user)
+    auth.principal_cache.invalidate(user.email)
 
+    if refresh_token:
+        return {
+            **schemas.UserResponse.model_validate(user).model_dump(),
+            **auth.token_response(user, refresh_token)
+        }
     return user
 
 
 @router.delete("/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(
+def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_admin: models.User = Depends(auth.get_current_admin)
+    current_admin: auth.Principal = Depends(auth.get_current_admin)
 ):
     """
     Deleta usuário (apenas admin).
-    Cascade delete remove todos os dados relacionados.
+    Cascade delete remove todos os dados relacionados; as referências aos
+    arquivos no file store são liberadas (uploads, artefatos e ZIPs na fila).
     """
     user = db.query(models.User).filter(models.User.id == user_id).first()
 
@@ -302,171 +373,80 @@ async def delete_user(
             detail="Não é possível deletar o próprio usuário"
         )
 
+    email = user.email
+    release_blobs(db, _user_blobs(db, user.id))
     db.delete(user)
     db.commit()
+    auth.principal_cache.invalidate(email)
 
     return None
 
 
+def _user_blobs(db: Session, user_id: int) -> List[str]:
+    """SHA-256 referenciados pelo usuário (uma entrada por referência)."""
+    digests = [
+        row[0] for row in db.query(models.XMLUpload.content_sha256).filter(
+            models.XMLUpload.user_id == user_id,
+            models.XMLUpload.content_sha256.isnot(None)
+        )
+    ]
+    for job in db.query(models.Job).filter(models.Job.user_id == user_id):
+        digests.append(job.artifact_sha256)
+        # ZIP de importação ainda não processado (referência do job)
+        if job.kind == "batch_upload" and job.status in ("queued", "running"):
+            digests.append((job.payload or {}).get("zip_sha256"))
+    return [digest for digest in digests if digest]
+
+
 # ============================================================================
 # DASHBOARD STATISTICS
 # ============================================================================
 
 @router.get("/dashboard-stats")
 async def get_dashboard_stats(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Retorna estatísticas do dashboard.
-    - Admin: vê estatísticas globais do sistema
-    - Usuário: vê apenas suas próprias estatísticas
+    - Admin: vê estatísticas globais do sistema (contadores em stat_counters)
+    - Usuário: vê apenas suas próprias estatísticas (uma consulta agrupada)
+    PERFORMANCE: Totais e atividades recentes em uma ou duas consultas,
+    independente do tamanho das tabelas.
     """
-    from datetime import datetime, timedelta
-    from sqlalchemy import func
-
     # Define o filtro base
     if current_user.is_admin:
         # Admin vê tudo
-        user_filter = True
-        company_user_filter = True
+        user_id = None
+        counters = await global_counters(db)
+        totals, this_month = counters["totals"], counters["this_month"]
     else:
         # Usuário vê apenas seus dados
-        user_filter = models.XMLUpload.user_id == current_user.id
-        company_user_filter = models.Company.user_id == current_user.id
+        user_id = current_user.id
+        totals, this_month = split_counts((await db.execute(counts_query(user_id))).all())
+        totals["users"] = 1
 
-    # Totais
-    if current_user.is_admin:
-        total_companies = db.query(models.Company).count()
-        total_products = db.query(models.Product).count()
-        total_uploads = db.query(models.XMLUpload).count()
-        total_reports = db.query(models.Report).count()
-        total_users = db.query(models.User).count()
-    else:
-        total_companies = db.query(models.Company).filter(
-            models.Company.user_id == current_user.id
-        ).count()
-        total_products = db.query(models.Product).join(models.Company).filter(
-            models.Company.user_id == current_user.id
-        ).count()
-        total_uploads = db.query(models.XMLUpload).filter(
-            models.XMLUpload.user_id == current_user.id
-        ).count()
-        total_reports = db.query(models.Report).filter(
-            models.Report.user_id == current_user.id
-        ).count()
-        total_users = 1
-
-    # Calcular período do mês atual e anterior
-    now = datetime.utcnow()
-    first_day_this_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    first_day_last_month = (first_day_this_month - timedelta(days=1)).replace(day=1)
-
-    # Estatísticas deste mês
-    if current_user.is_admin:
-        companies_this_month = db.query(models.Company).filter(
-            models.Company.created_at >= first_day_this_month
-        ).count()
-        products_this_month = db.query(models.Product).filter(
-            models.Product.created_at >= first_day_this_month
-        ).count()
-        uploads_this_month = db.query(models.XMLUpload).filter(
-            models.XMLUpload.upload_date >= first_day_this_month
-        ).count()
-        reports_this_month = db.query(models.Report).filter(
-            models.Report.generated_at >= first_day_this_month
-        ).count()
-    else:
-        companies_this_month = db.query(models.Company).filter(
-            models.Company.user_id == current_user.id,
-            models.Company.created_at >= first_day_this_month
-        ).count()
-        products_this_month = db.query(models.Product).join(models.Company).filter(
-            models.Company.user_id == current_user.id,
-            models.Product.created_at >= first_day_this_month
-        ).count()
-        uploads_this_month = db.query(models.XMLUpload).filter(
-            models.XMLUpload.user_id == current_user.id,
-            models.XMLUpload.upload_date >= first_day_this_month
-        ).count()
-        reports_this_month = db.query(models.Report).filter(
-            models.Report.user_id == current_user.id,
-            models.Report.generated_at >= first_day_this_month
-        ).count()
-
-    # Atividades recentes (últimas 10)
-    recent_activities = []
-
-    # Buscar uploads recentes
-    if current_user.is_admin:
-        recent_uploads = db.query(models.XMLUpload).order_by(
-            models.XMLUpload.upload_date.desc()
-        ).limit(5).all()
-    else:
-        recent_uploads = db.query(models.XMLUpload).filter(
-            models.XMLUpload.user_id == current_user.id
-        ).order_by(models.XMLUpload.upload_date.desc()).limit(5).all()
+    # Atividades recentes (últimas 10), todos os tipos em uma consulta
+    rows = (await db.execute(
+        recent_query({"upload": 5, "report": 5, "company": 3, "product": 3}, user_id)
+    )).all()
 
-    for upload in recent_uploads:
-        recent_activities.append({
-            "type": "upload",
-            "action": f"XML processado: {upload.filename[:30]}..." if len(upload.filename) > 30 else f"XML processado: {upload.filename}",
-            "timestamp": upload.upload_date.isoformat() if upload.upload_date else None,
-            "status": "success"
-        })
-
-    # Buscar relatórios recentes
-    if current_user.is_admin:
-        recent_reports = db.query(models.Report).order_by(
-            models.Report.generated_at.desc()
-        ).limit(5).all()
-    else:
-        recent_reports = db.query(models.Report).filter(
-            models.Report.user_id == current_user.id
-        ).order_by(models.Report.generated_at.desc()).limit(5).all()
-
-    for report in recent_reports:
-        recent_activities.append({
-            "type": "report",
-            "action": f"Relatório {report.report_period} gerado",
-            "timestamp": report.generated_at.isoformat() if report.generated_at else None,
-            "status": "success"
-        })
-
-    # Buscar empresas recentes
-    if current_user.is_admin:
-        recent_companies = db.query(models.Company).order_by(
-            models.Company.created_at.desc()
-        ).limit(3).all()
-    else:
-        recent_companies = db.query(models.Company).filter(
-            models.Company.user_id == current_user.id
-        ).order_by(models.Company.created_at.desc()).limit(3).all()
-
-    for company in recent_companies:
-        recent_activities.append({
-            "type": "company",
-            "action": f"Empresa cadastrada: {company.company_name[:25]}..." if len(company.company_name) > 25 else f"Empresa cadastrada: {company.company_name}",
-            "timestamp": company.created_at.isoformat() if company.created_at else None,
-            "status": "info"
-        })
-
-    # Buscar produtos recentes
-    if current_user.is_admin:
-        recent_products = db.query(models.Product).order_by(
-            models.Product.created_at.desc()
-        ).limit(3).all()
-    else:
-        recent_products = db.query(models.Product).join(models.Company).filter(
-            models.Company.user_id == current_user.id
-        ).order_by(models.Product.created_at.desc()).limit(3).all()
+    recent_activities = []
+    for kind, _, label, timestamp in rows:
+        if kind == "upload":
+            action = f"XML processado: {label[:30]}..." if len(label) > 30 else f"XML processado: {label}"
+        elif kind == "report":
+            action = f"Relatório {label} gerado"
+        elif kind == "company":
+            action = f"Empresa cadastrada: {label[:25]}..." if len(label) > 25 else f"Empresa cadastrada: {label}"
+        else:
+            action = f"Produto cadastrado: {label[:25]}..." if len(label) > 25 else f"Produto cadastrado: {label}"
 
-    for product in recent_products:
         recent_activities.append({
-            "type": "product",
-            "action": f"Produto cadastrado: {product.product_name[:25]}..." if len(product.product_name) > 25 else f"Produto cadastrado: {product.product_name}",
-            "timestamp": product.created_at.isoformat() if product.created_at else None,
-            "status": "info"
+            "type": kind,
+            "action": action,
+            "timestamp": timestamp.isoformat() if timestamp else None,
+            "status": "success" if kind in ("upload", "report") else "info"
         })
 
     # Ordenar atividades por timestamp (mais recentes primeiro)
@@ -480,18 +460,89 @@ async def get_dashboard_stats(
 
     return {
         "totals": {
-            "companies": total_companies,
-            "products": total_products,
-            "uploads": total_uploads,
-            "reports": total_reports,
-            "users": total_users if current_user.is_admin else None
+            "companies": totals["companies"],
+            "products": totals["products"],
+            "uploads": totals["uploads"],
+            "reports": totals["reports"],
+            "users": totals["users"] if current_user.is_admin else None
         },
         "this_month": {
-            "companies": companies_this_month,
-            "products": products_this_month,
-            "uploads": uploads_this_month,
-            "reports": reports_this_month
+            "companies": this_month["companies"],
+            "products": this_month["products"],
+            "uploads": this_month["uploads"],
+            "reports": this_month["reports"]
         },
         "recent_activities": recent_activities,
         "is_admin": current_user.is_admin
     }
+
+
+# ============================================================================
+# PARSE CACHE
+# ============================================================================
+
+@router.get("/parse-cache")
+def get_parse_cache_stats(
+    current_admin: auth.Principal = Depends(auth.get_current_admin)
+):
+    """
+    Contadores do cache de parsing de NF-e (processo da API).
+    Usado para dimensionar PARSE_CACHE_MAX_ENTRIES.
+    """
+    from app.utils.parse_cache import parse_cache
+
+    return {
+        "enabled": settings.parse_cache_enabled,
+        "disk_enabled": parse_cache.cache_dir is not None,
+        **parse_cache.stats()
+    }
+
+
+# ============================================================================
+# EVENT LOOP
+# ============================================================================
+
+@router.get("/event-loop")
+async def get_event_loop_stats(
+    reset: bool = False,
+    current_admin: auth.Principal = Depends(auth.get_current_admin)
+):
+    """
+    Atraso do event loop (janela móvel) e tamanho do threadpool das rotas.
+    p99 alto indica trecho bloqueante rodando no loop. ?reset=true zera as amostras.
+    """
+    import anyio.to_thread
+    from app.utils.event_loop import lag_monitor
+
+    stats = lag_monitor.stats()
+    if reset:
+        lag_monitor.reset()
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return {
+        "lag": stats,
+        "threadpool": {
+            "size": limiter.total_tokens,
+            "busy": limiter.borrowed_tokens,
+            "waiting": limiter.statistics().tasks_waiting
+        }
+    }
+
+
+# ============================================================================
+# AUTHENTICATION STATS
+# ============================================================================
+
+@router.get("/auth-stats")
+def get_auth_stats(
+    current_admin: auth.Principal = Depends(auth.get_current_admin)
+):
+    """
+    Executor de senhas (fila, espera e duração do bcrypt, rejeições por fila
+    cheia) e cache de usuários autenticados, deste processo.
+    Usado para dimensionar PASSWORD_HASH_WORKERS/MAX_QUEUE e AUTH_CACHE_*.
+    """
+    return {
+        "password_hasher": auth.password_hasher.stats(),
+        "principal_cache": auth.principal_cache.stats()
+    }
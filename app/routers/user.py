@@ -1,26 +1,48 @@
 """
 Router de User - Upload, Catálogo, Relatórios.
 Funcionalidades principais do sistema MAPA.
+
+As rotas são síncronas (def): banco, parsing e geração de PDF bloqueiam,
+então o FastAPI as executa no threadpool (settings.threadpool_size) em
+vez de travar o event loop. As leituras mais frequentes (/stats,
+/catalog, /uploads) são async e usam o engine assíncrono (get_async_db).
 """
 
 import logging
 import os
-import shutil
 from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status, UploadFile, File, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, load_only
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 from app import models, schemas, auth
-from app.database import get_db
+from app.database import get_async_db, get_db
 from app.config import settings
-from app.utils.validators import validate_file_security
-from app.utils.nfe_processor import NFeProcessor
+from app.utils.validators import UPLOAD_CHUNK_SIZE, sanitize_filename
 from app.utils.mapa_processor import MAPAProcessor
+from app.utils.nfe_store import (
+    document_to_nfe_data, extract_upload, needs_extraction, period_from_emission, persist_nfe_data
+)
+from app.utils.batch_parser import read_upload
+from app.utils.batch_upload import ZipBatchImporter, is_zip_file
+from app.utils.parse_cache import parse_cache
+from app.utils.catalog_cache import bump_catalog_version, catalog_cache
+from app.utils.catalog_io import FORMATS, detect_format, export_csv, export_xlsx, read_catalog, upsert_catalog
+from app.utils.dashboard_stats import counts_query, recent_query, split_counts
+from app.utils.pagination import MAX_PAGE_SIZE, finish_page, keyset_page
+from app.utils.catalog_matcher import normalize_name
+from app.utils.file_store import (
+    SpooledFile, acquire_blob, add_blob, blob_compression_ratio, create_staging_token, file_store,
+    read_chunks, read_staging_token, release_blobs, stage_blob, upload_file_exists
+)
+from app.utils.job_queue import enqueue_job
+from app.utils.report_facts import move_report_facts
 from app.utils.report_generator import MAPAReportGenerator
 
 logger = logging.getLogger(__name__)
@@ -34,51 +56,58 @@ limiter = Limiter(key_func=get_remote_address)
 # ============================================================================
 
 @router.get("/profile", response_model=schemas.UserResponse)
-async def get_profile(
-    current_user: models.User = Depends(auth.get_current_user)
+def get_profile(
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Retorna dados do perfil do usuário logado.
     """
-    return current_user
+    return auth.load_user(db, current_user)
 
 
 @router.patch("/profile", response_model=schemas.UserResponse)
-async def update_profile(
+def update_profile(
     profile_data: schemas.UserProfileUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Atualiza dados do perfil do usuário logado.
     """
+    user = auth.load_user(db, current_user)
+
     # Atualizar apenas campos fornecidos
     if profile_data.full_name is not None:
-        current_user.full_name = profile_data.full_name.strip()
+        user.full_name = profile_data.full_name.strip()
 
     if profile_data.company_name is not None:
-        current_user.company_name = profile_data.company_name.strip() if profile_data.company_name else None
+        user.company_name = profile_data.company_name.strip() if profile_data.company_name else None
 
     db.commit()
-    db.refresh(current_user)
+    db.refresh(user)
 
-    return current_user
+    return user
 
 
 @router.post("/change-password", status_code=status.HTTP_200_OK)
 @limiter.limit("3/minute")  # SEGURANÇA: Rate limit para prevenir brute force
-async def change_password(
+def change_password(
     request: Request,
     password_data: schemas.ChangePasswordRequest,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Altera a senha do usuário logado.
     SEGURANÇA: Rate limited para prevenir ataques de brute force.
+    Os tokens emitidos antes da troca (acesso e refresh) deixam de valer;
+    a resposta traz tokens novos para a sessão atual.
     """
+    user = auth.load_user(db, current_user)
+
     # Verificar senha atual
-    if not auth.verify_password(password_data.current_password, current_user.hashed_password):
+    if not auth.verify_password(password_data.current_password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Senha atual incorreta"
@@ -93,69 +122,53 @@ async def change_password(
         )
 
     # Verificar se nova senha é diferente da atual
-    if auth.verify_password(password_data.new_password, current_user.hashed_password):
+    if auth.verify_password(password_data.new_password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Nova senha deve ser diferente da senha atual"
         )
 
-    # Atualizar senha
-    current_user.hashed_password = auth.get_password_hash(password_data.new_password)
+    # Atualizar senha e revogar os tokens anteriores
+    user.hashed_password = auth.get_password_hash(password_data.new_password)
+    auth.revoke_user_tokens(user)
+    refresh_token = auth.issue_refresh_token(db, user)
     db.commit()
+    auth.principal_cache.invalidate(user.email)
 
-    return {"message": "Senha alterada com sucesso"}
+    return {
+        "message": "Senha alterada com sucesso",
+        **auth.token_response(user, refresh_token)
+    }
 
 
 @router.get("/stats")
 async def get_user_stats(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Retorna estatísticas do usuário logado.
+    PERFORMANCE: Totais em uma consulta agrupada e itens recentes em outra.
     """
-    # Contar uploads
-    total_uploads = db.query(models.XMLUpload).filter(
-        models.XMLUpload.user_id == current_user.id
-    ).count()
+    totals, _ = split_counts((await db.execute(counts_query(current_user.id))).all())
 
-    # Contar empresas
-    total_companies = db.query(models.Company).filter(
-        models.Company.user_id == current_user.id
-    ).count()
-
-    # Contar produtos (via empresas do usuário)
-    total_products = db.query(models.Product).join(models.Company).filter(
-        models.Company.user_id == current_user.id
-    ).count()
-
-    # Contar relatórios
-    total_reports = db.query(models.Report).filter(
-        models.Report.user_id == current_user.id
-    ).count()
-
-    # Buscar uploads recentes (últimos 5)
-    recent_uploads = db.query(models.XMLUpload).filter(
-        models.XMLUpload.user_id == current_user.id
-    ).order_by(models.XMLUpload.upload_date.desc()).limit(5).all()
-
-    # Buscar relatórios recentes (últimos 5)
-    recent_reports = db.query(models.Report).filter(
-        models.Report.user_id == current_user.id
-    ).order_by(models.Report.generated_at.desc()).limit(5).all()
+    # Uploads e relatórios recentes (últimos 5 de cada)
+    recent = (await db.execute(recent_query({"upload": 5, "report": 5}, current_user.id))).all()
+    recent_uploads = [row for row in recent if row.kind == "upload"]
+    recent_reports = [row for row in recent if row.kind == "report"]
 
     return {
         "totals": {
-            "uploads": total_uploads,
-            "companies": total_companies,
-            "products": total_products,
-            "reports": total_reports
+            "uploads": totals["uploads"],
+            "companies": totals["companies"],
+            "products": totals["products"],
+            "reports": totals["reports"]
         },
         "recent_uploads": [
             {
                 "id": upload.id,
-                "filename": upload.filename,
-                "upload_date": upload.upload_date.isoformat() if upload.upload_date else None,
+                "filename": upload.label,
+                "upload_date": upload.created_at.isoformat() if upload.created_at else None,
                 "status": "processed"
             }
             for upload in recent_uploads
@@ -163,8 +176,8 @@ async def get_user_stats(
         "recent_reports": [
             {
                 "id": report.id,
-                "period": report.report_period,
-                "created_at": report.generated_at.isoformat() if report.generated_at else None,
+                "period": report.label,
+                "created_at": report.created_at.isoformat() if report.created_at else None,
                 "status": "generated"
             }
             for report in recent_reports
@@ -177,10 +190,10 @@ async def get_user_stats(
 # ============================================================================
 
 @router.post("/companies", response_model=schemas.CompanyResponse, status_code=status.HTTP_201_CREATED)
-async def create_company(
+def create_company(
     company_data: schemas.CompanyCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Cadastra nova empresa no catálogo do usuário.
@@ -205,6 +218,7 @@ async def create_company(
     )
 
     db.add(new_company)
+    bump_catalog_version(db, current_user.id)
     db.commit()
     db.refresh(new_company)
 
@@ -212,9 +226,9 @@ async def create_company(
 
 
 @router.get("/companies")
-async def list_companies(
+def list_companies(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Lista empresas do usuário.
@@ -228,11 +242,11 @@ async def list_companies(
 
 
 @router.patch("/companies/{company_id}", response_model=schemas.CompanyResponse)
-async def update_company(
+def update_company(
     company_id: int,
     company_data: schemas.CompanyCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Atualiza dados de uma empresa.
@@ -265,6 +279,7 @@ async def update_company(
     # Atualizar campos
     company.company_name = company_data.company_name.strip()
     company.mapa_registration = company_data.mapa_registration.strip()
+    bump_catalog_version(db, current_user.id)
 
     db.commit()
     db.refresh(company)
@@ -273,10 +288,10 @@ async def update_company(
 
 
 @router.delete("/companies/{company_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_company(
+def delete_company(
     company_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Deleta empresa (e todos os produtos vinculados).
@@ -293,16 +308,17 @@ async def delete_company(
         )
 
     db.delete(company)
+    bump_catalog_version(db, current_user.id)
     db.commit()
 
     return None
 
 
 @router.post("/products", response_model=schemas.ProductResponse, status_code=status.HTTP_201_CREATED)
-async def create_product(
+def create_product(
     product_data: schemas.ProductCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Cadastra novo produto vinculado a uma empresa.
@@ -340,22 +356,27 @@ async def create_product(
     )
 
     db.add(new_product)
+    bump_catalog_version(db, current_user.id)
     db.commit()
     db.refresh(new_product)
 
     return new_product
 
 
-@router.get("/products")
-async def list_products(
+@router.get("/products", response_model=List[schemas.ProductResponse])
+def list_products(
+    response: Response,
     company_id: int = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
-    Lista produtos do usuário.
+    Lista produtos do usuário, mais recentes primeiro.
     Se company_id fornecido, filtra por empresa.
-    PERFORMANCE: Limite de 1000 registros para evitar sobrecarga do banco.
+    PERFORMANCE: Paginação por keyset em (created_at, id); a próxima página
+    vem do cursor no header X-Next-Cursor.
     """
     query = db.query(models.Product).join(models.Company).filter(
         models.Company.user_id == current_user.id
@@ -364,17 +385,16 @@ async def list_products(
     if company_id:
         query = query.filter(models.Product.company_id == company_id)
 
-    products = query.order_by(models.Product.created_at.desc()).limit(1000).all()
-
-    return products
+    query = keyset_page(db, query, models.Product.created_at, models.Product.id, cursor, limit)
+    return finish_page(query.all(), limit, response, "created_at")
 
 
 @router.patch("/products/{product_id}", response_model=schemas.ProductResponse)
-async def update_product(
+def update_product(
     product_id: int,
     product_data: schemas.ProductCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Atualiza dados de um produto.
@@ -405,9 +425,9 @@ async def update_product(
 
     # Atualizar campos
     product.product_name = product_data.product_name.strip()
-    product.product_type = product_data.product_type
     product.company_id = product_data.company_id
     product.mapa_registration = product_data.mapa_registration.strip()
+    bump_catalog_version(db, current_user.id)
 
     db.commit()
     db.refresh(product)
@@ -416,10 +436,10 @@ async def update_product(
 
 
 @router.delete("/products/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_product(
+def delete_product(
     product_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Deleta produto.
@@ -436,6 +456,7 @@ async def delete_product(
         )
 
     db.delete(product)
+    bump_catalog_version(db, current_user.id)
     db.commit()
 
     return None
@@ -443,19 +464,21 @@ async def delete_product(
 
 @router.get("/catalog", response_model=schemas.CatalogResponse)
 async def get_catalog(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Retorna catálogo completo do usuário (empresas com produtos).
     PERFORMANCE: Usa joinedload para evitar N+1 queries (reduz 100 queries para 1).
     """
-    from sqlalchemy.orm import joinedload
-
-    # PERFORMANCE: Eager load products para evitar N+1
-    companies = db.query(models.Company).filter(
-        models.Company.user_id == current_user.id
-    ).options(joinedload(models.Company.products)).all()
+    # PERFORMANCE: Eager load products para evitar N+1 (e lazy load, que
+    # não funciona em AsyncSession)
+    result = await db.execute(
+        select(models.Company).where(
+            models.Company.user_id == current_user.id
+        ).options(joinedload(models.Company.products))
+    )
+    companies = result.unique().scalars().all()
 
     # Contar totais
     total_companies = len(companies)
@@ -468,90 +491,155 @@ async def get_catalog(
     }
 
 
+@router.post("/catalog/import", response_model=schemas.CatalogImportResponse)
+@limiter.limit("10/minute")
+def import_catalog(
+    request: Request,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
+):
+    """
+    Importa empresas e produtos de um CSV ou XLSX (colunas empresa,
+    registro_empresa, produto, registro_produto, referencia).
+    Cria ou atualiza pelo nome; linhas inválidas são ignoradas e listadas
+    em errors. PERFORMANCE: gravação em massa em uma única transação.
+    """
+    header = file.file.read(4)
+    file.file.seek(0, os.SEEK_END)
+    file_size = file.file.tell()
+    file.file.seek(0)
+    if file_size > settings.catalog_import_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Arquivo muito grande. Tamanho máximo: {settings.catalog_import_max_size // (1024 * 1024)}MB"
+        )
+
+    try:
+        rows, errors = read_catalog(file.file, detect_format(file.filename, header))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    try:
+        counts = upsert_catalog(db, current_user.id, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Erro ao importar catálogo")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro interno ao importar catálogo. Nenhuma alteração foi gravada."
+        )
+
+    return {"rows": len(rows), **counts, "errors": errors}
+
+
+@router.get("/catalog/export")
+def export_catalog(
+    file_format: str = Query("csv", alias="format", pattern=f"^({'|'.join(FORMATS)})$"),
+    current_user: auth.Principal = Depends(auth.get_current_user)
+):
+    """
+    Exporta o catálogo no formato da importação (CSV ou XLSX).
+    PERFORMANCE: Gerado em streaming, lendo o banco em blocos.
+    """
+    from fastapi.responses import StreamingResponse
+
+    if file_format == "xlsx":
+        content = export_xlsx(current_user.id)
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        content = export_csv(current_user.id)
+        media_type = "text/csv; charset=utf-8"
+
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="catalogo.{file_format}"'}
+    )
+
+
 # ============================================================================
 # XML UPLOAD
 # ============================================================================
 
+def _read_upload(file: UploadFile) -> dict:
+    """
+    Lê o upload em blocos, validando e extraindo os dados da NF-e na mesma
+    passada (StreamingUploadValidator). PDFs e arquivos grandes são
+    processados no pool de processos. Levanta ValueError se for inválido.
+    """
+    upload_info = read_upload(file.file, file.filename, settings.max_upload_size)
+
+    # Resultado fica no cache para a confirmação não re-parsear o arquivo
+    if upload_info["nfe_data"] is not None and settings.parse_cache_enabled:
+        parse_cache.store(upload_info["sha256"], upload_info["nfe_data"])
+
+    return upload_info
+
+
+def _store_upload(db: Session, file: UploadFile, staging: bool = False) -> SpooledFile:
+    """
+    Grava o upload (já validado) no file store (SHA-256, tamanhos e codec).
+    Com staging=True fica sem referência até a confirmação. Não faz commit.
+    """
+    file.file.seek(0)
+    try:
+        stored = stage_blob(db, file.file) if staging else add_blob(db, file.file)
+    except Exception:
+        db.rollback()
+        logger.exception("Erro ao gravar arquivo no file store")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro interno ao salvar arquivo. Tente novamente."
+        )
+    return stored
+
+
 @router.post("/upload-preview", response_model=schemas.XMLPreviewResponse)
 @limiter.limit("10/minute")  # SEGURANÇA: Rate limit para prevenir abuso de uploads
-async def upload_xml_preview(
+def upload_xml_preview(
     request: Request,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Faz preview do XML sem salvar no banco.
     Retorna dados extraídos para revisão do usuário.
     SEGURANÇA: Rate limited para prevenir DoS via uploads massivos.
     """
-    # Validar arquivo
+    # Validar arquivo e extrair dados em uma única passada
     try:
-        content = await file.read()
-        validate_file_security(file.filename, content, settings.max_upload_size)
-        await file.seek(0)  # Reset file pointer
+        upload_info = _read_upload(file)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
 
-    # Criar diretório temporário
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    temp_dir = Path(settings.upload_dir) / "temp" / f"user_{current_user.id}"
-    temp_dir.mkdir(parents=True, exist_ok=True)
-
-    # Salvar arquivo temporariamente
-    safe_filename = f"{timestamp}_{file.filename}"
-    temp_file_path = temp_dir / safe_filename
-
+    # Processar dados para preview
     try:
-        with open(temp_file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-    except Exception as e:
-        logger.exception("Erro ao salvar arquivo temporário")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro interno ao salvar arquivo. Tente novamente."
-        )
-
-    # Processar arquivo para preview
-    try:
-        processor = NFeProcessor()
-        nfe_data = processor.process_file(str(temp_file_path))
+        nfe_data = upload_info["nfe_data"]
 
         if not nfe_data:
             raise ValueError("Não foi possível extrair dados do arquivo")
 
-        # Extrair dados do XML
-        xml_data = nfe_data.to_dict()
-
-        # Buscar empresas e produtos do usuário em queries otimizadas
-        user_companies = db.query(models.Company).filter(
-            models.Company.user_id == current_user.id
-        ).all()
+        # Catálogo do usuário (snapshot em cache, invalidado por catalog_version)
+        catalog = catalog_cache.get(db, current_user.id)
 
-        user_products = db.query(models.Product).join(
-            models.Company, models.Product.company_id == models.Company.id
-        ).filter(
-            models.Company.user_id == current_user.id
-        ).all()
-
-        # Match de empresa pelo nome (case-insensitive)
-        matched_company = None
-        emitente_nome = xml_data.get('emitente', {}).get('razao_social', '').strip().lower()
-        if emitente_nome:
-            for company in user_companies:
-                if company.company_name.lower().strip() == emitente_nome:
-                    matched_company = company
-                    break
+        # Match de empresa pelo nome normalizado (acentos, caixa, pontuação)
+        matched_company = catalog.match_company(nfe_data.emitente_razao_social)
 
         # Calcular período trimestral da NF-e
         periodo_trimestral = None
-        if xml_data.get('data_emissao'):
+        if nfe_data.data_emissao:
             try:
                 from datetime import datetime as dt
-                data_emissao = dt.fromisoformat(xml_data['data_emissao'].split('T')[0])
+                data_emissao = dt.fromisoformat(nfe_data.data_emissao.split('T')[0])
                 ano = data_emissao.year
                 trimestre = (data_emissao.month - 1) // 3 + 1
                 periodo_trimestral = f"{ano}Q{trimestre}"
@@ -561,14 +649,11 @@ async def upload_xml_preview(
         # Verificar quais produtos estão cadastrados
         produtos_status = []
 
-        # Criar set de nomes de produtos para busca O(1)
-        produtos_cadastrados_set = {p.product_name.lower().strip() for p in user_products}
-
-        for produto in xml_data.get('produtos', []):
-            descricao = produto.get('descricao', '').strip()
-            codigo = produto.get('codigo', '').strip()
-            # Verificar se produto está cadastrado (comparação case-insensitive)
-            cadastrado = descricao.lower() in produtos_cadastrados_set if descricao else False
+        for produto in nfe_data.produtos:
+            descricao = (produto.descricao or '').strip()
+            codigo = (produto.codigo or '').strip()
+            # Verificar se produto está cadastrado (nome normalizado)
+            cadastrado = normalize_name(descricao) in catalog.product_by_normalized if descricao else False
 
             produtos_status.append({
                 'descricao': descricao,
@@ -576,22 +661,26 @@ async def upload_xml_preview(
                 'cadastrado': cadastrado
             })
 
+        # Arquivo fica no file store (sem referência) até a confirmação,
+        # identificado por um token assinado: qualquer nó da API confirma
+        content_sha256 = _store_upload(db, file, staging=True).sha256
+        db.commit()
+
         # Retornar preview
         return {
-            "temp_file_path": str(temp_file_path),
+            "temp_file_path": create_staging_token(current_user.id, content_sha256),
             "filename": file.filename,
-            "nfe_data": xml_data,
+            "nfe_data": nfe_data.to_dict(),  # Forma de dicionário só na resposta
             "periodo_trimestral": periodo_trimestral,
             "empresa_encontrada": matched_company.company_name if matched_company else None,
             "empresa_mapa_registration": matched_company.mapa_registration if matched_company else None,
-            "total_produtos": len(xml_data.get('produtos', [])),
+            "total_produtos": len(nfe_data.produtos),
             "produtos_status": produtos_status
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        # Limpar arquivo temporário em caso de erro
-        if temp_file_path.exists():
-            temp_file_path.unlink()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Erro ao processar arquivo. Verifique se é um XML/PDF de NF-e válido."
@@ -599,171 +688,139 @@ async def upload_xml_preview(
 
 
 @router.post("/upload-confirm", response_model=schemas.XMLUploadResponse, status_code=status.HTTP_201_CREATED)
-async def upload_xml_confirm(
+def upload_xml_confirm(
     upload_data: schemas.XMLUploadConfirm,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Confirma upload após revisão do usuário.
-    Move arquivo para pasta permanente e salva no banco.
-    SEGURANÇA: Validação rigorosa de path para prevenir Path Traversal.
+    Referencia o arquivo do preview no file store e salva no banco.
+    SEGURANÇA: temp_file_path é o token assinado do preview (usuário,
+    SHA-256 e validade); não aceita caminhos.
     """
-    # SEGURANÇA: Definir diretório base permitido e resolver para path absoluto
-    base_temp_dir = (Path(settings.upload_dir) / "temp" / f"user_{current_user.id}").resolve()
-
-    # SEGURANÇA: Resolver o caminho fornecido para path absoluto (elimina ../ e ./)
     try:
-        requested_path = Path(upload_data.temp_file_path).resolve()
-    except (ValueError, OSError):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Caminho de arquivo inválido"
-        )
-
-    # SEGURANÇA: Verificar se o path resolvido está dentro do diretório permitido
-    try:
-        requested_path.relative_to(base_temp_dir)
-    except ValueError:
+        content_sha256 = read_staging_token(upload_data.temp_file_path, current_user.id)
+    except PermissionError as e:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Acesso negado a este arquivo"
+            detail=str(e)
         )
-
-    # Validar que arquivo temporário existe
-    if not requested_path.exists() or not requested_path.is_file():
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Arquivo temporário não encontrado ou expirou"
+            detail=str(e)
         )
 
-    temp_file_path = requested_path
-
-    # Criar diretório permanente
-    user_upload_dir = Path(settings.upload_dir) / f"user_{current_user.id}"
-    user_upload_dir.mkdir(parents=True, exist_ok=True)
+    # Validar se NF-e já foi processada por este usuário (índice user_id, nfe_key)
+    nfe_key = (upload_data.nfe_data or {}).get('chave_acesso')
+    if nfe_key:
+        existing_upload = db.query(models.XMLUpload).filter(
+            models.XMLUpload.user_id == current_user.id,
+            models.XMLUpload.nfe_key == nfe_key
+        ).first()
 
-    # Mover arquivo para pasta permanente
-    permanent_path = user_upload_dir / temp_file_path.name
+        if existing_upload:
+            # Arquivo do preview sem referência é apagado após a carência
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"NF-e com chave {nfe_key} já foi processada em {existing_upload.upload_date.strftime('%d/%m/%Y %H:%M')}. ID do upload: {existing_upload.id}"
+            )
 
+    # Referência ao arquivo do preview (pode ter sido apagado se expirou)
     try:
-        shutil.move(str(temp_file_path), str(permanent_path))
-    except Exception as e:
+        acquire_blob(db, content_sha256)
+    except FileNotFoundError:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro interno ao processar arquivo. Tente novamente."
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Arquivo temporário não encontrado ou expirou"
         )
 
-    # Extrair chave NF-e para validação de duplicatas (se coluna existir)
-    nfe_key = None
-    try:
-        if upload_data.nfe_data and upload_data.nfe_data.get('chave_acesso'):
-            nfe_key = upload_data.nfe_data['chave_acesso']
-
-            # Validar se NF-e já foi processada por este usuário
-            # Só valida se a coluna nfe_key existir no banco
-            if hasattr(models.XMLUpload, 'nfe_key'):
-                existing_upload = db.query(models.XMLUpload).filter(
-                    models.XMLUpload.user_id == current_user.id,
-                    models.XMLUpload.nfe_key == nfe_key
-                ).first()
-
-                if existing_upload:
-                    # Deletar arquivo temporário
-                    if permanent_path.exists():
-                        permanent_path.unlink()
-
-                    raise HTTPException(
-                        status_code=status.HTTP_409_CONFLICT,
-                        detail=f"NF-e com chave {nfe_key} já foi processada em {existing_upload.upload_date.strftime('%d/%m/%Y %H:%M')}. ID do upload: {existing_upload.id}"
-                    )
-    except HTTPException:
-        raise  # Re-raise se for erro de duplicata
-    except Exception as e:
-        # Se coluna não existir ainda (antes da migração), continua sem validar
-        print(f"Aviso: Validação de duplicatas ignorada (migração pendente): {e}")
-        nfe_key = None
-
     # Processar XML para extrair período
-    period = None
-    if upload_data.nfe_data and upload_data.nfe_data.get('data_emissao'):
-        try:
-            from datetime import datetime as dt
-            data_emissao = upload_data.nfe_data['data_emissao']
-            if isinstance(data_emissao, str):
-                data_emissao = dt.fromisoformat(data_emissao.split('T')[0])
-            ano = data_emissao.year
-            trimestre = (data_emissao.month - 1) // 3 + 1
-            period = f"Q{trimestre}-{ano}"
-        except Exception as e:
-            print(f"Erro ao calcular período: {e}")
+    period = period_from_emission((upload_data.nfe_data or {}).get('data_emissao'))
 
     # Criar registro no banco com dados confirmados/editados
-    upload_data_dict = {
-        "user_id": current_user.id,
-        "filename": upload_data.filename,
-        "file_path": str(permanent_path),
-        "period": period,
-        "status": "processed"
-    }
-
-    # Adicionar nfe_key apenas se a coluna existir (após migração)
-    if hasattr(models.XMLUpload, 'nfe_key'):
-        upload_data_dict["nfe_key"] = nfe_key
+    xml_upload = models.XMLUpload(
+        user_id=current_user.id,
+        filename=upload_data.filename,
+        file_path=file_store.uri(content_sha256),
+        content_sha256=content_sha256,
+        compression_ratio=blob_compression_ratio(db, content_sha256),
+        period=period,
+        nfe_key=nfe_key,
+        status="processed"
+    )
+    db.add(xml_upload)
 
-    xml_upload = models.XMLUpload(**upload_data_dict)
+    # Persistir dados extraídos para que relatórios não re-parseiem o arquivo
+    if extract_upload(db, xml_upload) is None:
+        xml_upload.status = "error"
+        xml_upload.error_message = "Não foi possível extrair dados do arquivo"
 
-    db.add(xml_upload)
     db.commit()
     db.refresh(xml_upload)
 
-    # Limpar diretório temporário se vazio
-    try:
-        temp_dir = temp_file_path.parent
-        if temp_dir.exists() and not list(temp_dir.iterdir()):
-            temp_dir.rmdir()
-    except:
-        pass
-
     return xml_upload
 
 
 @router.get("/uploads")
 async def list_uploads(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    response: Response,
+    period: Optional[str] = None,
+    upload_status: Optional[str] = Query(None, alias="status"),
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
-    Lista uploads do usuário.
-    PERFORMANCE: Limite de 1000 uploads mais recentes para evitar sobrecarga.
+    Lista uploads do usuário, mais recentes primeiro.
+    Filtros opcionais: period e status.
+    PERFORMANCE: Paginação por keyset em (upload_date, id), lendo só as
+    colunas da resposta; a próxima página vem do cursor no header X-Next-Cursor.
     """
-    uploads = db.query(models.XMLUpload).filter(
+    stmt = select(models.XMLUpload).options(load_only(
+        models.XMLUpload.id,
+        models.XMLUpload.filename,
+        models.XMLUpload.upload_date,
+        models.XMLUpload.period,
+        models.XMLUpload.nfe_key,
+        models.XMLUpload.status,
+        models.XMLUpload.error_message
+    )).where(
         models.XMLUpload.user_id == current_user.id
-    ).order_by(models.XMLUpload.upload_date.desc()).limit(1000).all()
+    )
+
+    if period:
+        stmt = stmt.where(models.XMLUpload.period == period)
+    if upload_status:
+        stmt = stmt.where(models.XMLUpload.status == upload_status)
+
+    stmt = keyset_page(db, stmt, models.XMLUpload.upload_date, models.XMLUpload.id, cursor, limit)
+    uploads = finish_page((await db.scalars(stmt)).all(), limit, response, "upload_date")
 
     return [{
         "id": u.id,
         "filename": u.filename,
         "upload_date": u.upload_date.isoformat(),
         "period": u.period,
-        "nfe_key": getattr(u, 'nfe_key', None),
+        "nfe_key": u.nfe_key,
         "status": u.status,
         "error_message": u.error_message
     } for u in uploads]
 
 
 @router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_upload(
+def delete_upload(
     upload_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Deleta um upload específico do usuário.
-    Remove o arquivo físico e o registro do banco.
+    Remove o registro do banco e a referência ao arquivo (o file store
+    apaga o conteúdo quando nenhum outro upload o usa).
     """
-    import os
-
     # Buscar upload
     upload = db.query(models.XMLUpload).filter(
         models.XMLUpload.id == upload_id,
@@ -776,8 +833,10 @@ async def delete_upload(
             detail="Upload não encontrado"
         )
 
-    # Deletar arquivo físico se existir
-    if upload.file_path and os.path.exists(upload.file_path):
+    if upload.content_sha256:
+        release_blobs(db, [upload.content_sha256])
+    elif upload.file_path and os.path.exists(upload.file_path):
+        # Upload anterior ao file store: arquivo próprio no disco
         try:
             os.remove(upload.file_path)
         except Exception as e:
@@ -792,11 +851,11 @@ async def delete_upload(
 
 
 @router.patch("/uploads/{upload_id}")
-async def update_upload_period(
+def update_upload_period(
     upload_id: int,
     period: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Atualiza o período de um upload específico.
@@ -823,8 +882,9 @@ async def update_upload_period(
             detail="Upload não encontrado"
         )
 
-    # Atualizar período
+    # Atualizar período (fatos de relatório saem do período anterior)
     upload.period = period
+    move_report_facts(db, upload.id, period)
     db.commit()
     db.refresh(upload)
 
@@ -837,75 +897,161 @@ async def update_upload_period(
 
 
 @router.post("/upload", response_model=schemas.XMLUploadResponse, status_code=status.HTTP_201_CREATED)
-async def upload_xml(
+def upload_xml(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Upload de arquivo XML ou PDF de NF-e (upload direto sem preview).
     Valida segurança e processa arquivo.
     """
-    # Validar arquivo
+    # Validar arquivo e extrair dados em uma única passada
+    # (síncrono por enquanto, futuro: Celery)
     try:
-        content = await file.read()
-        validate_file_security(file.filename, content, settings.max_upload_size)
-        await file.seek(0)  # Reset file pointer
+        upload_info = _read_upload(file)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
 
-    # Criar diretório de upload do usuário
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    user_upload_dir = Path(settings.upload_dir) / f"user_{current_user.id}"
-    user_upload_dir.mkdir(parents=True, exist_ok=True)
+    nfe_data = upload_info["nfe_data"]
+    error_message = None if nfe_data else "Não foi possível extrair dados do arquivo"
 
-    # Salvar arquivo
-    safe_filename = f"{timestamp}_{file.filename}"
-    file_path = user_upload_dir / safe_filename
-
-    try:
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Erro interno ao salvar arquivo. Tente novamente."
-        )
+    # Salvar arquivo (conteúdo repetido é gravado uma única vez)
+    stored = _store_upload(db, file)
 
     # Criar registro no banco
     xml_upload = models.XMLUpload(
         user_id=current_user.id,
         filename=file.filename,
-        file_path=str(file_path),
-        status="pending"
+        file_path=file_store.uri(stored.sha256),
+        content_sha256=stored.sha256,
+        compression_ratio=stored.compression_ratio,
+        status="processed" if nfe_data else "error",
+        error_message=error_message
     )
-
     db.add(xml_upload)
+
+    # Dados extraídos ficam persistidos para a geração de relatórios
+    if nfe_data:
+        persist_nfe_data(db, xml_upload, nfe_data)
+
     db.commit()
     db.refresh(xml_upload)
 
-    # Processar arquivo (síncrono por enquanto, futuro: Celery)
-    try:
-        processor = NFeProcessor()
-        nfe_data = processor.process_file(str(file_path))
+    return xml_upload
 
-        if nfe_data:
-            xml_upload.status = "processed"
-        else:
-            xml_upload.status = "error"
-            xml_upload.error_message = "Não foi possível extrair dados do arquivo"
 
-    except Exception as e:
-        xml_upload.status = "error"
-        xml_upload.error_message = str(e)
+def _batch_response(job: models.UploadBatch) -> dict:
+    return {
+        "job_id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "total_files": job.total_files,
+        "processed_files": job.processed_files,
+        "created": job.created_count,
+        "duplicates": job.duplicate_count,
+        "errors": job.error_count,
+        "error_message": job.error_message,
+        "results": job.results or []
+    }
+
+
+@router.post("/upload-batch", response_model=schemas.UploadBatchResponse, status_code=status.HTTP_201_CREATED)
+@limiter.limit("5/minute")  # SEGURANÇA: Rate limit (cada lote pode ter milhares de notas)
+def upload_batch(
+    request: Request,
+    response: Response,
+    file: UploadFile = File(...),
+    background: bool = False,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
+):
+    """
+    Upload em lote: um ZIP com até settings.batch_max_files NF-e (XML ou PDF).
+
+    Cada arquivo é validado e importado individualmente; notas com chave de
+    acesso já importada (ou repetida no ZIP) são marcadas como duplicadas.
+    Retorna o resumo por arquivo e o ID do job (GET /upload-batch/{job_id}).
+
+    Com ?background=true o ZIP é gravado e importado pelo worker
+    (python -m app.worker): responde 202 com o job em "queued".
+    """
+    # Validar ZIP: extensão, assinatura e tamanho compactado
+    header = file.file.read(4)
+    if not is_zip_file(file.filename or "", header):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Envie um arquivo .zip com as NF-e"
+        )
+
+    file.file.seek(0, os.SEEK_END)
+    zip_size = file.file.tell()
+    file.file.seek(0)
+    if zip_size > settings.batch_max_upload_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"ZIP muito grande. Tamanho máximo: {settings.batch_max_upload_size // (1024 * 1024)}MB"
+        )
 
+    job = models.UploadBatch(
+        user_id=current_user.id,
+        filename=sanitize_filename(file.filename),
+        status="queued" if background else "processing"
+    )
+    db.add(job)
     db.commit()
-    db.refresh(xml_upload)
+    db.refresh(job)
 
-    return xml_upload
+    if background:
+        # ZIP no file store (o worker pode estar em outra máquina); a
+        # referência é do job e é liberada quando ele termina
+        zip_sha256 = _store_upload(db, file).sha256
+        enqueue_job(db, "batch_upload", {"batch_id": job.id, "zip_sha256": zip_sha256}, user_id=current_user.id)
+        db.commit()
+
+        response.status_code = status.HTTP_202_ACCEPTED
+        return _batch_response(job)
+
+    # Síncrono: o job registra o progresso e o resultado
+    try:
+        ZipBatchImporter(db, current_user.id, job).run(file.file)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro interno ao processar o lote. ID do job: {job.id}"
+        )
+
+    db.refresh(job)
+    return _batch_response(job)
+
+
+@router.get("/upload-batch/{job_id}", response_model=schemas.UploadBatchResponse)
+def get_upload_batch(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
+):
+    """Status e resumo por arquivo de um upload em lote."""
+    job = db.query(models.UploadBatch).filter(
+        models.UploadBatch.id == job_id,
+        models.UploadBatch.user_id == current_user.id
+    ).first()
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload em lote não encontrado"
+        )
+
+    return _batch_response(job)
 
 
 # NOTA: Funções list_uploads e delete_upload já definidas anteriormente (linhas ~725-780)
@@ -913,10 +1059,10 @@ async def upload_xml(
 
 
 @router.get("/uploads/{upload_id}")
-async def get_upload_details(
+def get_upload_details(
     upload_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Retorna detalhes completos de um upload para edição.
@@ -933,44 +1079,31 @@ async def get_upload_details(
             detail="Upload não encontrado"
         )
 
-    # Ler e parsear o XML novamente
+    # Dados extraídos no upload (re-extrai apenas se ausentes ou de parser antigo)
     try:
-        from app.utils.xml_parser import parse_nfe_xml
+        document = upload.nfe_document
+        if needs_extraction(document):
+            if not upload_file_exists(upload):
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Arquivo XML não encontrado no servidor"
+                )
+            nfe_obj = extract_upload(db, upload)
+            if nfe_obj is None:
+                raise ValueError("Não foi possível extrair dados do arquivo")
+            db.commit()
+        else:
+            nfe_obj = document_to_nfe_data(document)
 
-        if not os.path.exists(upload.file_path):
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Arquivo XML não encontrado no servidor"
-            )
+        nfe_data = nfe_obj.to_dict()
+
+        # Matching com o catálogo: referência (código do produto) ou nome
+        catalog = catalog_cache.get(db, current_user.id)
 
-        # Parsear XML
-        nfe_data = parse_nfe_xml(upload.file_path)
-
-        # Buscar produtos cadastrados e fazer matching
-        products = db.query(models.Product).filter(
-            models.Product.user_id == current_user.id
-        ).all()
-
-        # Adicionar informação de matching aos produtos do XML
-        produtos_com_match = []
-        for produto in nfe_data.get('produtos', []):
-            produto_dict = produto.copy()
-
-            # Tentar encontrar match pelo código do produto e registro MAPA
-            matched_product = None
-            codigo_produto = produto.get('codigo', '')
-
-            # Buscar por product_reference (código do produto) ou product_name
-            for prod in products:
-                # Match por referência do produto
-                if prod.product_reference and prod.product_reference == codigo_produto:
-                    matched_product = prod
-                    break
-                # Match por nome similar
-                if prod.product_name and produto.get('descricao') and \
-                   prod.product_name.lower() == produto.get('descricao', '').lower():
-                    matched_product = prod
-                    break
+        for produto_dict in nfe_data['produtos']:
+            matched_product = catalog.product_by_reference.get(produto_dict.get('codigo') or '')
+            if matched_product is None and produto_dict.get('descricao'):
+                matched_product = catalog.product_by_normalized.get(normalize_name(produto_dict['descricao']))
 
             if matched_product:
                 produto_dict['matched_mapa_registration'] = matched_product.mapa_registration
@@ -981,10 +1114,6 @@ async def get_upload_details(
                 produto_dict['matched_product_reference'] = None
                 produto_dict['matched_product_name'] = None
 
-            produtos_com_match.append(produto_dict)
-
-        nfe_data['produtos'] = produtos_com_match
-
         return {
             "id": upload.id,
             "filename": upload.filename,
@@ -994,6 +1123,8 @@ async def get_upload_details(
             "nfe_data": nfe_data
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         print(f"Erro ao buscar detalhes do upload: {str(e)}")
@@ -1005,11 +1136,11 @@ async def get_upload_details(
 
 
 @router.put("/uploads/{upload_id}")
-async def update_upload(
+def update_upload(
     upload_id: int,
     edit_data: dict,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Atualiza um upload com dados editados.
@@ -1055,34 +1186,34 @@ async def update_upload(
 
 @router.post("/generate-report", response_model=schemas.ReportResponse)
 @limiter.limit("5/minute")  # SEGURANÇA: Rate limit para prevenir DoS via processamento intensivo
-async def generate_report(
-    http_request: Request,
-    request: schemas.ReportGenerateRequest,
+def generate_report(
+    request: Request,
+    report_request: schemas.ReportGenerateRequest,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Gera relatório MAPA para o período especificado.
     Processa todos os XMLs do usuário e valida com catálogo.
     SEGURANÇA: Rate limited para prevenir DoS via processamento intensivo.
     """
-    # Buscar XMLs processados para o período
-    uploads = db.query(models.XMLUpload).filter(
+    # Verificar se há XMLs processados para o período
+    has_uploads = db.query(models.XMLUpload.id).filter(
         models.XMLUpload.user_id == current_user.id,
         models.XMLUpload.status == "processed",
-        models.XMLUpload.period == request.period
-    ).all()
+        models.XMLUpload.period == report_request.period
+    ).first()
 
-    if not uploads:
+    if not has_uploads:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Nenhum XML processado encontrado para o período {request.period}"
+            detail=f"Nenhum XML processado encontrado para o período {report_request.period}"
         )
 
-    # Processar com MAPA Processor
+    # Processar com MAPA Processor (report_facts, resultado em cache)
     try:
         processor = MAPAProcessor(db, current_user.id)
-        result = processor.process_uploads(uploads)
+        result = processor.report_period(report_request.period)
 
         if not result["success"]:
             # Retornar erro com lista de itens não cadastrados
@@ -1097,7 +1228,7 @@ async def generate_report(
         # Salvar relatório no banco
         report = models.Report(
             user_id=current_user.id,
-            report_period=request.period,
+            report_period=report_request.period,
         )
         db.add(report)
         db.commit()
@@ -1107,7 +1238,7 @@ async def generate_report(
         return {
             "success": True,
             "message": result["message"],
-            "period": request.period,
+            "period": report_request.period,
             "total_nfes": result["total_nfes"],
             "rows": result["rows"]
         }
@@ -1122,17 +1253,34 @@ async def generate_report(
 
 
 @router.get("/reports")
-async def list_reports(
+def list_reports(
+    response: Response,
+    period: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
-    Lista relatórios gerados pelo usuário.
-    PERFORMANCE: Limite de 1000 relatórios mais recentes para evitar sobrecarga.
+    Lista relatórios gerados pelo usuário, mais recentes primeiro.
+    Filtro opcional: period.
+    PERFORMANCE: Paginação por keyset em (generated_at, id), lendo só as
+    colunas da resposta; a próxima página vem do cursor no header X-Next-Cursor.
     """
-    reports = db.query(models.Report).filter(
+    query = db.query(models.Report).options(load_only(
+        models.Report.id,
+        models.Report.report_period,
+        models.Report.generated_at,
+        models.Report.file_path
+    )).filter(
         models.Report.user_id == current_user.id
-    ).order_by(models.Report.generated_at.desc()).limit(1000).all()
+    )
+
+    if period:
+        query = query.filter(models.Report.report_period == period)
+
+    query = keyset_page(db, query, models.Report.generated_at, models.Report.id, cursor, limit)
+    reports = finish_page(query.all(), limit, response, "generated_at")
 
     return [{
         "id": r.id,
@@ -1143,10 +1291,10 @@ async def list_reports(
 
 
 @router.delete("/reports/{report_id}")
-async def delete_report(
+def delete_report(
     report_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Deleta um relatório"""
     report = db.query(models.Report).filter(
@@ -1167,10 +1315,10 @@ async def delete_report(
 
 
 @router.get("/reports/{report_period}/download")
-async def download_report(
+def download_report(
     report_period: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Gera relatório em PDF para download.
@@ -1181,22 +1329,22 @@ async def download_report(
     import os
 
     try:
-        # Buscar XMLs processados para o período
-        uploads = db.query(models.XMLUpload).filter(
+        # Verificar se há XMLs processados para o período
+        has_uploads = db.query(models.XMLUpload.id).filter(
             models.XMLUpload.user_id == current_user.id,
             models.XMLUpload.status == "processed",
             models.XMLUpload.period == report_period
-        ).all()
+        ).first()
 
-        if not uploads:
+        if not has_uploads:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Nenhum XML processado encontrado para o período {report_period}"
             )
 
-        # Processar com MAPA Processor
+        # Mesmo resultado do generate-report (cache por período/catálogo/uploads)
         processor = MAPAProcessor(db, current_user.id)
-        result = processor.process_uploads(uploads)
+        result = processor.report_period(report_period)
 
         if not result["success"]:
             raise HTTPException(
@@ -1206,10 +1354,11 @@ async def download_report(
 
         # Gerar PDF
         pdf_generator = MAPAReportPDFGenerator()
+        user = auth.load_user(db, current_user)
         user_info = {
-            "full_name": current_user.full_name,
-            "company_name": current_user.company_name,
-            "email": current_user.email
+            "full_name": user.full_name,
+            "company_name": user.company_name,
+            "email": user.email
         }
 
         pdf_buffer = pdf_generator.generate_report(
@@ -1239,13 +1388,115 @@ async def download_report(
         )
 
 
+# ============================================================================
+# JOBS (executados por python -m app.worker)
+# ============================================================================
+
+def _job_response(job: models.Job) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "run_after": job.run_after if job.status == "queued" else None,
+        "error_message": job.error_message,
+        "result": job.result,
+        "artifact_url": f"/api/user/jobs/{job.id}/artifact" if job.artifact_path else None
+    }
+
+
+def _get_user_job(db: Session, job_id: int, user_id: int) -> models.Job:
+    job = db.query(models.Job).filter(
+        models.Job.id == job_id,
+        models.Job.user_id == user_id
+    ).first()
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job não encontrado"
+        )
+    return job
+
+
+@router.post("/jobs", response_model=schemas.JobResponse, status_code=status.HTTP_202_ACCEPTED)
+@limiter.limit("30/minute")
+def create_job(
+    request: Request,
+    job_request: schemas.JobCreateRequest,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
+):
+    """
+    Enfileira um relatório (PDF como artefato) ou backfill de fatos.
+    O processamento acontece no worker; acompanhe por GET /jobs/{job_id}.
+    """
+    payload = {"period": job_request.period} if job_request.period else {}
+    job = enqueue_job(db, job_request.kind, payload, user_id=current_user.id)
+    db.commit()
+    db.refresh(job)
+
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.JobResponse)
+def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
+):
+    """Status, tentativas e resultado de um job."""
+    return _job_response(_get_user_job(db, job_id, current_user.id))
+
+
+@router.get("/jobs/{job_id}/artifact")
+def download_job_artifact(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
+):
+    """Arquivo gerado pelo job (ex: PDF do relatório), lido em streaming do file store."""
+    from fastapi.responses import FileResponse, StreamingResponse
+
+    job = _get_user_job(db, job_id, current_user.id)
+    not_found = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Job sem arquivo disponível"
+    )
+    if job.status != "succeeded" or not job.artifact_path:
+        raise not_found
+
+    if not job.artifact_sha256:
+        # Artefato anterior ao file store: arquivo no disco local
+        if not os.path.exists(job.artifact_path):
+            raise not_found
+        filename = os.path.basename(job.artifact_path).split("_", 2)[-1]
+        return FileResponse(job.artifact_path, media_type="application/pdf", filename=filename)
+
+    try:
+        stream = file_store.open(job.artifact_sha256)
+    except FileNotFoundError:
+        raise not_found
+
+    filename = (job.result or {}).get("artifact_filename") or f"job_{job.id}.pdf"
+    return StreamingResponse(
+        read_chunks(stream),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 # ============================================================================
 # PROPOSTA COMERCIAL
 # ============================================================================
 
 @router.get("/proposta-comercial")
-async def get_proposta_comercial(
-    current_user: models.User = Depends(auth.get_current_user)
+def get_proposta_comercial(
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """
     Retorna o conteúdo do arquivo PROPOSTA_COMERCIAL_WORD.txt.
@@ -3,7 +3,7 @@ Schemas Pydantic para validação de requests/responses.
 Separados por entidade para melhor organização.
 """
 
-from pydantic import BaseModel, EmailStr, Field, field_validator
+from pydantic import BaseModel, EmailStr, Field, field_validator, model_validator
 from typing import Optional, List
 from datetime import datetime
 
@@ -30,6 +30,7 @@ class UserUpdate(BaseModel):
     full_name: Optional[str] = Field(None, min_length=3, max_length=255)
     company_name: Optional[str] = Field(None, max_length=255)
     is_active: Optional[bool] = None
+    is_admin: Optional[bool] = None
     password: Optional[str] = Field(None, min_length=12)
 
 
@@ -56,6 +57,13 @@ class UserResponse(UserBase):
         from_attributes = True
 
 
+class UserUpdateResponse(UserResponse):
+    """Resposta de PATCH /users/{id}: com tokens novos quando o admin troca a própria senha"""
+    access_token: Optional[str] = None
+    refresh_token: Optional[str] = None
+    token_type: Optional[str] = None
+
+
 # ============================================================================
 # AUTH SCHEMAS
 # ============================================================================
@@ -67,11 +75,17 @@ class LoginRequest(BaseModel):
 
 
 class TokenResponse(BaseModel):
-    """Schema de resposta com token JWT"""
+    """Schema de resposta com token JWT (e refresh token, rotacionado a cada uso)"""
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
 
 
+class RefreshTokenRequest(BaseModel):
+    """Schema para renovar a sessão (/auth/refresh) ou encerrá-la (/auth/logout)"""
+    refresh_token: str = Field(..., min_length=1, max_length=255)
+
+
 # ============================================================================
 # COMPANY SCHEMAS
 # ============================================================================
@@ -150,6 +164,7 @@ class XMLUploadResponse(BaseModel):
     upload_date: datetime
     status: str
     error_message: Optional[str]
+    compression_ratio: Optional[float] = None  # Tamanho original / gravado
 
     class Config:
         from_attributes = True
@@ -157,7 +172,7 @@ class XMLUploadResponse(BaseModel):
 
 class XMLPreviewResponse(BaseModel):
     """Schema de resposta de preview de XML"""
-    temp_file_path: str
+    temp_file_path: str  # Token assinado do arquivo em staging (nome mantido por compatibilidade)
     filename: str
     nfe_data: dict
     periodo_trimestral: Optional[str]
@@ -169,11 +184,34 @@ class XMLPreviewResponse(BaseModel):
 
 class XMLUploadConfirm(BaseModel):
     """Schema para confirmar upload após preview"""
-    temp_file_path: str
+    temp_file_path: str  # Token retornado pelo preview
     filename: str
     nfe_data: Optional[dict] = None  # Dados editados pelo usuário
 
 
+class UploadBatchFileResult(BaseModel):
+    """Resultado de um arquivo do ZIP"""
+    filename: str
+    status: str  # created, duplicate, error
+    upload_id: Optional[int] = None
+    chave_acesso: Optional[str] = None
+    message: Optional[str] = None
+
+
+class UploadBatchResponse(BaseModel):
+    """Schema de resposta do job de upload em lote"""
+    job_id: int
+    filename: str
+    status: str  # processing, completed, failed
+    total_files: int
+    processed_files: int
+    created: int
+    duplicates: int
+    errors: int
+    error_message: Optional[str] = None
+    results: List[UploadBatchFileResult] = []
+
+
 # ============================================================================
 # REPORT SCHEMAS
 # ============================================================================
@@ -217,6 +255,39 @@ class ReportError(BaseModel):
     unregistered_entries: List[dict]
 
 
+# ============================================================================
+# JOB SCHEMAS
+# ============================================================================
+
+class JobCreateRequest(BaseModel):
+    """Schema para enfileirar um job (executado por python -m app.worker)"""
+    kind: str = Field(..., pattern=r"^(report|backfill_facts)$")
+    period: Optional[str] = Field(None, pattern=r"^Q[1-4]-\d{4}$")
+
+    @model_validator(mode="after")
+    def validate_period(self):
+        """Relatório exige período; backfill sem período cobre todos"""
+        if self.kind == "report" and not self.period:
+            raise ValueError("Período é obrigatório para o relatório")
+        return self
+
+
+class JobResponse(BaseModel):
+    """Schema de resposta de status de job"""
+    job_id: int
+    kind: str
+    status: str  # queued, running, succeeded, failed
+    attempts: int
+    max_attempts: int
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    run_after: Optional[datetime] = None
+    error_message: Optional[str] = None
+    result: Optional[dict] = None
+    artifact_url: Optional[str] = None
+
+
 # ============================================================================
 # CATALOG SCHEMAS
 # ============================================================================
@@ -234,3 +305,19 @@ class CatalogResponse(BaseModel):
     total_companies: int
     total_products: int
     companies: List[CompanyWithProducts]
+
+
+class CatalogImportError(BaseModel):
+    """Linha do arquivo de catálogo ignorada"""
+    row: int  # Número da linha (cabeçalho = 1)
+    message: str
+
+
+class CatalogImportResponse(BaseModel):
+    """Schema de resposta da importação do catálogo (CSV/XLSX)"""
+    rows: int  # Linhas válidas
+    companies_created: int
+    companies_updated: int
+    products_created: int
+    products_updated: int
+    errors: List[CatalogImportError] = []
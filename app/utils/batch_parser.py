@@ -0,0 +1,157 @@
+"""
+Parsing de NF-e em lote.
+Distribui NFeProcessor.process_file em um pool de processos limitado,
+mantendo a ordem dos resultados igual à ordem de entrada.
+
+O mesmo pool atende uploads individuais grandes (read_upload): o parsing
+sai do processo da API e não disputa o GIL com as demais requisições.
+
+Os processos do pool saem de um forkserver (spawn no Windows), nunca de um
+fork direto da API: o processo da API tem várias threads (threadpool das
+rotas, executor de senhas), e um fork herdaria locks presos por elas
+(logging, pool do SQLAlchemy), travando o filho.
+"""
+
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Sequence
+
+from app.config import settings
+from app.utils.nfe_processor import NFeData, NFeProcessor
+from app.utils.validators import UPLOAD_CHUNK_SIZE, read_upload_stream
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Processador reaproveitado dentro de cada processo worker
+_worker_processor: Optional[NFeProcessor] = None
+
+
+def get_pool_size() -> int:
+    """Número de processos do pool (settings.parse_pool_workers ou CPUs)."""
+    return settings.parse_pool_workers or os.cpu_count() or 1
+
+
+def _pool_context():
+    """Contexto de multiprocessing sem fork do processo atual."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # O servidor já importa o parser: cada processo novo herda os módulos
+        context.set_forkserver_preload(["app.utils.nfe_processor"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """Retorna o pool compartilhado, criando-o na primeira chamada."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=get_pool_size(), mp_context=_pool_context())
+            logger.info(f"✓ Pool de parsing criado com {get_pool_size()} processos")
+        return _pool
+
+
+def shutdown_parse_pool():
+    """Encerra o pool (chamado no shutdown da aplicação)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def _parse_one(processor: NFeProcessor, file_path: str) -> Optional[NFeData]:
+    """Parseia um arquivo sem propagar exceções (falha vira None)."""
+    try:
+        return processor.process_file(file_path)
+    except Exception as e:
+        logger.warning(f"Falha ao processar {file_path}: {e}")
+        return None
+
+
+def _parse_in_worker(file_path: str) -> Optional[NFeData]:
+    """Executado dentro do processo worker."""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = NFeProcessor()
+    return _parse_one(_worker_processor, file_path)
+
+
+def parse_files(file_paths: Sequence[str]) -> List[Optional[NFeData]]:
+    """
+    Parseia vários arquivos de NF-e.
+
+    Lotes pequenos (< settings.parse_pool_min_batch) ou pool de 1 processo
+    rodam em série no processo atual, evitando o custo de serialização.
+
+    Returns:
+        Lista de NFeData (ou None para arquivos que falharam), na mesma
+        ordem de file_paths.
+    """
+    file_paths = list(file_paths)
+    pool_size = get_pool_size()
+
+    if len(file_paths) < settings.parse_pool_min_batch or pool_size <= 1:
+        processor = NFeProcessor()
+        return [_parse_one(processor, path) for path in file_paths]
+
+    # Chunks reduzem o número de round-trips entre processos
+    chunksize = max(1, len(file_paths) // (pool_size * 4))
+
+    try:
+        return list(get_parse_pool().map(_parse_in_worker, file_paths, chunksize=chunksize))
+    except BrokenProcessPool:
+        logger.exception("Pool de parsing quebrou, reprocessando lote em série")
+        shutdown_parse_pool()
+        processor = NFeProcessor()
+        return [_parse_one(processor, path) for path in file_paths]
+
+
+def _read_upload_in_worker(file_path: str, filename: str, max_size: int) -> dict:
+    """Executado dentro do processo worker."""
+    with open(file_path, "rb") as stream:
+        return read_upload_stream(stream, filename, max_size)
+
+
+def read_upload(stream: BinaryIO, filename: str, max_size: int) -> dict:
+    """
+    Valida e extrai um upload (validators.read_upload_stream).
+
+    PDFs e arquivos a partir de settings.upload_pool_threshold são copiados
+    para um arquivo temporário e processados em um processo do pool; os
+    demais (ou com pool de 1 processo) são lidos no processo atual.
+    Levanta ValueError se o arquivo for inválido.
+    """
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+
+    is_pdf = (filename or "").lower().endswith(".pdf")
+    if get_pool_size() <= 1 or size > max_size or (size < settings.upload_pool_threshold and not is_pdf):
+        return read_upload_stream(stream, filename, max_size)
+
+    staging_dir = Path(settings.upload_dir) / "temp"
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    fd, staging_path = tempfile.mkstemp(dir=staging_dir, suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as target:
+            shutil.copyfileobj(stream, target, UPLOAD_CHUNK_SIZE)
+
+        try:
+            return get_parse_pool().submit(_read_upload_in_worker, staging_path, filename, max_size).result()
+        except BrokenProcessPool:
+            logger.exception("Pool de parsing quebrou, processando upload no processo atual")
+            shutdown_parse_pool()
+            return _read_upload_in_worker(staging_path, filename, max_size)
+    finally:
+        os.unlink(staging_path)
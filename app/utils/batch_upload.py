@@ -0,0 +1,273 @@
+"""
+Importação em lote de NF-e a partir de um ZIP.
+
+Os membros são lidos em streaming (zipfile), validados bloco a bloco e
+gravados um a um em uma área de trabalho local: o ZIP nunca é
+descompactado inteiro em memória. Em seguida os arquivos são parseados em
+paralelo (pool de processos), deduplicados pela chave de acesso e
+inseridos em uma única transação; só as notas importadas vão para o file
+store. A área de trabalho é removida ao final.
+"""
+
+import logging
+import os
+import shutil
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Dict, List
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.utils.batch_parser import parse_files
+from app.utils.file_store import add_blob, file_store
+from app.utils.nfe_store import period_from_emission, persist_nfe_data
+from app.utils.validators import UPLOAD_CHUNK_SIZE, StreamingUploadValidator, sanitize_filename
+
+logger = logging.getLogger(__name__)
+
+ZIP_MAGIC = b"PK\x03\x04"
+
+# Consulta de chaves já existentes em blocos (limite de parâmetros do IN)
+_KEY_QUERY_CHUNK = 500
+
+# Frequência de atualização do progresso do job (em arquivos)
+_PROGRESS_EVERY = 50
+
+
+class BatchLimitExceeded(ValueError):
+    """Limite do lote inteiro excedido (aborta o ZIP, não só o arquivo)."""
+
+
+class ZipBatchImporter:
+    """
+    Processa um ZIP para um usuário, registrando o progresso no UploadBatch.
+
+    Erros de um arquivo viram resultado "error" daquele arquivo; erros do
+    ZIP como um todo (inválido, limites excedidos) levantam ValueError e
+    marcam o job como "failed".
+    """
+
+    def __init__(self, db: Session, user_id: int, job: models.UploadBatch):
+        self.db = db
+        self.user_id = user_id
+        self.job = job
+        self.target_dir = Path(settings.upload_dir) / "temp" / f"batch_{job.id}"
+        self._results: Dict[int, dict] = {}  # índice no ZIP -> resultado
+
+    def run(self, zip_stream: BinaryIO) -> models.UploadBatch:
+        """Executa a importação. O ZIP precisa ser um arquivo com seek."""
+        try:
+            staged = self._extract_members(zip_stream)
+            self._ingest(staged)
+        except Exception as e:
+            self.db.rollback()
+            self._fail(str(e) if isinstance(e, ValueError) else "Erro interno ao processar o ZIP")
+            if not isinstance(e, ValueError):
+                logger.exception(f"Falha no upload em lote {self.job.id}")
+            raise
+        finally:
+            shutil.rmtree(self.target_dir, ignore_errors=True)
+
+        return self.job
+
+    # ─── etapa 1: leitura e validação dos membros ────────────────────────────
+
+    def _extract_members(self, zip_stream: BinaryIO) -> List[dict]:
+        try:
+            archive = zipfile.ZipFile(zip_stream)
+        except zipfile.BadZipFile:
+            raise ValueError("Arquivo ZIP inválido ou corrompido")
+
+        with archive:
+            members = [info for info in archive.infolist() if self._is_candidate(info)]
+            if not members:
+                raise ValueError("O ZIP não contém arquivos")
+            if len(members) > settings.batch_max_files:
+                raise ValueError(
+                    f"O ZIP contém {len(members)} arquivos. Máximo: {settings.batch_max_files}"
+                )
+
+            self.job.total_files = len(members)
+            self.db.commit()
+
+            self.target_dir.mkdir(parents=True, exist_ok=True)
+            staged = []
+            total_size = 0
+
+            for index, info in enumerate(members, start=1):
+                filename = sanitize_filename(info.filename)
+                try:
+                    path, size = self._extract_member(archive, info, index, filename, total_size)
+                    total_size += size
+                    staged.append({"index": index, "filename": filename, "path": path})
+                except BatchLimitExceeded:
+                    raise
+                except ValueError as e:
+                    self._add_result(index, filename, "error", message=str(e))
+
+                if index % _PROGRESS_EVERY == 0:
+                    self.job.processed_files = index
+                    self.db.commit()
+
+        return staged
+
+    @staticmethod
+    def _is_candidate(info: zipfile.ZipInfo) -> bool:
+        """Ignora diretórios e metadados de sistemas operacionais."""
+        if info.is_dir():
+            return False
+        name = info.filename.replace("\\", "/")
+        basename = name.rsplit("/", 1)[-1]
+        return not (name.startswith("__MACOSX/") or basename.startswith(".") or not basename)
+
+    def _extract_member(
+        self,
+        archive: zipfile.ZipFile,
+        info: zipfile.ZipInfo,
+        index: int,
+        filename: str,
+        total_size: int
+    ) -> tuple:
+        """Valida um membro em streaming e grava em disco. Retorna (caminho, bytes)."""
+        if info.flag_bits & 0x1:
+            raise ValueError("Arquivo protegido por senha")
+
+        # Taxa declarada no cabeçalho; o tamanho real é verificado na leitura
+        if info.compress_size and info.file_size / info.compress_size > settings.batch_max_compression_ratio:
+            raise ValueError("Taxa de compressão suspeita (possível zip bomb)")
+
+        # XML é extraído depois, em paralelo; aqui só valida tamanho/MIME/magic
+        validator = StreamingUploadValidator(filename, settings.max_upload_size, extract=False)
+
+        final_path = self.target_dir / f"{index:05d}_{filename}"
+        part_path = final_path.with_name(final_path.name + ".part")
+        size = 0
+
+        try:
+            with archive.open(info) as member, open(part_path, "wb") as out:
+                while True:
+                    chunk = member.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if total_size + size > settings.batch_max_total_size:
+                        raise BatchLimitExceeded(
+                            "Conteúdo descompactado do ZIP excede o limite de "
+                            f"{settings.batch_max_total_size // (1024 * 1024)}MB"
+                        )
+                    validator.feed(chunk)
+                    out.write(chunk)
+            validator.close()
+        except BatchLimitExceeded:
+            part_path.unlink(missing_ok=True)
+            raise
+        except (ValueError, zipfile.BadZipFile, EOFError) as e:
+            part_path.unlink(missing_ok=True)
+            raise ValueError(str(e) or "Arquivo corrompido no ZIP")
+
+        os.replace(part_path, final_path)
+        return final_path, size
+
+    # ─── etapa 2: parsing em paralelo, deduplicação e inserção ────────────────
+
+    def _ingest(self, staged: List[dict]):
+        parsed = parse_files([str(item["path"]) for item in staged])
+
+        keys = {nfe_data.chave_acesso for nfe_data in parsed if nfe_data and nfe_data.chave_acesso}
+        seen = self._existing_keys(keys)
+
+        created = []
+        for item, nfe_data in zip(staged, parsed):
+            index, filename, path = item["index"], item["filename"], item["path"]
+
+            if nfe_data is None:
+                self._add_result(index, filename, "error", message="Não foi possível extrair dados do arquivo")
+                continue
+
+            chave = nfe_data.chave_acesso
+            if chave and chave in seen:
+                self._add_result(index, filename, "duplicate", chave_acesso=chave, message="NF-e já importada")
+                continue
+            if chave:
+                seen.add(chave)
+
+            with open(path, "rb") as stream:
+                stored = add_blob(self.db, stream)
+
+            upload = models.XMLUpload(
+                user_id=self.user_id,
+                filename=filename,
+                file_path=file_store.uri(stored.sha256),
+                content_sha256=stored.sha256,
+                compression_ratio=stored.compression_ratio,
+                period=period_from_emission(nfe_data.data_emissao),
+                status="processed"
+            )
+            self.db.add(upload)
+            persist_nfe_data(self.db, upload, nfe_data)
+            created.append((upload, self._add_result(index, filename, "created", chave_acesso=chave)))
+
+        # Uma única transação para todos os uploads do lote
+        self.db.flush()
+        for upload, result in created:
+            result["upload_id"] = upload.id
+
+        self._finish()
+        self.db.commit()
+
+    def _existing_keys(self, keys: set) -> set:
+        """Chaves de acesso já importadas pelo usuário (índice user_id, nfe_key)."""
+        existing = set()
+        keys = list(keys)
+        for start in range(0, len(keys), _KEY_QUERY_CHUNK):
+            chunk = keys[start:start + _KEY_QUERY_CHUNK]
+            rows = self.db.query(models.XMLUpload.nfe_key).filter(
+                models.XMLUpload.user_id == self.user_id,
+                models.XMLUpload.nfe_key.in_(chunk)
+            ).all()
+            existing.update(row[0] for row in rows)
+        return existing
+
+    # ─── estado do job ────────────────────────────────────────────────────────
+
+    @property
+    def results(self) -> List[dict]:
+        """Resultados na ordem dos arquivos no ZIP."""
+        return [self._results[index] for index in sorted(self._results)]
+
+    def _add_result(self, index: int, filename: str, status: str, **extra) -> dict:
+        result = {"filename": filename, "status": status, "upload_id": None,
+                  "chave_acesso": None, "message": None}
+        result.update(extra)
+        self._results[index] = result
+        return result
+
+    def _count(self, status: str) -> int:
+        return sum(1 for result in self._results.values() if result["status"] == status)
+
+    def _finish(self):
+        job = self.job
+        job.status = "completed"
+        job.processed_files = job.total_files
+        job.created_count = self._count("created")
+        job.duplicate_count = self._count("duplicate")
+        job.error_count = self._count("error")
+        job.results = self.results
+        job.finished_at = datetime.now(timezone.utc)
+
+    def _fail(self, message: str):
+        job = self.job
+        job.status = "failed"
+        job.error_message = message
+        job.results = self.results
+        job.error_count = self._count("error")
+        job.finished_at = datetime.now(timezone.utc)
+        self.db.commit()
+
+
+def is_zip_file(filename: str, header: bytes) -> bool:
+    """Extensão .zip e assinatura local file header."""
+    return filename.lower().endswith(".zip") and header.startswith(ZIP_MAGIC)
@@ -0,0 +1,238 @@
+"""
+Cache do catálogo (empresas/produtos) por usuário.
+
+Cada usuário tem um CatalogSnapshot imutável com os índices usados no
+matching (nome normalizado, referência, registro MAPA e trigramas). O
+snapshot fica em um LRU por processo e é válido enquanto
+users.catalog_version não mudar:
+toda alteração de empresa/produto chama bump_catalog_version na mesma
+transação, então outros processos/réplicas percebem a mudança na próxima
+leitura (uma consulta de uma coluna por requisição).
+"""
+
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.utils.catalog_matcher import TrigramIndex, normalize_name
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogCompany:
+    id: int
+    company_name: str
+    mapa_registration: str
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogProduct:
+    id: int
+    company_id: int
+    product_name: str
+    mapa_registration: str
+    product_reference: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogSnapshot:
+    """
+    Catálogo de um usuário em uma versão. Índices somente leitura
+    (nomes sempre por normalize_name; em colisões vale o cadastro mais antigo):
+
+    - company_index: nome -> empresa
+    - product_index: (company_id, nome) -> produto
+    - product_by_normalized: nome -> produto (qualquer empresa)
+    - product_by_reference: product_reference -> produto
+    - registration_index: registro completo ("PR-12345-6.000001") -> (empresa, produto)
+
+    Os índices de trigramas (sugestões) só são montados na primeira
+    sugestão pedida, por empresa: relatórios sem pendências não pagam por eles.
+    """
+    user_id: int
+    version: int
+    companies: Tuple[CatalogCompany, ...]
+    products: Tuple[CatalogProduct, ...]
+    company_index: Mapping[str, CatalogCompany]
+    product_index: Mapping[Tuple[int, str], CatalogProduct]
+    product_by_normalized: Mapping[str, CatalogProduct]
+    product_by_reference: Mapping[str, CatalogProduct]
+    registration_index: Mapping[str, Tuple[CatalogCompany, CatalogProduct]]
+    # (nome normalizado, entrada) para os índices de trigramas
+    company_names: Tuple[Tuple[str, CatalogCompany], ...]
+    product_names: Mapping[int, Tuple[Tuple[str, CatalogProduct], ...]]
+    _trigram_indexes: Dict = field(default_factory=dict, repr=False, compare=False)
+
+    def match_company(self, name: Optional[str]) -> Optional[CatalogCompany]:
+        return self.company_index.get(normalize_name(name))
+
+    def match_product(self, company: CatalogCompany, name: Optional[str]) -> Optional[CatalogProduct]:
+        return self.product_index.get((company.id, normalize_name(name)))
+
+    def suggest_companies(self, name: Optional[str], limit: int = 5) -> List[Tuple[CatalogCompany, float]]:
+        return self._trigram_index(None, self.company_names).search(name, limit)
+
+    def suggest_products(
+        self,
+        company: CatalogCompany,
+        name: Optional[str],
+        limit: int = 5
+    ) -> List[Tuple[CatalogProduct, float]]:
+        entries = self.product_names.get(company.id)
+        return self._trigram_index(company.id, entries).search(name, limit) if entries else []
+
+    def _trigram_index(self, key, entries) -> TrigramIndex:
+        # Montagem idempotente: corrida entre threads só repete o trabalho
+        index = self._trigram_indexes.get(key)
+        if index is None:
+            index = TrigramIndex(entries, normalized=True)
+            self._trigram_indexes[key] = index
+        return index
+
+    @classmethod
+    def build(cls, user_id: int, version: int, rows) -> "CatalogSnapshot":
+        """Monta os índices a partir de pares (Company, Product | None)."""
+        companies: Dict[int, CatalogCompany] = {}
+        products = []
+
+        for company, product in rows:
+            if company.id not in companies:
+                companies[company.id] = CatalogCompany(
+                    id=company.id,
+                    company_name=company.company_name,
+                    mapa_registration=company.mapa_registration,
+                )
+            if product is not None:
+                products.append(CatalogProduct(
+                    id=product.id,
+                    company_id=company.id,
+                    product_name=product.product_name,
+                    mapa_registration=product.mapa_registration,
+                    product_reference=product.product_reference,
+                ))
+
+        company_index = {}
+        company_names = []
+        for company in companies.values():
+            name = normalize_name(company.company_name)
+            company_index.setdefault(name, company)
+            company_names.append((name, company))
+
+        product_index = {}
+        product_by_normalized = {}
+        product_by_reference = {}
+        registration_index = {}
+        products_by_company = defaultdict(list)
+        for product in products:
+            company = companies[product.company_id]
+            name = normalize_name(product.product_name)
+            product_index.setdefault((company.id, name), product)
+            product_by_normalized.setdefault(name, product)
+            products_by_company[company.id].append((name, product))
+            if product.product_reference:
+                product_by_reference.setdefault(product.product_reference, product)
+            registration_index[f"{company.mapa_registration}-{product.mapa_registration}"] = (company, product)
+
+        return cls(
+            user_id=user_id,
+            version=version,
+            companies=tuple(companies.values()),
+            products=tuple(products),
+            company_index=MappingProxyType(company_index),
+            product_index=MappingProxyType(product_index),
+            product_by_normalized=MappingProxyType(product_by_normalized),
+            product_by_reference=MappingProxyType(product_by_reference),
+            registration_index=MappingProxyType(registration_index),
+            company_names=tuple(company_names),
+            product_names=MappingProxyType({
+                company_id: tuple(entries) for company_id, entries in products_by_company.items()
+            }),
+        )
+
+
+def bump_catalog_version(db: Session, user_id: int):
+    """
+    Invalida o catálogo do usuário. Deve ser chamado na mesma transação
+    da alteração (o incremento é atômico no banco). Não faz commit.
+    """
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.catalog_version: models.User.catalog_version + 1},
+        synchronize_session=False
+    )
+
+
+class CatalogCache:
+    """LRU de CatalogSnapshot por usuário, validado por catalog_version."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._snapshots: "OrderedDict[int, CatalogSnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, db: Session, user_id: int) -> CatalogSnapshot:
+        """Snapshot atual do catálogo do usuário (carrega se a versão mudou)."""
+        version = db.query(models.User.catalog_version).filter(
+            models.User.id == user_id
+        ).scalar() or 0
+
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+            if snapshot is not None and snapshot.version == version:
+                self._snapshots.move_to_end(user_id)
+                self._counters["hits"] += 1
+                return snapshot
+            self._counters["misses"] += 1
+
+        snapshot = self._load(db, user_id, version)
+
+        with self._lock:
+            current = self._snapshots.get(user_id)
+            # Outra thread pode ter carregado uma versão mais nova
+            if current is None or current.version <= version:
+                self._snapshots[user_id] = snapshot
+                self._snapshots.move_to_end(user_id)
+            while len(self._snapshots) > self.max_entries:
+                self._snapshots.popitem(last=False)
+                self._counters["evictions"] += 1
+
+        return snapshot
+
+    @staticmethod
+    def _load(db: Session, user_id: int, version: int) -> CatalogSnapshot:
+        """Empresas e produtos em uma única consulta (sem N+1)."""
+        rows = db.query(models.Company, models.Product).outerjoin(
+            models.Product, models.Product.company_id == models.Company.id
+        ).filter(
+            models.Company.user_id == user_id
+        ).order_by(
+            models.Company.id, models.Product.id
+        ).all()
+
+        return CatalogSnapshot.build(user_id, version, rows)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._snapshots.pop(user_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            total = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._snapshots),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self._counters["hits"] / total, 4) if total else 0.0,
+            }
+
+
+# Instância compartilhada (uma por processo)
+catalog_cache = CatalogCache(max_entries=settings.catalog_cache_max_entries)
@@ -0,0 +1,369 @@
+"""
+Importação e exportação do catálogo (empresas e produtos) em CSV ou XLSX.
+
+Uma linha por produto: empresa, registro da empresa, produto, registro do
+produto e referência (linhas sem produto cadastram só a empresa).
+
+Importação: o arquivo é lido em streaming (csv / openpyxl read_only) e
+validado em memória; as linhas válidas são gravadas em uma única transação
+com poucas consultas: uma leitura do que já existe, INSERT em massa
+(executemany) das empresas e produtos novos e UPDATE em massa dos
+registros alterados. Linhas inválidas são ignoradas e reportadas.
+
+Exportação: mesmo formato, gerado em streaming a partir de uma consulta
+com yield_per (CSV direto; XLSX em um arquivo temporário).
+"""
+
+import codecs
+import csv
+import io
+import itertools
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.utils.catalog_cache import bump_catalog_version
+from app.utils.catalog_matcher import normalize_name
+from app.utils.dashboard_stats import record_bulk_inserts
+from app.utils.validators import UPLOAD_CHUNK_SIZE
+
+FORMATS = ("csv", "xlsx")
+
+XLSX_MAGIC = b"PK\x03\x04"
+
+# Cabeçalho da exportação (e nomes aceitos na importação)
+HEADER = ("empresa", "registro_empresa", "produto", "registro_produto", "referencia")
+
+# Cabeçalho normalizado (normalize_name) -> campo
+_HEADER_FIELDS = {
+    "empresa": "company_name",
+    "registro empresa": "company_registration",
+    "registro mapa empresa": "company_registration",
+    "produto": "product_name",
+    "registro produto": "product_registration",
+    "registro mapa produto": "product_registration",
+    "referencia": "product_reference",
+}
+
+# Campo -> (coluna do cabeçalho, tamanho máximo em companies/products)
+_COLUMNS = {
+    "company_name": ("empresa", 500),
+    "company_registration": ("registro_empresa", 100),
+    "product_name": ("produto", 500),
+    "product_registration": ("registro_produto", 100),
+    "product_reference": ("referencia", 500),
+}
+
+# Linhas lidas do banco por vez na exportação
+_EXPORT_BATCH = 1000
+
+
+@dataclass
+class CatalogRow:
+    """Linha válida do arquivo (line = número da linha, com o cabeçalho na 1)."""
+    line: int
+    company_name: str
+    company_registration: str
+    product_name: Optional[str] = None
+    product_registration: Optional[str] = None
+    product_reference: Optional[str] = None
+
+
+def detect_format(filename: str, head: bytes) -> str:
+    """csv ou xlsx pela extensão (XLSX confere a assinatura ZIP). ValueError se não suportado."""
+    extension = (filename or "").lower().rsplit(".", 1)[-1]
+    if extension == "xlsx":
+        if not head.startswith(XLSX_MAGIC):
+            raise ValueError("Arquivo XLSX inválido ou corrompido")
+        return "xlsx"
+    if extension == "csv":
+        return "csv"
+    raise ValueError("Envie o catálogo em .csv ou .xlsx")
+
+
+# ─── leitura ─────────────────────────────────────────────────────────────────
+
+def _cell(value) -> str:
+    """Valor da célula como texto (números inteiros do Excel sem ".0")."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _csv_rows(stream: BinaryIO, encoding: str) -> Iterator[List[str]]:
+    text = io.TextIOWrapper(stream, encoding=encoding, newline="")
+    try:
+        header = text.readline()
+        # Excel em português grava ";"; os demais, ","
+        delimiter = ";" if header.count(";") > header.count(",") else ","
+        yield from csv.reader(itertools.chain([header], text), delimiter=delimiter)
+    finally:
+        text.detach()
+
+
+def _xlsx_rows(stream: BinaryIO) -> Iterator[List[str]]:
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception:
+        raise ValueError("Arquivo XLSX inválido ou corrompido")
+    try:
+        for values in workbook.active.iter_rows(values_only=True):
+            yield [_cell(value) for value in values]
+    finally:
+        workbook.close()
+
+
+def _parse_header(header: List[str]) -> Dict[int, str]:
+    columns = {}
+    for index, name in enumerate(header):
+        field = _HEADER_FIELDS.get(normalize_name(name))
+        if field and field not in columns.values():
+            columns[index] = field
+    missing = {"company_name", "company_registration"} - set(columns.values())
+    if missing:
+        raise ValueError(
+            f"Cabeçalho deve ter as colunas {', '.join(HEADER)} "
+            f"(obrigatórias: empresa, registro_empresa)"
+        )
+    return columns
+
+
+def _read(rows: Iterator[List[str]]) -> Tuple[List[CatalogRow], List[dict]]:
+    header = next(rows, None)
+    if not header or not any(header):
+        raise ValueError("Arquivo vazio")
+    columns = _parse_header(header)
+
+    valid: List[CatalogRow] = []
+    errors: List[dict] = []
+    companies: Dict[str, Tuple[str, int]] = {}  # empresa -> (registro, linha)
+    products: Dict[Tuple[str, str], int] = {}  # (empresa, produto) -> linha
+
+    for line, values in enumerate(rows, start=2):
+        fields = {field: values[index].strip() if index < len(values) else ""
+                  for index, field in columns.items()}
+        if not any(fields.values()):
+            continue  # linha em branco
+        if line - 1 > settings.catalog_import_max_rows:
+            raise ValueError(f"Arquivo com mais de {settings.catalog_import_max_rows} linhas")
+
+        error = _validate(fields, companies, products)
+        if error:
+            errors.append({"row": line, "message": error})
+            continue
+
+        row = CatalogRow(line=line, **{field: value or None for field, value in fields.items()})
+        companies.setdefault(row.company_name, (row.company_registration, line))
+        if row.product_name:
+            products[(row.company_name, row.product_name)] = line
+        valid.append(row)
+
+    return valid, errors
+
+
+def _validate(fields: dict, companies: dict, products: dict) -> Optional[str]:
+    """Mensagem de erro da linha (None se válida)."""
+    for field, (column, max_length) in _COLUMNS.items():
+        if len(fields.get(field) or "") > max_length:
+            return f"Coluna {column} com mais de {max_length} caracteres"
+
+    company, registration = fields["company_name"], fields["company_registration"]
+    if not company:
+        return "Empresa não informada"
+    if not registration:
+        return f"Registro MAPA da empresa '{company}' não informado"
+
+    previous = companies.get(company)
+    if previous and previous[0] != registration:
+        return f"Empresa '{company}' com registro diferente do informado na linha {previous[1]}"
+
+    product = fields.get("product_name")
+    if product and not fields.get("product_registration"):
+        return f"Registro MAPA do produto '{product}' não informado"
+    if not product and (fields.get("product_registration") or fields.get("product_reference")):
+        return "Registro ou referência de produto sem o nome do produto"
+    if product and (company, product) in products:
+        return f"Produto '{product}' repetido (linha {products[(company, product)]})"
+    return None
+
+
+def read_catalog(stream: BinaryIO, file_format: str) -> Tuple[List[CatalogRow], List[dict]]:
+    """
+    Linhas válidas e erros por linha ({"row": n, "message": ...}).
+    ValueError se o arquivo como um todo for inválido (formato, cabeçalho,
+    limite de linhas). CSV em UTF-8 ou, se não decodificar, Windows-1252.
+    """
+    if file_format == "xlsx":
+        return _read_all(_xlsx_rows(stream))
+
+    start = stream.tell()
+    try:
+        return _read_all(_csv_rows(stream, "utf-8-sig"))
+    except UnicodeDecodeError:
+        stream.seek(start)
+        return _read_all(_csv_rows(stream, "cp1252"))
+
+
+def _read_all(rows: Iterator[List[str]]) -> Tuple[List[CatalogRow], List[dict]]:
+    # Fecha o gerador mesmo quando _read para no meio (libera o arquivo)
+    try:
+        return _read(rows)
+    finally:
+        rows.close()
+
+
+# ─── gravação em massa ───────────────────────────────────────────────────────
+
+def upsert_catalog(db: Session, user_id: int, rows: List[CatalogRow]) -> Dict[str, int]:
+    """
+    Cria ou atualiza (pelo nome) as empresas e produtos das linhas.
+    Referência vazia mantém a atual. Não faz commit.
+    """
+    counts = {"companies_created": 0, "companies_updated": 0, "products_created": 0, "products_updated": 0}
+    if not rows:
+        return counts
+
+    # Primeiro o UPDATE em users: serializa importações simultâneas do usuário
+    bump_catalog_version(db, user_id)
+
+    existing = {
+        name: (company_id, registration)
+        for company_id, name, registration in db.execute(
+            select(models.Company.id, models.Company.company_name, models.Company.mapa_registration).where(
+                models.Company.user_id == user_id
+            )
+        )
+    }
+
+    company_registration = {row.company_name: row.company_registration for row in rows}
+    new_companies = [
+        {"user_id": user_id, "company_name": name, "mapa_registration": registration}
+        for name, registration in company_registration.items() if name not in existing
+    ]
+    changed_companies = [
+        {"id": existing[name][0], "mapa_registration": registration}
+        for name, registration in company_registration.items()
+        if name in existing and existing[name][1] != registration
+    ]
+
+    company_ids = {name: company_id for name, (company_id, _) in existing.items()}
+    if new_companies:
+        created = db.execute(
+            insert(models.Company).returning(models.Company.id, models.Company.company_name),
+            new_companies
+        )
+        company_ids.update((name, company_id) for company_id, name in created)
+        record_bulk_inserts(db, models.Company, len(new_companies))
+    if changed_companies:
+        db.execute(update(models.Company), changed_companies)
+    counts["companies_created"] = len(new_companies)
+    counts["companies_updated"] = len(changed_companies)
+
+    current = {
+        (company_id, name): (product_id, registration, reference)
+        for product_id, company_id, name, registration, reference in db.execute(
+            select(
+                models.Product.id, models.Product.company_id, models.Product.product_name,
+                models.Product.mapa_registration, models.Product.product_reference
+            ).join(models.Company).where(models.Company.user_id == user_id)
+        )
+    }
+
+    new_products, changed_products = [], []
+    for row in rows:
+        if not row.product_name:
+            continue
+        company_id = company_ids[row.company_name]
+        found = current.get((company_id, row.product_name))
+        if found is None:
+            new_products.append({
+                "company_id": company_id,
+                "product_name": row.product_name,
+                "mapa_registration": row.product_registration,
+                "product_reference": row.product_reference,
+            })
+            continue
+        product_id, registration, reference = found
+        new_reference = row.product_reference or reference
+        if (registration, reference) != (row.product_registration, new_reference):
+            changed_products.append({
+                "id": product_id,
+                "mapa_registration": row.product_registration,
+                "product_reference": new_reference,
+            })
+
+    if new_products:
+        db.execute(insert(models.Product), new_products)
+        record_bulk_inserts(db, models.Product, len(new_products))
+    if changed_products:
+        db.execute(update(models.Product), changed_products)
+    counts["products_created"] = len(new_products)
+    counts["products_updated"] = len(changed_products)
+    return counts
+
+
+# ─── exportação ──────────────────────────────────────────────────────────────
+
+def _export_rows(user_id: int) -> Iterator[tuple]:
+    """Linhas do catálogo (sessão própria: a resposta é gerada após a rota)."""
+    db = SessionLocal()
+    try:
+        stmt = select(
+            models.Company.company_name,
+            models.Company.mapa_registration,
+            models.Product.product_name,
+            models.Product.mapa_registration,
+            models.Product.product_reference,
+        ).outerjoin(models.Product).where(
+            models.Company.user_id == user_id
+        ).order_by(
+            models.Company.company_name, models.Company.id, models.Product.product_name
+        ).execution_options(yield_per=_EXPORT_BATCH)
+
+        for row in db.execute(stmt):
+            yield tuple(value or "" for value in row)
+    finally:
+        db.close()
+
+
+def export_csv(user_id: int) -> Iterator[bytes]:
+    """CSV (UTF-8 com BOM e ";", como o Excel em português espera) em blocos."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    buffer.write(codecs.BOM_UTF8.decode("utf-8"))
+    writer.writerow(HEADER)
+
+    for row in _export_rows(user_id):
+        writer.writerow(row)
+        if buffer.tell() >= UPLOAD_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def export_xlsx(user_id: int) -> Iterator[bytes]:
+    """XLSX (openpyxl write_only) montado em arquivo temporário e enviado em blocos."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Catálogo")
+    sheet.append(HEADER)
+    for row in _export_rows(user_id):
+        sheet.append(row)
+
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as output:
+        workbook.save(output)
+        output.seek(0)
+        for chunk in iter(lambda: output.read(UPLOAD_CHUNK_SIZE), b""):
+            yield chunk
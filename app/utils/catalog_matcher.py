@@ -0,0 +1,100 @@
+"""
+Normalização de nomes e índice de trigramas para o matching com o catálogo.
+
+- normalize_name: remove acentos, caixa, pontuação e espaços repetidos, para
+  que "Fertilizantes Ltda." e "FERTILIZANTES  LTDA" sejam a mesma chave
+  (match exato O(1) em dict);
+- TrigramIndex: índice invertido trigrama -> entradas, usado para sugerir
+  os cadastros mais parecidos com um item não encontrado (coeficiente de
+  Dice sobre os trigramas).
+"""
+
+import heapq
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, FrozenSet, Iterable, List, Optional, Tuple
+
+_NON_ALNUM_RE = re.compile(r"[\W_]+")
+
+# Sugestões com similaridade abaixo disso são descartadas
+MIN_SUGGESTION_SCORE = 0.3
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Chave de comparação: sem acentos, casefold, pontuação vira espaço."""
+    if not name:
+        return ""
+    if not name.isascii():
+        # Decompõe (É -> E + acento) e descarta o que não é ASCII
+        name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM_RE.sub(" ", name.casefold()).strip()
+
+
+def trigrams(normalized: str) -> FrozenSet[str]:
+    """Trigramas do texto já normalizado (com bordas, como no pg_trgm)."""
+    if not normalized:
+        return frozenset()
+    padded = f"  {normalized} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class TrigramIndex:
+    """
+    Índice invertido de trigramas, imutável após a construção.
+
+    search() só visita as entradas que compartilham algum trigrama com a
+    consulta, então o custo depende dos candidatos e não do catálogo todo.
+    """
+
+    __slots__ = ("_payloads", "_sizes", "_postings")
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]], normalized: bool = False):
+        """entries: pares (nome, payload); normalized=True se o nome já passou por normalize_name."""
+        payloads = []
+        sizes = []
+        postings = defaultdict(list)
+
+        for name, payload in entries:
+            grams = trigrams(name if normalized else normalize_name(name))
+            if not grams:
+                continue
+            index = len(payloads)
+            payloads.append(payload)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append(index)
+
+        self._payloads = tuple(payloads)
+        self._sizes = tuple(sizes)
+        self._postings = {gram: tuple(ids) for gram, ids in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def search(
+        self,
+        name: Optional[str],
+        limit: int = 5,
+        min_score: float = MIN_SUGGESTION_SCORE
+    ) -> List[Tuple[Any, float]]:
+        """Top-k (payload, score) por similaridade, score entre 0 e 1."""
+        grams = trigrams(normalize_name(name))
+        if not grams:
+            return []
+
+        shared = Counter()
+        for gram in grams:
+            ids = self._postings.get(gram)
+            if ids:
+                shared.update(ids)
+
+        size = len(grams)
+        sizes = self._sizes
+        scored = (
+            (2 * count / (size + sizes[index]), index)
+            for index, count in shared.items()
+        )
+        best = heapq.nlargest(limit, (item for item in scored if item[0] >= min_score))
+
+        return [(self._payloads[index], round(score, 3)) for score, index in best]
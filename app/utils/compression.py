@@ -0,0 +1,177 @@
+"""
+Compressão transparente de arquivos armazenados (zstd ou gzip).
+
+O codec é identificado pelos primeiros bytes (magic number), não pelo
+nome: arquivos comprimidos mantêm o caminho/chave original e os leitores
+(NFeProcessor, cache de parsing, downloads) descomprimem na leitura, em
+streaming. XML e PDF nunca começam com esses bytes, então conteúdo não
+comprimido continua sendo lido como antes.
+
+zstd requer o pacote zstandard (importado só quando usado).
+"""
+
+import gzip
+import io
+import os
+import zlib
+from typing import BinaryIO, Optional
+
+from app.config import settings
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_MAGIC = b"\x1f\x8b"
+
+CODECS = ("zstd", "gzip")
+
+# Níveis usados quando settings.file_store_compression_level é 0
+_DEFAULT_LEVELS = {"zstd": 3, "gzip": 6}
+
+# Conteúdos que já são comprimidos: gravados como estão
+_INCOMPRESSIBLE_MAGIC = (b"%PDF", b"PK\x03\x04", ZSTD_MAGIC, GZIP_MAGIC)
+
+# Bytes necessários para identificar o codec
+HEADER_SIZE = 4
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Compressão zstd requer o pacote zstandard")
+    return zstandard
+
+
+def detect_codec(head: bytes) -> Optional[str]:
+    """'zstd', 'gzip' ou None (não comprimido) pelos primeiros bytes."""
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    return None
+
+
+def file_codec(file_path: str) -> Optional[str]:
+    """Codec do arquivo em disco (None se não comprimido)."""
+    with open(file_path, "rb") as f:
+        return detect_codec(f.read(HEADER_SIZE))
+
+
+def is_compressible(head: bytes) -> bool:
+    """False para PDF, ZIP e conteúdo já comprimido (ganho desprezível)."""
+    return not head.startswith(_INCOMPRESSIBLE_MAGIC)
+
+
+def configured_codec() -> Optional[str]:
+    """Codec de settings.file_store_compression (None se desativado)."""
+    codec = (settings.file_store_compression or "none").lower()
+    if codec == "none":
+        return None
+    if codec not in CODECS:
+        raise ValueError(f"FILE_STORE_COMPRESSION desconhecido: {settings.file_store_compression}")
+    return codec
+
+
+def compressor(codec: str, level: int = 0):
+    """Objeto com compress(bytes) e flush() (um frame zstd ou membro gzip)."""
+    level = level or _DEFAULT_LEVELS[codec]
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=level).compressobj()
+    if codec == "gzip":
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    raise ValueError(f"Codec desconhecido: {codec}")
+
+
+class _PrefixedReader(io.RawIOBase):
+    """Devolve os bytes já lidos (cabeçalho) antes do restante do stream."""
+
+    def __init__(self, head: bytes, stream: BinaryIO):
+        self._head = head
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._head:
+            size = min(len(buffer), len(self._head))
+            buffer[:size] = self._head[:size]
+            self._head = self._head[size:]
+            return size
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._stream.close()
+        super().close()
+
+
+class _GzipReader(gzip.GzipFile):
+    """GzipFile que também fecha o stream de origem."""
+
+    def close(self):
+        source = self.fileobj
+        super().close()
+        if source is not None:
+            source.close()
+
+
+def decompressing_reader(stream: BinaryIO, codec: str) -> BinaryIO:
+    """Stream descomprimido sobre stream (fecha a origem ao fechar)."""
+    if codec == "zstd":
+        return _zstd().ZstdDecompressor().stream_reader(stream, closefd=True)
+    if codec == "gzip":
+        return _GzipReader(fileobj=stream, mode="rb")
+    raise ValueError(f"Codec desconhecido: {codec}")
+
+
+def open_stream(stream: BinaryIO) -> BinaryIO:
+    """
+    Stream de leitura com o conteúdo original: descomprime se stream for
+    zstd/gzip, senão devolve os mesmos bytes. Aceita streams sem seek (S3).
+    """
+    head = stream.read(HEADER_SIZE)
+    codec = detect_codec(head)
+    source = io.BufferedReader(_PrefixedReader(head, stream))
+    return decompressing_reader(source, codec) if codec else source
+
+
+def open_file(file_path: str) -> BinaryIO:
+    """Abre o arquivo para leitura do conteúdo original (descomprimido)."""
+    f = open(file_path, "rb")
+    codec = detect_codec(f.read(HEADER_SIZE))
+    f.seek(0)
+    return decompressing_reader(f, codec) if codec else f
+
+
+def compress_file(file_path: str, codec: str, level: int = 0) -> Optional[tuple]:
+    """
+    Comprime o arquivo no próprio caminho (troca atômica). Retorna
+    (tamanho original, tamanho gravado) ou None se já estava comprimido
+    ou a compressão não reduz o tamanho.
+    """
+    with open(file_path, "rb") as source:
+        if not is_compressible(source.read(HEADER_SIZE)):
+            return None
+        source.seek(0)
+
+        part_path = f"{file_path}.part"
+        size = 0
+        try:
+            with open(part_path, "wb") as target:
+                encoder = compressor(codec, level)
+                for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                    size += len(chunk)
+                    target.write(encoder.compress(chunk))
+                target.write(encoder.flush())
+        except BaseException:
+            os.unlink(part_path)
+            raise
+
+    stored_size = os.path.getsize(part_path)
+    if stored_size >= size:
+        os.unlink(part_path)
+        return None
+    os.replace(part_path, file_path)
+    return size, stored_size
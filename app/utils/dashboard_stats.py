@@ -0,0 +1,260 @@
+"""
+Estatísticas dos dashboards (/api/admin/dashboard-stats e /api/user/stats).
+
+Usuário: contagens em uma única consulta (UNION ALL com agregados
+condicionais: total e criados no mês) e atividades recentes em outra.
+
+Admin (sistema inteiro): contadores na tabela stat_counters, mantidos por
+um listener after_flush da Session: todo INSERT/DELETE via ORM de empresa,
+produto, upload, relatório ou usuário (inclusive cascatas, como a exclusão
+de um usuário) soma ±1 no total e no mês de criação, na mesma transação.
+Na frente da tabela, um cache em memória com TTL curto
+(settings.stats_cache_ttl). O worker reconstrói os contadores a cada
+settings.stats_reconcile_interval, corrigindo alterações feitas fora do
+ORM (SQL manual, scripts que não importam este módulo).
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import case, event, func, literal_column, select, union_all
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TOTAL_BUCKET = "total"
+
+# Modelo -> (contador, coluna de criação)
+_TRACKED = {
+    models.Company: ("companies", "created_at"),
+    models.Product: ("products", "created_at"),
+    models.XMLUpload: ("uploads", "upload_date"),
+    models.Report: ("reports", "generated_at"),
+    models.User: ("users", "created_at"),
+}
+
+# Tipo de atividade -> (modelo, rótulo, data)
+_RECENT = {
+    "upload": (models.XMLUpload, models.XMLUpload.filename, models.XMLUpload.upload_date),
+    "report": (models.Report, models.Report.report_period, models.Report.generated_at),
+    "company": (models.Company, models.Company.company_name, models.Company.created_at),
+    "product": (models.Product, models.Product.product_name, models.Product.created_at),
+}
+
+
+def month_bucket(moment: datetime) -> str:
+    """Bucket mensal de um contador ("2025-01")."""
+    return moment.strftime("%Y-%m")
+
+
+def first_day_this_month() -> datetime:
+    """Início do mês atual (UTC)."""
+    return datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _owned_by(stmt, model, user_id: int):
+    """Filtra pelo dono (produtos pertencem ao usuário via empresa)."""
+    if model is models.Product:
+        return stmt.join(models.Company, models.Product.company_id == models.Company.id).where(
+            models.Company.user_id == user_id
+        )
+    return stmt.where(model.user_id == user_id)
+
+
+# ─── consultas agrupadas ─────────────────────────────────────────────────────
+
+def counts_query(user_id: Optional[int] = None):
+    """
+    Uma linha (name, total, this_month) por tabela, em uma consulta.
+    Sem user_id: sistema inteiro, incluindo usuários.
+    """
+    since = first_day_this_month()
+    branches = []
+    for model, (name, column_name) in _TRACKED.items():
+        if user_id is not None and model is models.User:
+            continue
+        column = getattr(model, column_name)
+        stmt = select(
+            literal_column(f"'{name}'").label("name"),
+            func.count().label("total"),
+            func.count(case((column >= since, 1))).label("this_month")
+        ).select_from(model)
+        if user_id is not None:
+            stmt = _owned_by(stmt, model, user_id)
+        branches.append(stmt)
+    return union_all(*branches)
+
+
+def recent_query(limits: Dict[str, int], user_id: Optional[int] = None):
+    """
+    Linhas (kind, id, label, created_at) mais recentes de cada tipo em
+    limits ({"upload": 5, ...}), em uma consulta, da mais recente à mais antiga.
+    """
+    branches = []
+    for kind, limit in limits.items():
+        model, label, timestamp = _RECENT[kind]
+        stmt = select(
+            literal_column(f"'{kind}'").label("kind"),
+            model.id.label("id"),
+            label.label("label"),
+            timestamp.label("created_at")
+        )
+        if user_id is not None:
+            stmt = _owned_by(stmt, model, user_id)
+        # LIMIT por tipo exige subconsulta em cada ramo do UNION
+        branches.append(select(stmt.order_by(timestamp.desc()).limit(limit).subquery()))
+    return union_all(*branches).order_by(literal_column("created_at").desc())
+
+
+def split_counts(rows) -> Tuple[dict, dict]:
+    """Linhas de counts_query -> (totais, criados no mês)."""
+    totals, this_month = {}, {}
+    for name, total, month in rows:
+        totals[name] = total
+        this_month[name] = month
+    return totals, this_month
+
+
+# ─── contadores globais (stat_counters) ──────────────────────────────────────
+
+def _apply_deltas(connection, deltas: Counter):
+    """Soma deltas aos contadores (upsert atômico), em ordem fixa contra deadlocks."""
+    if connection.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    counter = models.StatCounter.__table__
+    for (name, bucket), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        connection.execute(
+            insert(counter).values(name=name, bucket=bucket, value=delta).on_conflict_do_update(
+                index_elements=[counter.c.name, counter.c.bucket],
+                set_={"value": counter.c.value + delta}
+            )
+        )
+
+
+@event.listens_for(Session, "after_flush")
+def _track_counters(session: Session, flush_context):
+    """Registra inserções e exclusões das tabelas contadas (new/deleted do flush)."""
+    deltas = Counter()
+    now = datetime.now(timezone.utc)
+
+    for instances, sign in ((session.new, 1), (session.deleted, -1)):
+        for instance in instances:
+            tracked = _TRACKED.get(type(instance))
+            if tracked is None:
+                continue
+            name, column_name = tracked
+            deltas[(name, TOTAL_BUCKET)] += sign
+            # Só o que já está carregado: nada de SQL extra durante o flush
+            created = instance.__dict__.get(column_name)
+            if created is None and sign > 0:
+                created = now
+            if created is not None:
+                deltas[(name, month_bucket(created))] += sign
+
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+
+def record_bulk_inserts(db: Session, model, count: int):
+    """INSERT em massa (session.execute(insert(...))) não passa pelo flush: soma aqui."""
+    if not count:
+        return
+    name, _ = _TRACKED[model]
+    bucket = month_bucket(datetime.now(timezone.utc))
+    _apply_deltas(db.connection(), Counter({(name, TOTAL_BUCKET): count, (name, bucket): count}))
+
+
+def rebuild_counters(db: Session) -> Dict[Tuple[str, str], int]:
+    """
+    Recalcula os contadores (total e mês atual) a partir das tabelas.
+    As linhas atuais ficam travadas até o commit do chamador: incrementos
+    concorrentes esperam e são aplicados sobre os valores novos.
+    """
+    db.query(models.StatCounter).with_for_update().all()
+    totals, this_month = split_counts(db.execute(counts_query()).all())
+
+    bucket = month_bucket(first_day_this_month())
+    values = {}
+    for name in totals:
+        values[(name, TOTAL_BUCKET)] = totals[name]
+        values[(name, bucket)] = this_month[name]
+
+    db.query(models.StatCounter).delete(synchronize_session=False)
+    db.add_all(
+        models.StatCounter(name=name, bucket=key_bucket, value=value)
+        for (name, key_bucket), value in values.items()
+    )
+    db.flush()
+    counter_cache.clear()
+    return values
+
+
+class CounterCache:
+    """Último valor lido dos contadores, válido por ttl segundos (por processo)."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._value: Optional[dict] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[dict]:
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires:
+                return self._value
+            return None
+
+    def set(self, value: dict):
+        with self._lock:
+            self._value = value
+            self._expires = time.monotonic() + self.ttl
+
+    def clear(self):
+        with self._lock:
+            self._value = None
+
+
+counter_cache = CounterCache(settings.stats_cache_ttl)
+
+
+async def global_counters(db) -> dict:
+    """
+    {"totals": {...}, "this_month": {...}} do sistema inteiro (AsyncSession).
+    Cache com TTL curto; sem contadores ainda, reconstrói na primeira leitura.
+    """
+    cached = counter_cache.get()
+    if cached is not None:
+        return cached
+
+    bucket = month_bucket(first_day_this_month())
+    rows = (await db.execute(
+        select(models.StatCounter.name, models.StatCounter.bucket, models.StatCounter.value).where(
+            models.StatCounter.bucket.in_((TOTAL_BUCKET, bucket))
+        )
+    )).all()
+    values = {(name, key_bucket): value for name, key_bucket, value in rows}
+
+    if not any(key_bucket == TOTAL_BUCKET for _, key_bucket in values):
+        values = await db.run_sync(rebuild_counters)
+        await db.commit()
+        logger.info("Contadores do dashboard reconstruídos")
+
+    names = [name for name, _ in _TRACKED.values()]
+    counters = {
+        "totals": {name: values.get((name, TOTAL_BUCKET), 0) for name in names},
+        "this_month": {name: values.get((name, bucket), 0) for name in names},
+    }
+    counter_cache.set(counters)
+    return counters
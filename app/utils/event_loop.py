@@ -0,0 +1,106 @@
+"""
+Event loop da API: tamanho do threadpool e monitor de atraso (lag).
+
+As rotas são síncronas e rodam no threadpool do anyio; o event loop só
+faz I/O de rede. O monitor mede o quanto cada asyncio.sleep(intervalo)
+atrasa além do pedido: qualquer trecho bloqueante que volte a rodar no
+loop aparece como atraso (p99/máximo em GET /api/admin/event-loop).
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import anyio.to_thread
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Amostras mantidas para os percentis (janela móvel)
+_MAX_SAMPLES = 2400
+
+# Intervalo mínimo entre warnings de atraso no log (segundos)
+_WARN_EVERY = 10.0
+
+
+def configure_threadpool(size: Optional[int] = None):
+    """Ajusta o limite de threads do anyio (usado pelas rotas def). Chamar dentro do loop."""
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    limiter.total_tokens = size or settings.threadpool_size
+    logger.info(f"Threadpool das rotas: {limiter.total_tokens} threads")
+
+
+def _percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class EventLoopLagMonitor:
+    """Tarefa asyncio que amostra o atraso do event loop."""
+
+    def __init__(self, interval: float, warn_ms: float):
+        self.interval = interval
+        self.warn_ms = warn_ms
+        self._samples = deque(maxlen=_MAX_SAMPLES)  # atraso em ms
+        self._task: Optional[asyncio.Task] = None
+        self._over_threshold = 0
+        self._last_warning = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record((loop.time() - start - self.interval) * 1000)
+
+    def record(self, lag_ms: float):
+        lag_ms = max(lag_ms, 0.0)
+        self._samples.append(lag_ms)
+        if lag_ms >= self.warn_ms:
+            self._over_threshold += 1
+            now = time.monotonic()
+            if now - self._last_warning >= _WARN_EVERY:
+                self._last_warning = now
+                logger.warning(f"Event loop bloqueado por {lag_ms:.0f}ms (trecho síncrono fora do threadpool?)")
+
+    def reset(self):
+        self._samples.clear()
+        self._over_threshold = 0
+
+    def stats(self) -> Dict[str, float]:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"samples": 0, "running": self._task is not None}
+        return {
+            "samples": len(samples),
+            "running": self._task is not None,
+            "interval_ms": self.interval * 1000,
+            "mean_ms": round(sum(samples) / len(samples), 3),
+            "p50_ms": round(_percentile(samples, 0.50), 3),
+            "p99_ms": round(_percentile(samples, 0.99), 3),
+            "max_ms": round(samples[-1], 3),
+            "over_threshold": self._over_threshold,
+            "warn_ms": self.warn_ms,
+        }
+
+
+# Instância compartilhada (uma por processo)
+lag_monitor = EventLoopLagMonitor(
+    interval=settings.event_loop_lag_interval,
+    warn_ms=settings.event_loop_lag_warn_ms
+)
@@ -0,0 +1,488 @@
+"""
+Armazenamento de arquivos endereçado por conteúdo (SHA-256).
+
+Cada conteúdo é gravado uma única vez, na chave ab/cd/abcd... (dois
+níveis de diretório/prefixo, para não concentrar milhões de arquivos em
+um só diretório). Uploads com o mesmo conteúdo compartilham o objeto; a
+tabela stored_blobs conta as referências (uploads, ZIPs na fila,
+artefatos de jobs) e o objeto só é apagado quando ninguém mais o usa.
+
+Backends (settings.file_store_backend):
+- local: diretório settings.file_store_dir (padrão {upload_dir}/store);
+  com vários nós da API, um volume compartilhado;
+- s3: bucket S3 ou compatível (MinIO via file_store_s3_endpoint_url),
+  para nós da API sem estado local. Requer boto3.
+
+Ordem das operações (sem objeto órfão nem referência para objeto apagado):
+- gravação: conteúdo vai para um arquivo temporário (calculando o hash),
+  a linha em stored_blobs é criada/incrementada e só então o objeto é
+  publicado; tudo na transação do chamador;
+- remoção (purge_unreferenced): a linha sem referências é apagada e o
+  objeto removido antes do commit, com a linha ainda travada.
+Um rollback depois da publicação deixa o objeto sem linha: ocupa espaço,
+mas é reaproveitado se o mesmo conteúdo voltar.
+
+Compressão (settings.file_store_compression): objetos são gravados com
+zstd/gzip (app/utils/compression.py), exceto PDF/ZIP; a chave continua
+sendo o SHA-256 do conteúdo original. open() devolve o conteúdo
+descomprimido; local_path() o objeto como gravado (NFeProcessor
+descomprime na leitura).
+"""
+
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+from app.utils.compression import compressor, configured_codec, is_compressible, open_file, open_stream
+from app.utils.validators import UPLOAD_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Finalidade gravada no token de staging (não é aceito como token de acesso)
+_STAGING_SCOPE = "upload_staging"
+
+
+def shard_key(sha256: str) -> str:
+    """Chave relativa do objeto: ab/cd/abcd..."""
+    if not _SHA256_RE.match(sha256 or ""):
+        raise ValueError(f"Digest SHA-256 inválido: {sha256!r}")
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def compression_ratio(size: Optional[int], stored_size: Optional[int]) -> Optional[float]:
+    """Tamanho original / tamanho gravado (None se desconhecido)."""
+    if not size or not stored_size:
+        return None
+    return round(size / stored_size, 2)
+
+
+@dataclass
+class SpooledFile:
+    """Conteúdo já gravado em arquivo temporário, com hash e tamanhos."""
+    path: str
+    sha256: str
+    size: int                     # Conteúdo original
+    stored_size: int              # Como gravado (comprimido ou não)
+    codec: Optional[str] = None   # zstd, gzip ou None
+
+    @property
+    def compression_ratio(self) -> Optional[float]:
+        return compression_ratio(self.size, self.stored_size)
+
+
+class FileStore:
+    """
+    Interface dos backends. Objetos são imutáveis e identificados pelo
+    SHA-256 do conteúdo; leitura e escrita em streaming (blocos).
+    """
+
+    def __init__(self, staging_dir: str):
+        self.staging_dir = Path(staging_dir)
+
+    def spool(self, stream: BinaryIO, codec: Optional[str] = None) -> SpooledFile:
+        """
+        Copia o stream para um arquivo temporário calculando o SHA-256 do
+        conteúdo original; com codec, grava comprimido (se compressível).
+        """
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        encoder = None
+        fd, path = tempfile.mkstemp(dir=self.staging_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as target:
+                for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+                    if size == 0 and codec and is_compressible(chunk):
+                        encoder = compressor(codec, settings.file_store_compression_level)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    target.write(encoder.compress(chunk) if encoder else chunk)
+                if encoder:
+                    target.write(encoder.flush())
+        except BaseException:
+            os.unlink(path)
+            raise
+        return SpooledFile(
+            path=path,
+            sha256=digest.hexdigest(),
+            size=size,
+            stored_size=os.path.getsize(path),
+            codec=codec if encoder else None
+        )
+
+    def discard(self, spooled: SpooledFile):
+        """Remove o temporário (se ainda existir)."""
+        try:
+            os.unlink(spooled.path)
+        except FileNotFoundError:
+            pass
+
+    def publish(self, spooled: SpooledFile):
+        """Move o temporário para a chave do conteúdo (nada a fazer se já existir)."""
+        try:
+            if not self.exists(spooled.sha256):
+                self._put(spooled)
+        finally:
+            self.discard(spooled)
+
+    def _put(self, spooled: SpooledFile):
+        """Grava o temporário na chave do conteúdo, substituindo o objeto atual."""
+        raise NotImplementedError
+
+    def open_raw(self, sha256: str) -> BinaryIO:
+        """Stream do objeto como gravado. FileNotFoundError se não existir."""
+        raise NotImplementedError
+
+    def open(self, sha256: str) -> BinaryIO:
+        """Stream do conteúdo original (descomprimido). FileNotFoundError se não existir."""
+        return open_stream(self.open_raw(sha256))
+
+    def recompress(self, sha256: str, codec: str) -> Optional[SpooledFile]:
+        """
+        Regrava um objeto não comprimido com codec, na mesma chave.
+        Retorna o resultado ou None se já estava comprimido ou não vale
+        comprimir (PDF, ZIP, sem redução de tamanho).
+        """
+        with self.open_raw(sha256) as source:
+            spooled = self.spool(source, codec)
+        try:
+            if spooled.sha256 != sha256:
+                raise ValueError(f"Conteúdo do objeto {sha256} não confere com o SHA-256")
+            if not spooled.codec or spooled.stored_size >= spooled.size:
+                return None
+            # Leitores detectam o codec pelo conteúdo: a troca é transparente
+            self._put(spooled)
+            return spooled
+        finally:
+            self.discard(spooled)
+
+    def exists(self, sha256: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, sha256: str):
+        """Remove o objeto (sem erro se já não existir)."""
+        raise NotImplementedError
+
+    def uri(self, sha256: str) -> str:
+        """Localização legível do objeto (gravada em file_path/artifact_path)."""
+        raise NotImplementedError
+
+    @contextmanager
+    def local_path(self, sha256: str, suffix: str = "") -> Iterator[str]:
+        """
+        Caminho local com o objeto durante o bloco (parsers que leem
+        arquivo). O conteúdo pode estar comprimido (compression.open_file).
+        """
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.staging_dir, suffix=suffix or ".blob")
+        try:
+            with os.fdopen(fd, "wb") as target, self.open_raw(sha256) as source:
+                shutil.copyfileobj(source, target, UPLOAD_CHUNK_SIZE)
+            yield path
+        finally:
+            os.unlink(path)
+
+
+class LocalFileStore(FileStore):
+    """Objetos em {root}/ab/cd/<sha256>; temporários em {root}/tmp (mesmo volume)."""
+
+    def __init__(self, root: str):
+        super().__init__(os.path.join(root, "tmp"))
+        self.root = Path(root)
+
+    def _path(self, sha256: str) -> Path:
+        return self.root / shard_key(sha256)
+
+    def _put(self, spooled: SpooledFile):
+        target = self._path(spooled.sha256)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Atômico: leitores nunca veem um objeto pela metade
+        os.replace(spooled.path, target)
+
+    def open_raw(self, sha256: str) -> BinaryIO:
+        return open(self._path(sha256), "rb")
+
+    def open(self, sha256: str) -> BinaryIO:
+        return open_file(str(self._path(sha256)))
+
+    def exists(self, sha256: str) -> bool:
+        return self._path(sha256).is_file()
+
+    def delete(self, sha256: str):
+        self._path(sha256).unlink(missing_ok=True)
+
+    def uri(self, sha256: str) -> str:
+        return str(self._path(sha256))
+
+    @contextmanager
+    def local_path(self, sha256: str, suffix: str = "") -> Iterator[str]:
+        # O próprio objeto, sem cópia (arquivo ausente fica a cargo do leitor)
+        yield str(self._path(sha256))
+
+
+class S3FileStore(FileStore):
+    """Objetos em s3://{bucket}/{prefix}/ab/cd/<sha256> (S3 ou compatível, ex: MinIO)."""
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        staging_dir: Optional[str] = None,
+        client=None
+    ):
+        super().__init__(staging_dir or os.path.join(settings.upload_dir, "temp", "store"))
+        if not bucket:
+            raise ValueError("FILE_STORE_S3_BUCKET não configurado")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("FILE_STORE_BACKEND=s3 requer o pacote boto3")
+            # Credenciais pelo mecanismo padrão do boto3 (AWS_ACCESS_KEY_ID etc.)
+            client = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None)
+        self.client = client
+
+    def _key(self, sha256: str) -> str:
+        key = shard_key(sha256)
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _put(self, spooled: SpooledFile):
+        # upload_file envia em partes (multipart) arquivos grandes
+        self.client.upload_file(spooled.path, self.bucket, self._key(spooled.sha256))
+
+    def open_raw(self, sha256: str) -> BinaryIO:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(sha256))
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(self.uri(sha256))
+        return response["Body"]
+
+    def exists(self, sha256: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(sha256))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, sha256: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(sha256))
+
+    def uri(self, sha256: str) -> str:
+        return f"s3://{self.bucket}/{self._key(sha256)}"
+
+
+def create_file_store() -> FileStore:
+    """Backend configurado em settings.file_store_backend."""
+    backend = settings.file_store_backend.lower()
+    if backend == "local":
+        return LocalFileStore(settings.file_store_dir or os.path.join(settings.upload_dir, "store"))
+    if backend == "s3":
+        return S3FileStore(
+            bucket=settings.file_store_s3_bucket,
+            prefix=settings.file_store_s3_prefix,
+            endpoint_url=settings.file_store_s3_endpoint_url,
+            region=settings.file_store_s3_region,
+        )
+    raise ValueError(f"FILE_STORE_BACKEND desconhecido: {settings.file_store_backend}")
+
+
+# Instância compartilhada (uma por processo)
+file_store = create_file_store()
+
+
+def read_chunks(stream: BinaryIO) -> Iterator[bytes]:
+    """Blocos de um stream aberto por FileStore.open (fecha ao final)."""
+    try:
+        for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+            yield chunk
+    finally:
+        stream.close()
+
+
+# ─── contagem de referências (stored_blobs) ──────────────────────────────────
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _upsert_blob(db: Session, spooled: SpooledFile, delta: int):
+    """Cria a linha do blob ou soma delta às referências (atômico no banco)."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    blob = models.StoredBlob.__table__
+    now = _now()
+    # Objeto já existente é mantido como está (stored_size/codec não mudam)
+    statement = insert(blob).values(
+        sha256=spooled.sha256, size=spooled.size, stored_size=spooled.stored_size,
+        codec=spooled.codec, ref_count=delta, created_at=now, released_at=now
+    ).on_conflict_do_update(
+        index_elements=[blob.c.sha256],
+        # released_at marca o início da carência de blobs sem referência
+        set_={"ref_count": blob.c.ref_count + delta, "released_at": now}
+    )
+    db.execute(statement)
+
+
+def _store(db: Session, stream: BinaryIO, delta: int) -> SpooledFile:
+    spooled = file_store.spool(stream, configured_codec())
+    try:
+        _upsert_blob(db, spooled, delta)
+        file_store.publish(spooled)
+    finally:
+        file_store.discard(spooled)
+    return spooled
+
+
+def add_blob(db: Session, stream: BinaryIO) -> SpooledFile:
+    """Grava o conteúdo com uma referência. Não faz commit."""
+    return _store(db, stream, 1)
+
+
+def stage_blob(db: Session, stream: BinaryIO) -> SpooledFile:
+    """
+    Grava o conteúdo sem referência (preview aguardando confirmação).
+    Se não for confirmado, é apagado após a carência. Não faz commit.
+    """
+    return _store(db, stream, 0)
+
+
+def acquire_blob(db: Session, sha256: str):
+    """
+    Adiciona uma referência a um blob já gravado. FileNotFoundError se ele
+    não existir mais (staging expirado). Não faz commit.
+    """
+    updated = db.query(models.StoredBlob).filter(
+        models.StoredBlob.sha256 == sha256
+    ).update({models.StoredBlob.ref_count: models.StoredBlob.ref_count + 1}, synchronize_session=False)
+    if not updated:
+        raise FileNotFoundError(sha256)
+
+
+def blob_compression_ratio(db: Session, sha256: str) -> Optional[float]:
+    """Taxa de compressão do objeto (None se anterior à compressão)."""
+    row = db.query(models.StoredBlob.size, models.StoredBlob.stored_size).filter(
+        models.StoredBlob.sha256 == sha256
+    ).first()
+    return compression_ratio(*row) if row else None
+
+
+def release_blobs(db: Session, digests: Iterable[Optional[str]]):
+    """Remove uma referência por ocorrência (None é ignorado). Não faz commit."""
+    now = _now()
+    for sha256, count in Counter(d for d in digests if d).items():
+        db.query(models.StoredBlob).filter(models.StoredBlob.sha256 == sha256).update({
+            models.StoredBlob.ref_count: models.StoredBlob.ref_count - count,
+            models.StoredBlob.released_at: now,
+        }, synchronize_session=False)
+
+
+def purge_unreferenced(db: Session, grace_seconds: Optional[int] = None, limit: int = 500) -> int:
+    """
+    Apaga blobs sem referências há mais de grace_seconds (staging não
+    confirmado, uploads removidos). Faz commit por blob. Retorna quantos.
+    """
+    grace = settings.file_store_gc_grace_seconds if grace_seconds is None else grace_seconds
+    cutoff = _now() - timedelta(seconds=grace)
+
+    def unreferenced(query):
+        return query.filter(
+            models.StoredBlob.ref_count <= 0,
+            models.StoredBlob.released_at <= cutoff
+        )
+
+    candidates = [row[0] for row in unreferenced(db.query(models.StoredBlob.sha256)).limit(limit).all()]
+    db.rollback()
+
+    purged = 0
+    for sha256 in candidates:
+        deleted = unreferenced(db.query(models.StoredBlob).filter(
+            models.StoredBlob.sha256 == sha256
+        )).delete(synchronize_session=False)
+        try:
+            # Linha travada até o commit: uma nova referência espera e recria o objeto
+            if deleted:
+                file_store.delete(sha256)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception(f"Falha ao apagar o blob {sha256}")
+            continue
+        purged += deleted
+
+    if purged:
+        logger.info(f"{purged} arquivo(s) sem referência removido(s) do file store")
+    return purged
+
+
+# ─── uploads ─────────────────────────────────────────────────────────────────
+
+@contextmanager
+def upload_local_path(upload: models.XMLUpload) -> Iterator[str]:
+    """
+    Caminho local do arquivo do upload durante o bloco: objeto do file store
+    (content_sha256) ou, em uploads anteriores a ele, o arquivo em file_path.
+    """
+    if upload.content_sha256:
+        with file_store.local_path(upload.content_sha256, Path(upload.filename or "").suffix.lower()) as path:
+            yield path
+    else:
+        yield upload.file_path
+
+
+def upload_file_exists(upload: models.XMLUpload) -> bool:
+    if upload.content_sha256:
+        return file_store.exists(upload.content_sha256)
+    return bool(upload.file_path) and os.path.exists(upload.file_path)
+
+
+def create_staging_token(user_id: int, sha256: str) -> str:
+    """Token assinado (HMAC) do arquivo em staging, válido por file_store_staging_max_age."""
+    expire = _now() + timedelta(seconds=settings.file_store_staging_max_age)
+    payload = {"scope": _STAGING_SCOPE, "uid": user_id, "sha256": sha256, "exp": expire}
+    return jwt.encode(payload, settings.secret_key, algorithm=settings.algorithm)
+
+
+def read_staging_token(token: str, user_id: int) -> str:
+    """
+    SHA-256 do arquivo em staging. ValueError se o token for inválido ou
+    expirado; PermissionError se for de outro usuário.
+    """
+    try:
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+    except JWTError:
+        raise ValueError("Arquivo temporário não encontrado ou expirou")
+
+    sha256 = payload.get("sha256") or ""
+    if payload.get("scope") != _STAGING_SCOPE or not _SHA256_RE.match(sha256):
+        raise ValueError("Arquivo temporário não encontrado ou expirou")
+    if payload.get("uid") != user_id:
+        raise PermissionError("Acesso negado a este arquivo")
+    return sha256
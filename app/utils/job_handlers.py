@@ -0,0 +1,189 @@
+"""
+Handlers dos jobs executados pelo worker (app/worker.py).
+
+Cada handler recebe a sessão do worker e o job já reservado, e retorna o
+resultado (JSON) gravado em jobs.result. Arquivos gerados vão para o file
+store (jobs.artifact_sha256, com uma referência do job), acessíveis por
+qualquer nó da API.
+
+Erros:
+- PermanentJobError / ValueError: entrada inválida, o job falha sem repetir;
+- demais exceções: o job volta para a fila com backoff.
+"""
+
+import logging
+import os
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.batch_upload import ZipBatchImporter
+from app.utils.file_store import add_blob, file_store, release_blobs
+from app.utils.job_queue import PermanentJobError
+from app.utils.mapa_processor import MAPAProcessor
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Session, models.Job], Optional[dict]]
+
+HANDLERS: Dict[str, JobHandler] = {}
+
+# Tipos que o usuário pode enfileirar diretamente pela API (POST /jobs)
+USER_JOB_KINDS = ("report", "backfill_facts")
+
+
+def job_handler(kind: str):
+    """Registra o handler de um tipo de job."""
+    def register(func: JobHandler) -> JobHandler:
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def _job_user(db: Session, job: models.Job) -> models.User:
+    user = db.get(models.User, job.user_id) if job.user_id else None
+    if user is None:
+        raise PermanentJobError("Usuário do job não encontrado")
+    return user
+
+
+@job_handler("report")
+def run_report(db: Session, job: models.Job) -> dict:
+    """
+    Relatório do período (payload: {"period"}): mesmo cálculo do
+    generate-report, registra o Report e grava o PDF como artefato.
+    """
+    from app.utils.pdf_generator import MAPAReportPDFGenerator
+
+    user = _job_user(db, job)
+    period = (job.payload or {}).get("period")
+    if not period:
+        raise PermanentJobError("Período não informado")
+
+    result = MAPAProcessor(db, user.id).report_period(period)
+    if not result["success"]:
+        # Pendências de cadastro: repetir não muda nada até o catálogo mudar
+        raise PermanentJobError(result["error"], result={
+            "period": period,
+            "unregistered_entries": result.get("unregistered_entries", [])
+        })
+
+    report = models.Report(user_id=user.id, report_period=period)
+    db.add(report)
+    db.flush()
+
+    pdf_buffer = MAPAReportPDFGenerator().generate_report(
+        period=period,
+        rows=result["rows"],
+        user_info={
+            "full_name": user.full_name,
+            "company_name": user.company_name,
+            "email": user.email
+        },
+        total_nfes=result["total_nfes"]
+    )
+
+    pdf_buffer.seek(0)
+    stored = add_blob(db, pdf_buffer)
+    job.artifact_sha256 = stored.sha256
+    job.artifact_path = file_store.uri(stored.sha256)
+
+    return {
+        "period": period,
+        "report_id": report.id,
+        "total_nfes": result["total_nfes"],
+        "rows": result["rows"],
+        "artifact_filename": f"relatorio_mapa_{period}.pdf"
+    }
+
+
+@job_handler("batch_upload")
+def run_batch_upload(db: Session, job: models.Job) -> dict:
+    """
+    Importação de um ZIP gravado no file store pela API
+    (payload: {"batch_id", "zip_sha256"}). A referência do job ao ZIP é
+    liberada ao final. Jobs enfileirados antes do file store trazem
+    "zip_path" (arquivo no disco local), removido ao final.
+    """
+    payload = job.payload or {}
+    batch = db.query(models.UploadBatch).filter(
+        models.UploadBatch.id == payload.get("batch_id"),
+        models.UploadBatch.user_id == job.user_id
+    ).first()
+    if batch is None:
+        raise PermanentJobError("Upload em lote não encontrado")
+
+    zip_sha256 = payload.get("zip_sha256")
+    zip_path = payload.get("zip_path") or ""
+    if not (file_store.exists(zip_sha256) if zip_sha256 else os.path.exists(zip_path)):
+        batch.status = "failed"
+        batch.error_message = "Arquivo ZIP não encontrado no servidor"
+        release_blobs(db, [zip_sha256])
+        db.commit()
+        raise PermanentJobError(batch.error_message)
+
+    def release_zip():
+        if zip_sha256:
+            release_blobs(db, [zip_sha256])
+            db.commit()
+        else:
+            os.remove(zip_path)
+
+    batch.status = "processing"
+    db.commit()
+
+    # zipfile precisa de seek: backend remoto é copiado para um arquivo temporário
+    local_zip = file_store.local_path(zip_sha256, ".zip") if zip_sha256 else nullcontext(zip_path)
+
+    try:
+        with local_zip as path, open(path, "rb") as zip_stream:
+            ZipBatchImporter(db, batch.user_id, batch).run(zip_stream)
+    except ValueError:
+        # ZIP inválido: o importador já marcou o lote como failed
+        release_zip()
+        raise
+    except Exception:
+        if job.attempts < job.max_attempts:
+            # Falha transitória: o lote aguarda a próxima tentativa
+            batch.status = "queued"
+            batch.error_message = None
+            db.commit()
+        else:
+            release_zip()
+        raise
+
+    release_zip()
+    return {
+        "batch_id": batch.id,
+        "created": batch.created_count,
+        "duplicates": batch.duplicate_count,
+        "errors": batch.error_count
+    }
+
+
+@job_handler("backfill_facts")
+def run_backfill_facts(db: Session, job: models.Job) -> dict:
+    """
+    Gera fatos de relatório (e re-extrai uploads de parser antigo) para um
+    período (payload: {"period"}) ou para todos os períodos do usuário.
+    """
+    user = _job_user(db, job)
+    period = (job.payload or {}).get("period")
+
+    if period:
+        periods = [period]
+    else:
+        periods = [
+            row[0] for row in db.query(models.XMLUpload.period).filter(
+                models.XMLUpload.user_id == user.id,
+                models.XMLUpload.status == "processed",
+                models.XMLUpload.period.isnot(None)
+            ).distinct().all()
+        ]
+
+    processor = MAPAProcessor(db, user.id)
+    refreshed = {p: processor.refresh_period_facts(p) for p in sorted(periods)}
+
+    return {"periods": len(refreshed), "refreshed_uploads": sum(refreshed.values()), "by_period": refreshed}
@@ -0,0 +1,203 @@
+"""
+Fila de jobs persistida na tabela jobs.
+
+- enqueue_job: grava o job na transação do chamador (nada é enfileirado
+  se a requisição falhar);
+- claim_job: reserva o próximo job pronto. No PostgreSQL usa
+  SELECT ... FOR UPDATE SKIP LOCKED (vários workers sem disputa); no
+  SQLite (desenvolvimento) usa um UPDATE condicional no status;
+- complete_job / fail_job: encerram o job ou o devolvem à fila com
+  backoff exponencial;
+- requeue_expired: devolve à fila jobs de workers que pararam de
+  renovar o lease (heartbeat).
+"""
+
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tentativas de reserva no SQLite quando outro worker leva o mesmo job
+_SQLITE_CLAIM_RETRIES = 5
+
+
+class PermanentJobError(Exception):
+    """Erro que não adianta repetir (entrada inválida). Pode levar um resultado parcial."""
+
+    def __init__(self, message: str, result: Optional[dict] = None):
+        super().__init__(message)
+        self.result = result
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    payload: Optional[dict] = None,
+    user_id: Optional[int] = None,
+    max_attempts: Optional[int] = None
+) -> models.Job:
+    """Cria o job na sessão. Não faz commit."""
+    job = models.Job(
+        user_id=user_id,
+        kind=kind,
+        payload=payload or {},
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts or settings.job_max_attempts,
+        run_after=_now(),
+    )
+    db.add(job)
+    return job
+
+
+def claim_job(db: Session, worker_id: str, kinds: Optional[Iterable[str]] = None) -> Optional[models.Job]:
+    """Reserva o próximo job pronto (status queued, run_after vencido) e faz commit."""
+    kinds = list(kinds) if kinds else None
+
+    def ready():
+        query = db.query(models.Job).filter(
+            models.Job.status == "queued",
+            models.Job.run_after <= _now()
+        )
+        if kinds:
+            query = query.filter(models.Job.kind.in_(kinds))
+        return query.order_by(models.Job.run_after, models.Job.id)
+
+    if db.get_bind().dialect.name == "postgresql":
+        job = ready().with_for_update(skip_locked=True).first()
+        if job is None:
+            db.rollback()
+            return None
+        _mark_running(job, worker_id)
+        db.commit()
+        return job
+
+    # SQLite: sem SKIP LOCKED; quem vencer o UPDATE condicional fica com o job
+    for _ in range(_SQLITE_CLAIM_RETRIES):
+        candidate = ready().with_entities(models.Job.id).first()
+        if candidate is None:
+            db.rollback()
+            return None
+
+        now = _now()
+        claimed = db.query(models.Job).filter(
+            models.Job.id == candidate.id,
+            models.Job.status == "queued"
+        ).update({
+            models.Job.status: "running",
+            models.Job.locked_by: worker_id,
+            models.Job.locked_at: now,
+            models.Job.started_at: now,
+            models.Job.attempts: models.Job.attempts + 1,
+        }, synchronize_session=False)
+        db.commit()
+
+        if claimed:
+            return db.get(models.Job, candidate.id)
+
+    return None
+
+
+def _mark_running(job: models.Job, worker_id: str):
+    now = _now()
+    job.status = "running"
+    job.locked_by = worker_id
+    job.locked_at = now
+    job.started_at = now
+    job.attempts = (job.attempts or 0) + 1
+
+
+def heartbeat(db: Session, job_id: int, worker_id: str) -> bool:
+    """Renova o lease. False se o job não pertence mais a este worker."""
+    renewed = db.query(models.Job).filter(
+        models.Job.id == job_id,
+        models.Job.status == "running",
+        models.Job.locked_by == worker_id
+    ).update({models.Job.locked_at: _now()}, synchronize_session=False)
+    db.commit()
+    return bool(renewed)
+
+
+def complete_job(db: Session, job: models.Job, result: Optional[dict] = None):
+    """Marca o job como concluído e faz commit."""
+    job.status = "succeeded"
+    job.result = result
+    job.error_message = None
+    job.locked_by = None
+    job.finished_at = _now()
+    db.commit()
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff exponencial com jitter (segundos) após a tentativa de número attempts."""
+    delay = min(settings.job_retry_base_seconds * 2 ** max(attempts - 1, 0), settings.job_retry_max_seconds)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def fail_job(
+    db: Session,
+    job_id: int,
+    error: str,
+    retry: bool = True,
+    result: Optional[dict] = None
+) -> Optional[models.Job]:
+    """
+    Registra a falha e faz commit. Com retry e tentativas restantes o job
+    volta para a fila após o backoff; senão fica como failed.
+    """
+    job = db.get(models.Job, job_id)
+    if job is None:
+        return None
+
+    job.error_message = error
+    job.locked_by = None
+    if result is not None:
+        job.result = result
+
+    if retry and job.attempts < job.max_attempts:
+        job.status = "queued"
+        job.run_after = _now() + timedelta(seconds=retry_delay(job.attempts))
+    else:
+        job.status = "failed"
+        job.finished_at = _now()
+
+    db.commit()
+    return job
+
+
+def requeue_expired(db: Session, lease_seconds: Optional[int] = None) -> int:
+    """
+    Devolve à fila jobs "running" sem heartbeat há mais de lease_seconds
+    (worker morto). Jobs sem tentativas restantes são marcados como failed.
+    """
+    cutoff = _now() - timedelta(seconds=lease_seconds or settings.job_lease_seconds)
+    expired = db.query(models.Job).filter(
+        models.Job.status == "running",
+        models.Job.locked_at < cutoff
+    ).all()
+
+    for job in expired:
+        logger.warning(f"Job {job.id} ({job.kind}) sem heartbeat de {job.locked_by}; devolvendo à fila")
+        job.locked_by = None
+        job.error_message = "Worker interrompido durante a execução"
+        if job.attempts < job.max_attempts:
+            job.status = "queued"
+            job.run_after = _now()
+        else:
+            job.status = "failed"
+            job.finished_at = _now()
+
+    if expired:
+        db.commit()
+    return len(expired)
@@ -3,13 +3,23 @@ Processador MAPA - Matching de empresas/produtos com catálogo.
 Valida e agrega dados para relatório trimestral.
 """
 
+from contextlib import ExitStack
 from decimal import Decimal
 from typing import List, Dict, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from collections import defaultdict
 
 from app import models
-from app.utils.nfe_processor import NFeProcessor
+from app.utils.nfe_processor import NFeData
+from app.utils.batch_parser import parse_files
+from app.utils.catalog_cache import catalog_cache
+from app.utils.file_store import upload_local_path
+from app.utils.nfe_store import document_to_nfe_data, from_db_decimal, needs_extraction, persist_nfe_data
+from app.utils.report_cache import period_inputs_digest, report_cache
+from app.utils.report_facts import (
+    aggregate_period, convert_to_tonnes, count_period_nfes, period_fact_items,
+    replace_report_facts, stale_uploads
+)
 
 
 class MAPAProcessor:
@@ -20,32 +30,16 @@ class MAPAProcessor:
     def __init__(self, db: Session, user_id: int):
         self.db = db
         self.user_id = user_id
-        self.nfe_processor = NFeProcessor()
 
         # Carregar catálogo do usuário em memória (performance)
         self._load_catalog()
 
     def _load_catalog(self):
         """
-        Carrega catálogo de empresas e produtos do usuário.
-        Cria índices para busca rápida.
+        Carrega o snapshot do catálogo do usuário (cache por catalog_version).
+        O matching usa nomes normalizados (acentos, caixa, pontuação, espaços).
         """
-        companies = self.db.query(models.Company).filter(
-            models.Company.user_id == self.user_id
-        ).all()
-
-        # Índice: company_name -> Company
-        self.company_index = {
-            company.company_name.strip(): company
-            for company in companies
-        }
-
-        # Índice: (company_id, product_name) -> Product
-        self.product_index = {}
-        for company in companies:
-            for product in company.products:
-                key = (company.id, product.product_name.strip())
-                self.product_index[key] = product
+        self.catalog = catalog_cache.get(self.db, self.user_id)
 
     def process_uploads(self, uploads: List[models.XMLUpload]) -> dict:
         """
@@ -71,10 +65,7 @@ class MAPAProcessor:
         unregistered_entries = []
         processed_nfes = 0
 
-        for upload in uploads:
-            # Processar arquivo
-            nfe_data = self.nfe_processor.process_file(upload.file_path)
-
+        for nfe_data in self._load_nfe_data(uploads):
             if not nfe_data:
                 continue
 
@@ -82,7 +73,7 @@ class MAPAProcessor:
 
             # Buscar empresa no catálogo
             company_name = (nfe_data.emitente_razao_social or "").strip()
-            company = self.company_index.get(company_name)
+            company = self.catalog.match_company(company_name)
 
             if not company:
                 # Empresa não cadastrada - adicionar TODOS os produtos desta NF-e aos erros
@@ -90,19 +81,19 @@ class MAPAProcessor:
                     unregistered_entries.append({
                         "error_type": "company",
                         "company_name": company_name,
-                        "product_name": (produto.get("descricao") or "").strip(),
+                        "product_name": (produto.descricao or "").strip(),
                         "nfe_number": nfe_data.numero_nota,
-                        "quantity": str(produto.get("quantidade", 0)),
-                        "unit": produto.get("unidade", "")
+                        "quantity": str(produto.quantidade),
+                        "unit": produto.unidade
                     })
                 continue
 
             # Processar produtos desta NF-e
             for produto in nfe_data.produtos:
-                product_name = (produto.get("descricao") or "").strip()
+                product_name = (produto.descricao or "").strip()
 
                 # Buscar produto no catálogo
-                product_entry = self.product_index.get((company.id, product_name))
+                product_entry = self.catalog.match_product(company, product_name)
 
                 if not product_entry:
                     # Produto não cadastrado
@@ -111,8 +102,8 @@ class MAPAProcessor:
                         "company_name": company_name,
                         "product_name": product_name,
                         "nfe_number": nfe_data.numero_nota,
-                        "quantity": str(produto.get("quantidade", 0)),
-                        "unit": produto.get("unidade", "")
+                        "quantity": str(produto.quantidade),
+                        "unit": produto.unidade
                     })
                     continue
 
@@ -120,8 +111,8 @@ class MAPAProcessor:
                 mapa_registration = f"{company.mapa_registration}-{product_entry.mapa_registration}"
 
                 # Converter quantidade para toneladas
-                quantity = produto.get("quantidade", Decimal("0"))
-                unit = produto.get("unidade", "").upper().strip()
+                quantity = produto.quantidade
+                unit = (produto.unidade or "").upper().strip()
                 quantity_tonnes = self._convert_to_tonnes(quantity, unit)
 
                 # Classificar Import vs Domestic
@@ -137,8 +128,100 @@ class MAPAProcessor:
                 aggregated_data[mapa_registration]["product_reference"] = product_entry.product_reference
                 aggregated_data[mapa_registration]["source_nfes"].append(nfe_data.numero_nota)
 
+        return self._build_result(aggregated_data, unregistered_entries, processed_nfes)
+
+    def process_period(self, period: str) -> dict:
+        """
+        Gera os dados agregados do período a partir de report_facts
+        (consulta agrupada por empresa/produto). Mesmo retorno de
+        process_uploads.
+        """
+        self.refresh_period_facts(period)
+        return self._aggregate_period(period)
+
+    def _aggregate_period(self, period: str) -> dict:
+        """process_period sem gerar fatos pendentes (já gerados por quem chama)."""
+        aggregated_data = defaultdict(lambda: {
+            "quantity_import": Decimal("0"),
+            "quantity_domestic": Decimal("0"),
+            "product_name": None,
+            "product_reference": None,
+            "source_nfes": []
+        })
+        unmatched = set()
+
+        for company_name, product_name, qty_import, qty_domestic, nfe_numbers in aggregate_period(
+            self.db, self.user_id, period
+        ):
+            company = self.catalog.match_company(company_name)
+            product_entry = self.catalog.match_product(company, product_name) if company else None
+
+            if not product_entry:
+                unmatched.add((company_name, product_name))
+                continue
+
+            mapa_registration = f"{company.mapa_registration}-{product_entry.mapa_registration}"
+            entry = aggregated_data[mapa_registration]
+            entry["quantity_import"] += qty_import
+            entry["quantity_domestic"] += qty_domestic
+            entry["product_name"] = product_entry.product_name
+            entry["product_reference"] = product_entry.product_reference
+            entry["source_nfes"].extend(nfe_numbers)
+
+        # Pendências são listadas item a item, como em process_uploads
+        unregistered_entries = []
+        if unmatched:
+            for fact in period_fact_items(self.db, self.user_id, period, (c for c, _ in unmatched)):
+                if (fact.company_name, fact.product_name) not in unmatched:
+                    continue
+                unregistered_entries.append({
+                    "error_type": "product" if self.catalog.match_company(fact.company_name) else "company",
+                    "company_name": fact.company_name,
+                    "product_name": fact.product_name,
+                    "nfe_number": fact.nfe_number,
+                    "quantity": str(from_db_decimal(fact.quantity)),
+                    "unit": fact.unit
+                })
+
+        return self._build_result(
+            aggregated_data, unregistered_entries, count_period_nfes(self.db, self.user_id, period)
+        )
+
+    def report_period(self, period: str) -> dict:
+        """
+        process_period com cache compartilhado (report_cache). A chave inclui
+        a versão do catálogo e o digest dos uploads do período, então o
+        resultado é recalculado sempre que alguma entrada muda.
+        """
+        # Fatos pendentes mudam o resultado: gerar antes de montar a chave
+        self.refresh_period_facts(period)
+
+        key = report_cache.make_key(
+            self.user_id, period, self.catalog.version,
+            period_inputs_digest(self.db, self.user_id, period)
+        )
+        return report_cache.get_or_compute(key, lambda: self._aggregate_period(period))
+
+    def refresh_period_facts(self, period: str) -> int:
+        """Gera os fatos que faltam para uploads antigos do período. Retorna quantos."""
+        stale = stale_uploads(self.db, self.user_id, period)
+        if not stale:
+            return 0
+
+        refreshed = 0
+        for upload, nfe_data in zip(stale, self._load_nfe_data(stale)):
+            if nfe_data is not None:
+                replace_report_facts(upload, nfe_data)
+                refreshed += 1
+
+        self.db.commit()
+        return refreshed
+
+    def _build_result(self, aggregated_data: dict, unregistered_entries: List[dict], processed_nfes: int) -> dict:
+        """Formata o resultado (rows ou lista de pendências)."""
         # Verificar se há erros
         if unregistered_entries:
+            self._add_suggestions(unregistered_entries)
             company_errors = len([e for e in unregistered_entries if e["error_type"] == "company"])
             product_errors = len([e for e in unregistered_entries if e["error_type"] == "product"])
 
@@ -181,41 +264,76 @@ class MAPAProcessor:
             "rows": rows
         }
 
-    def _convert_to_tonnes(self, quantity: Decimal, unit: str) -> Decimal:
+    def _add_suggestions(self, unregistered_entries: List[dict]):
         """
-        Converte quantidade para toneladas.
-
-        Unidades suportadas:
-            - TON, TONELADA, TONELADAS, TN, T, TONS -> 1:1
-            - KG, QUILOGRAMA, QUILOGRAMAS, KGS, KILO, KILOS -> 1000:1
+        Adiciona a cada pendência os cadastros mais parecidos (trigramas):
+        empresas para "company", produtos da empresa para "product".
+        Calculado uma vez por par (empresa, produto) distinto.
         """
-        # Normalizar: remover pontos, vírgulas e espaços extras
-        unit_normalized = unit.upper().strip().replace('.', '').replace(',', '').replace(' ', '')
-
-        # Debug: log da conversão
-        print(f"DEBUG: Converting {quantity} {unit} (normalized: {unit_normalized})")
-
-        # Já em toneladas - expandido para cobrir mais variações
-        tonnes_units = [
-            "TON", "TONELADA", "TONELADAS", "TN", "T", "TONS",
-            "TONELADA(S)", "TON(S)", "TONNE", "TONNES", "MT"
+        memo = {}
+        for entry in unregistered_entries:
+            key = (entry["error_type"], entry["company_name"], entry["product_name"])
+            if key not in memo:
+                memo[key] = self._suggest(entry)
+            entry["suggestions"] = memo[key]
+
+    def _suggest(self, entry: dict) -> List[dict]:
+        if entry["error_type"] == "company":
+            return [
+                {
+                    "company_id": company.id,
+                    "company_name": company.company_name,
+                    "mapa_registration": company.mapa_registration,
+                    "score": score
+                }
+                for company, score in self.catalog.suggest_companies(entry["company_name"])
+            ]
+
+        company = self.catalog.match_company(entry["company_name"])
+        return [
+            {
+                "product_id": product.id,
+                "product_name": product.product_name,
+                "mapa_registration": f"{company.mapa_registration}-{product.mapa_registration}",
+                "score": score
+            }
+            for product, score in self.catalog.suggest_products(company, entry["product_name"])
         ]
-        if unit_normalized in tonnes_units:
-            print(f"  → Already in tonnes: {quantity}")
-            return quantity
-
-        # Quilogramas -> Toneladas
-        kg_units = [
-            "KG", "QUILOGRAMA", "QUILOGRAMAS", "KGS", "KILO", "KILOS",
-            "QUILOGRAMA(S)", "KG(S)", "KILOGRAMAS", "KILOGRAMA"
+
+    def _load_nfe_data(self, uploads: List[models.XMLUpload]) -> List[Optional[NFeData]]:
+        """
+        Lê os dados já extraídos no upload (nfe_documents/nfe_items).
+        Uploads sem dados persistidos ou extraídos por versão antiga do
+        parser são re-extraídos do arquivo uma única vez e gravados.
+        """
+        upload_ids = [upload.id for upload in uploads]
+        documents = {
+            document.xml_upload_id: document
+            for document in self.db.query(models.NFeDocument).options(
+                selectinload(models.NFeDocument.items)
+            ).filter(
+                models.NFeDocument.xml_upload_id.in_(upload_ids)
+            ).all()
+        } if upload_ids else {}
+
+        # Uploads pendentes são parseados em lote (pool de processos)
+        pending = [upload for upload in uploads if needs_extraction(documents.get(upload.id))]
+        with ExitStack() as stack:
+            paths = [stack.enter_context(upload_local_path(upload)) for upload in pending]
+            parsed = dict(zip((upload.id for upload in pending), parse_files(paths)))
+
+        for upload in pending:
+            if parsed[upload.id] is not None:
+                persist_nfe_data(self.db, upload, parsed[upload.id])
+
+        if pending:
+            self.db.commit()
+
+        return [
+            parsed[upload.id] if upload.id in parsed else document_to_nfe_data(documents[upload.id])
+            for upload in uploads
         ]
-        if unit_normalized in kg_units:
-            result = quantity / Decimal("1000")
-            print(f"  → KG to tonnes: {quantity} / 1000 = {result}")
-            return result
-
-        # Unidade desconhecida - LOG WARNING e assumir KG (padrão seguro)
-        print(f"  ⚠️  WARNING: Unknown unit '{unit}' (normalized: '{unit_normalized}'). Assuming KG.")
-        result = quantity / Decimal("1000")
-        print(f"  → Default KG to tonnes: {quantity} / 1000 = {result}")
-        return result
+
+    def _convert_to_tonnes(self, quantity: Decimal, unit: str) -> Decimal:
+        """Converte quantidade para toneladas (ver report_facts.convert_to_tonnes)."""
+        return convert_to_tonnes(quantity, unit)
@@ -3,37 +3,101 @@ Processador de NF-e (XML e PDF).
 Extrai dados de emitente, destinatário, produtos, nutrientes, etc.
 """
 
+import os
 import re
+import sys
+from dataclasses import dataclass, field
+from io import BytesIO
 from decimal import Decimal
-from typing import Dict, List, Optional
+from typing import BinaryIO, Dict, List, Optional
 from lxml import etree
 import pdfplumber
 
+from app.config import settings
+from app.utils.compression import file_codec, open_file
+from app.utils.nutrient_extractor import MAPA_PATTERNS, NUTRIENT_PATTERNS, nutrient_extractor
 
+# Namespace das NF-e (formato Clark usado pelo iterparse)
+NFE_NS = '{http://www.portalfiscal.inf.br/nfe}'
+
+
+# Campos de NFeProduct com strings internadas
+INTERNED_FIELDS = ("unidade", "ncm", "cfop")
+
+
+@dataclass(frozen=True, slots=True)
+class NFeProduct:
+    """
+    Item (det) de uma NF-e. Imutável e com __slots__: relatórios mantêm
+    milhares destes em memória ao mesmo tempo.
+    """
+
+    numero_item: Optional[str] = None
+    codigo: Optional[str] = None
+    descricao: Optional[str] = None
+    ncm: Optional[str] = None
+    cfop: Optional[str] = None
+    unidade: Optional[str] = None
+    quantidade: Optional[Decimal] = None
+    valor_unitario: Optional[Decimal] = None
+    valor_total: Optional[Decimal] = None
+    info_adicional: str = ""
+    nutrientes: Dict[str, Decimal] = field(default_factory=dict)
+    registro_mapa: Optional[str] = None
+
+    @classmethod
+    def create(cls, **values) -> "NFeProduct":
+        """Cria o item internando unidade/NCM/CFOP (poucos valores distintos, muito repetidos)."""
+        for name in INTERNED_FIELDS:
+            if values.get(name) is not None:
+                values[name] = sys.intern(values[name])
+        return cls(**values)
+
+    def to_dict(self) -> dict:
+        """Forma de dicionário (fronteira da API)."""
+        return {
+            "numero_item": self.numero_item,
+            "codigo": self.codigo,
+            "descricao": self.descricao,
+            "ncm": self.ncm,
+            "cfop": self.cfop,
+            "unidade": self.unidade,
+            "quantidade": self.quantidade,
+            "valor_unitario": self.valor_unitario,
+            "valor_total": self.valor_total,
+            "info_adicional": self.info_adicional,
+            "nutrientes": dict(self.nutrientes),
+            "registro_mapa": self.registro_mapa,
+        }
+
+
+@dataclass(slots=True)
 class NFeData:
-    """Estrutura de dados de uma NF-e processada"""
+    """
+    Estrutura de dados de uma NF-e processada.
+    Preenchida campo a campo pelos extratores (árvore e streaming).
+    """
 
-    def __init__(self):
-        self.chave_acesso: Optional[str] = None
-        self.numero_nota: Optional[str] = None
-        self.serie: Optional[str] = None
-        self.data_emissao: Optional[str] = None
+    chave_acesso: Optional[str] = None
+    numero_nota: Optional[str] = None
+    serie: Optional[str] = None
+    data_emissao: Optional[str] = None
 
-        # Emitente
-        self.emitente_cnpj: Optional[str] = None
-        self.emitente_razao_social: Optional[str] = None
-        self.emitente_nome_fantasia: Optional[str] = None
-        self.emitente_uf: Optional[str] = None
+    # Emitente
+    emitente_cnpj: Optional[str] = None
+    emitente_razao_social: Optional[str] = None
+    emitente_nome_fantasia: Optional[str] = None
+    emitente_uf: Optional[str] = None
 
-        # Destinatário
-        self.destinatario_cnpj: Optional[str] = None
-        self.destinatario_razao_social: Optional[str] = None
+    # Destinatário
+    destinatario_cnpj: Optional[str] = None
+    destinatario_razao_social: Optional[str] = None
 
-        # Produtos
-        self.produtos: List[Dict] = []
+    # Produtos
+    produtos: List[NFeProduct] = field(default_factory=list)
 
     def to_dict(self) -> dict:
-        """Converte para dicionário"""
+        """Converte para dicionário (gerado apenas na fronteira da API)"""
         return {
             "chave_acesso": self.chave_acesso,
             "numero_nota": self.numero_nota,
@@ -49,7 +113,7 @@ class NFeData:
                 "cnpj": self.destinatario_cnpj,
                 "razao_social": self.destinatario_razao_social
             },
-            "produtos": self.produtos
+            "produtos": [produto.to_dict() for produto in self.produtos]
         }
 
 
@@ -58,28 +122,26 @@ class NFeProcessor:
     Processador de arquivos NF-e (XML e PDF).
     """
 
+    # Versão da extração. Incrementar sempre que o resultado mudar, para que
+    # os dados persistidos em nfe_documents/nfe_items sejam re-extraídos.
+    PARSER_VERSION = 2
+
     # Namespaces NFe
     NAMESPACES = {
         'nfe': 'http://www.portalfiscal.inf.br/nfe'
     }
 
-    # Padrões regex para nutrientes
-    NUTRIENT_PATTERNS = {
-        'N': [r'N\s*TOTAL\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%', r'NITROGENIO\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%'],
-        'P2O5_TOTAL': [r'P2?O5?\s*TOTAL\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%'],
-        'P2O5_SOLUVEL': [r'P2?O5?\s*SOL[UÚ]VEL\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%'],
-        'K2O': [r'K2?O\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%'],
-        'Ca': [r'Ca\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%', r'CALCIO\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%'],
-        'Mg': [r'Mg\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%', r'MAGNESIO\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%'],
-        'S': [r'S\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%', r'ENXOFRE\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%'],
-    }
+    # Padrões regex para nutrientes e registro MAPA (ver nutrient_extractor)
+    NUTRIENT_PATTERNS = NUTRIENT_PATTERNS
+    MAPA_PATTERNS = MAPA_PATTERNS
 
-    # Padrões para registro MAPA
-    MAPA_PATTERNS = [
-        r'REGISTRO\s*MAPA[:\-]?\s*([A-Z]{2}[\-\s]?\d{5,6}[\-\s]?\d{1,7}\.?\d{0,6})',
-        r'REG\.?\s*MAPA[:\-]?\s*([A-Z]{2}[\-\s]?\d{5,6}[\-\s]?\d{1,7}\.?\d{0,6})',
-        r'([A-Z]{2}[\-\s]?\d{5,6}[\-\s]?\d{1,7}\.?\d{0,6})',
-    ]
+    # Opções do parser seguro (prevenção XXE), usadas em todos os modos
+    SECURE_PARSER_OPTIONS = {
+        'resolve_entities': False,  # Não resolver entidades externas
+        'no_network': True,         # Não fazer requisições de rede
+        'dtd_validation': False,    # Não validar DTD
+        'load_dtd': False,          # Não carregar DTD externo
+    }
 
     def __init__(self):
         pass
@@ -87,91 +149,266 @@ class NFeProcessor:
     def process_file(self, file_path: str) -> Optional[NFeData]:
         """
         Processa arquivo (XML ou PDF) e retorna NFeData.
+        Resultados passam pelo cache de parsing (settings.parse_cache_enabled).
         """
+        if settings.parse_cache_enabled:
+            # Import tardio: parse_cache depende deste módulo
+            from app.utils.parse_cache import parse_cache
+            return parse_cache.get_or_parse(
+                file_path,
+                self._process_file_uncached,
+                lambda content: self._process_file_content(content, file_path)
+            )
+
+        return self._process_file_uncached(file_path)
+
+    def _process_file_content(self, content: bytes, file_path: str) -> Optional[NFeData]:
+        """Processa o conteúdo já lido de file_path, sem consultar o cache."""
+        file_path_lower = file_path.lower()
+        if file_path_lower.endswith('.xml'):
+            file_type = 'xml'
+        elif file_path_lower.endswith('.pdf'):
+            file_type = 'pdf'
+        else:
+            file_type = self._detect_content_type(content[:1024])
+
+        if file_type == 'xml':
+            return self.process_xml_bytes(content)
+        elif file_type == 'pdf':
+            return self._process_pdf_source(BytesIO(content), file_path)
+        else:
+            raise ValueError(f"Tipo de arquivo não suportado: {file_path}")
+
+    def _process_file_uncached(self, file_path: str) -> Optional[NFeData]:
+        """Processa o arquivo sem consultar o cache."""
         file_path_lower = file_path.lower()
 
         if file_path_lower.endswith('.xml'):
             return self.process_xml(file_path)
         elif file_path_lower.endswith('.pdf'):
             return self.process_pdf(file_path)
+
+        # Objetos do file store não têm extensão: tipo pelo conteúdo
+        file_type = self._detect_file_type(file_path)
+        if file_type == 'xml':
+            return self.process_xml(file_path)
+        elif file_type == 'pdf':
+            return self.process_pdf(file_path)
         else:
             raise ValueError(f"Tipo de arquivo não suportado: {file_path}")
 
+    @staticmethod
+    def _detect_file_type(file_path: str) -> Optional[str]:
+        """'pdf' ou 'xml' pelos primeiros bytes do conteúdo (None se nenhum dos dois)."""
+        with open_file(file_path) as f:
+            return NFeProcessor._detect_content_type(f.read(1024))
+
+    @staticmethod
+    def _detect_content_type(head: bytes) -> Optional[str]:
+        if head.startswith(b'%PDF'):
+            return 'pdf'
+        if head.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'<'):
+            return 'xml'
+        return None
+
+    def process_bytes(self, content: bytes, filename: str) -> Optional[NFeData]:
+        """
+        Processa o conteúdo de um arquivo (XML ou PDF) já carregado em memória,
+        sem gravá-lo em disco. O tipo é definido pela extensão de filename.
+        Resultados passam pelo cache de parsing (settings.parse_cache_enabled).
+        """
+        if settings.parse_cache_enabled:
+            from app.utils.parse_cache import parse_cache
+            return parse_cache.get_or_parse_bytes(
+                content, lambda data: self._process_bytes_uncached(data, filename)
+            )
+
+        return self._process_bytes_uncached(content, filename)
+
+    def _process_bytes_uncached(self, content: bytes, filename: str) -> Optional[NFeData]:
+        """Processa bytes sem consultar o cache."""
+        filename_lower = filename.lower()
+
+        if filename_lower.endswith('.xml'):
+            return self.process_xml_bytes(content)
+        elif filename_lower.endswith('.pdf'):
+            return self._process_pdf_source(BytesIO(content), filename)
+        else:
+            raise ValueError(f"Tipo de arquivo não suportado: {filename}")
+
+    def process_stream(self, stream: BinaryIO, filename: str) -> Optional[NFeData]:
+        """
+        Processa um file-like binário (ex: UploadFile.file) sem copiá-lo para
+        disco. XMLs são lidos em modo streaming (iterparse). Não usa o cache,
+        pois a chave exigiria ler o conteúdo inteiro antes do parsing.
+        """
+        filename_lower = filename.lower()
+
+        if filename_lower.endswith('.xml'):
+            try:
+                return self._parse_xml_streaming(stream)
+            except Exception as e:
+                print(f"Error processing XML {filename}: {e}")
+                return None
+        elif filename_lower.endswith('.pdf'):
+            return self._process_pdf_source(stream, filename)
+        else:
+            raise ValueError(f"Tipo de arquivo não suportado: {filename}")
+
+    def process_xml_bytes(self, content: bytes) -> Optional[NFeData]:
+        """
+        Processa XML de NF-e a partir de bytes, com o mesmo parser seguro (XXE).
+        Conteúdos a partir de settings.xml_streaming_threshold usam iterparse.
+        """
+        try:
+            if len(content) >= settings.xml_streaming_threshold:
+                return self._parse_xml_streaming(BytesIO(content))
+
+            root = etree.fromstring(content, self._secure_parser())
+            return self._extract_from_tree(root)
+
+        except Exception as e:
+            print(f"Error processing XML bytes: {e}")
+            return None
+
     def process_xml(self, file_path: str) -> Optional[NFeData]:
         """
         Processa XML de NF-e.
+        Arquivos a partir de settings.xml_streaming_threshold bytes e
+        arquivos comprimidos (zstd/gzip) usam o modo streaming (iterparse),
+        que mantém memória constante.
         SEGURANÇA: Parser configurado para prevenir XXE (XML External Entity) attacks.
         """
         try:
-            # Parser seguro que desabilita entidades externas (prevenção XXE)
-            parser = etree.XMLParser(
-                resolve_entities=False,  # Não resolver entidades externas
-                no_network=True,         # Não fazer requisições de rede
-                dtd_validation=False,    # Não validar DTD
-                load_dtd=False           # Não carregar DTD externo
-            )
-            tree = etree.parse(file_path, parser)
-            root = tree.getroot()
-
-            nfe_data = NFeData()
+            if file_codec(file_path) or os.path.getsize(file_path) >= settings.xml_streaming_threshold:
+                return self._parse_xml_streaming(file_path)
 
-            # Namespace-aware XPath
-            ns = self.NAMESPACES
-
-            # Chave de acesso
-            inf_nfe = root.find('.//nfe:infNFe', ns)
-            if inf_nfe is not None:
-                nfe_data.chave_acesso = inf_nfe.get('Id', '').replace('NFe', '')
-
-            # Identificação
-            ide = root.find('.//nfe:ide', ns)
-            if ide is not None:
-                nfe_data.numero_nota = self._get_text(ide, 'nfe:nNF', ns)
-                nfe_data.serie = self._get_text(ide, 'nfe:serie', ns)
-
-                # Data de emissão (formato: YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS)
-                dhemi = self._get_text(ide, 'nfe:dhEmi', ns)
-                if dhemi:
-                    nfe_data.data_emissao = dhemi.split('T')[0]
-
-            # Emitente
-            emit = root.find('.//nfe:emit', ns)
-            if emit is not None:
-                nfe_data.emitente_cnpj = self._get_text(emit, 'nfe:CNPJ', ns)
-                nfe_data.emitente_razao_social = self._get_text(emit, 'nfe:xNome', ns)
-                nfe_data.emitente_nome_fantasia = self._get_text(emit, 'nfe:xFant', ns)
-
-                ender_emit = emit.find('nfe:enderEmit', ns)
-                if ender_emit is not None:
-                    nfe_data.emitente_uf = self._get_text(ender_emit, 'nfe:UF', ns)
-
-            # Destinatário
-            dest = root.find('.//nfe:dest', ns)
-            if dest is not None:
-                nfe_data.destinatario_cnpj = self._get_text(dest, 'nfe:CNPJ', ns)
-                nfe_data.destinatario_razao_social = self._get_text(dest, 'nfe:xNome', ns)
-
-            # Produtos
-            produtos_xml = root.findall('.//nfe:det', ns)
-            for prod_xml in produtos_xml:
-                produto = self._extract_product_from_xml(prod_xml, ns)
-                if produto:
-                    nfe_data.produtos.append(produto)
+            tree = etree.parse(file_path, self._secure_parser())
+            return self._extract_from_tree(tree.getroot())
 
-            return nfe_data
+        except Exception as e:
+            print(f"Error processing XML {file_path}: {e}")
+            return None
 
+    def process_xml_streaming(self, file_path: str) -> Optional[NFeData]:
+        """
+        Processa XML de NF-e em modo streaming (etree.iterparse).
+        O documento é percorrido uma única vez e cada elemento é liberado
+        assim que processado. Produz o mesmo NFeData que process_xml.
+        """
+        try:
+            return self._parse_xml_streaming(file_path)
         except Exception as e:
             print(f"Error processing XML {file_path}: {e}")
             return None
 
+    def _secure_parser(self) -> etree.XMLParser:
+        """Parser seguro que desabilita entidades externas (prevenção XXE)"""
+        return etree.XMLParser(**self.SECURE_PARSER_OPTIONS)
+
+    def _extract_from_tree(self, root) -> NFeData:
+        """Extrai NFeData de uma árvore lxml completa."""
+        nfe_data = NFeData()
+
+        # Namespace-aware XPath
+        ns = self.NAMESPACES
+
+        # Chave de acesso
+        inf_nfe = root.find('.//nfe:infNFe', ns)
+        if inf_nfe is not None:
+            self._extract_inf_nfe(inf_nfe, nfe_data)
+
+        # Identificação
+        ide = root.find('.//nfe:ide', ns)
+        if ide is not None:
+            self._extract_ide(ide, nfe_data)
+
+        # Emitente
+        emit = root.find('.//nfe:emit', ns)
+        if emit is not None:
+            self._extract_emit(emit, nfe_data)
+
+        # Destinatário
+        dest = root.find('.//nfe:dest', ns)
+        if dest is not None:
+            self._extract_dest(dest, nfe_data)
+
+        # Produtos
+        produtos_xml = root.findall('.//nfe:det', ns)
+        for prod_xml in produtos_xml:
+            produto = self._extract_product_from_xml(prod_xml, ns)
+            if produto:
+                nfe_data.produtos.append(produto)
+
+        return nfe_data
+
+    def _parse_xml_streaming(self, source) -> NFeData:
+        """
+        Executa iterparse sobre um caminho ou file-like. Caminhos de arquivos
+        comprimidos são descomprimidos durante a leitura.
+        """
+        if isinstance(source, str) and file_codec(source):
+            with open_file(source) as stream:
+                return self._parse_xml_streaming(stream)
+
+        extractor = NFeStreamExtractor(self)
+        for event, elem in etree.iterparse(
+            source,
+            events=NFeStreamExtractor.EVENTS,
+            tag=NFeStreamExtractor.TAGS,
+            **self.SECURE_PARSER_OPTIONS
+        ):
+            extractor.handle(event, elem)
+        return extractor.result()
+
+    def _extract_inf_nfe(self, inf_nfe, nfe_data: NFeData):
+        """Chave de acesso (atributo Id de infNFe)"""
+        nfe_data.chave_acesso = inf_nfe.get('Id', '').replace('NFe', '')
+
+    def _extract_ide(self, ide, nfe_data: NFeData):
+        """Identificação da nota"""
+        ns = self.NAMESPACES
+        nfe_data.numero_nota = self._get_text(ide, 'nfe:nNF', ns)
+        nfe_data.serie = self._get_text(ide, 'nfe:serie', ns)
+
+        # Data de emissão (formato: YYYY-MM-DD ou YYYY-MM-DDTHH:MM:SS)
+        dhemi = self._get_text(ide, 'nfe:dhEmi', ns)
+        if dhemi:
+            nfe_data.data_emissao = dhemi.split('T')[0]
+
+    def _extract_emit(self, emit, nfe_data: NFeData):
+        """Emitente"""
+        ns = self.NAMESPACES
+        nfe_data.emitente_cnpj = self._get_text(emit, 'nfe:CNPJ', ns)
+        nfe_data.emitente_razao_social = self._get_text(emit, 'nfe:xNome', ns)
+        nfe_data.emitente_nome_fantasia = self._get_text(emit, 'nfe:xFant', ns)
+
+        ender_emit = emit.find('nfe:enderEmit', ns)
+        if ender_emit is not None:
+            nfe_data.emitente_uf = self._get_text(ender_emit, 'nfe:UF', ns)
+
+    def _extract_dest(self, dest, nfe_data: NFeData):
+        """Destinatário"""
+        ns = self.NAMESPACES
+        nfe_data.destinatario_cnpj = self._get_text(dest, 'nfe:CNPJ', ns)
+        nfe_data.destinatario_razao_social = self._get_text(dest, 'nfe:xNome', ns)
+
     def process_pdf(self, file_path: str) -> Optional[NFeData]:
         """
         Processa PDF de DANFE (extração básica).
         """
+        if file_codec(file_path):
+            # pdfplumber precisa de seek: conteúdo descomprimido em memória
+            with open_file(file_path) as stream:
+                return self._process_pdf_source(BytesIO(stream.read()), file_path)
+        return self._process_pdf_source(file_path, file_path)
+
+    def _process_pdf_source(self, source, name: str) -> Optional[NFeData]:
+        """Extração do PDF a partir de um caminho ou file-like (BytesIO)."""
         try:
             nfe_data = NFeData()
 
-            with pdfplumber.open(file_path) as pdf:
+            with pdfplumber.open(source) as pdf:
                 text = ""
                 for page in pdf.pages:
                     text += page.extract_text() or ""
@@ -197,7 +434,7 @@ class NFeProcessor:
             return nfe_data
 
         except Exception as e:
-            print(f"Error processing PDF {file_path}: {e}")
+            print(f"Error processing PDF {name}: {e}")
             return None
 
     def _get_text(self, parent, xpath: str, namespaces: dict) -> Optional[str]:
@@ -207,7 +444,7 @@ class NFeProcessor:
             return elem.text.strip()
         return None
 
-    def _extract_product_from_xml(self, det_xml, namespaces: dict) -> Optional[dict]:
+    def _extract_product_from_xml(self, det_xml, namespaces: dict) -> Optional[NFeProduct]:
         """
         Extrai dados de produto do XML.
         """
@@ -217,28 +454,30 @@ class NFeProcessor:
         if prod is None:
             return None
 
-        produto = {
-            "numero_item": det_xml.get('nItem'),
-            "codigo": self._get_text(prod, 'nfe:cProd', ns),
-            "descricao": self._get_text(prod, 'nfe:xProd', ns),
-            "ncm": self._get_text(prod, 'nfe:NCM', ns),
-            "cfop": self._get_text(prod, 'nfe:CFOP', ns),
-            "unidade": self._get_text(prod, 'nfe:uCom', ns),
-            "quantidade": self._get_decimal(prod, 'nfe:qCom', ns),
-            "valor_unitario": self._get_decimal(prod, 'nfe:vUnCom', ns),
-            "valor_total": self._get_decimal(prod, 'nfe:vProd', ns),
-            "info_adicional": self._get_text(prod, 'nfe:infAdProd', ns) or "",
-        }
-
-        # Extrair garantias nutricionais da info adicional
-        if produto["info_adicional"]:
-            produto["nutrientes"] = self._extract_nutrients(produto["info_adicional"])
-            produto["registro_mapa"] = self._extract_mapa_registration(produto["info_adicional"])
-        else:
-            produto["nutrientes"] = {}
-            produto["registro_mapa"] = None
-
-        return produto
+        # infAdProd é filho de det no leiaute 4.00 (prod mantido por compatibilidade)
+        info_adicional = (
+            self._get_text(det_xml, 'nfe:infAdProd', ns)
+            or self._get_text(prod, 'nfe:infAdProd', ns)
+            or ""
+        )
+
+        # Extrair garantias nutricionais e registro MAPA da info adicional
+        nutrientes, registro_mapa = nutrient_extractor.extract(info_adicional)
+
+        return NFeProduct.create(
+            numero_item=det_xml.get('nItem'),
+            codigo=self._get_text(prod, 'nfe:cProd', ns),
+            descricao=self._get_text(prod, 'nfe:xProd', ns),
+            ncm=self._get_text(prod, 'nfe:NCM', ns),
+            cfop=self._get_text(prod, 'nfe:CFOP', ns),
+            unidade=self._get_text(prod, 'nfe:uCom', ns),
+            quantidade=self._get_decimal(prod, 'nfe:qCom', ns),
+            valor_unitario=self._get_decimal(prod, 'nfe:vUnCom', ns),
+            valor_total=self._get_decimal(prod, 'nfe:vProd', ns),
+            info_adicional=info_adicional,
+            nutrientes=nutrientes,
+            registro_mapa=registro_mapa,
+        )
 
     def _get_decimal(self, parent, xpath: str, namespaces: dict) -> Optional[Decimal]:
         """Helper para extrair valor decimal de elemento XML"""
@@ -256,35 +495,129 @@ class NFeProcessor:
         """
         Extrai nutrientes do texto usando regex.
         """
-        nutrients = {}
-        text_upper = text.upper()
-
-        for nutrient, patterns in self.NUTRIENT_PATTERNS.items():
-            for pattern in patterns:
-                match = re.search(pattern, text_upper)
-                if match:
-                    try:
-                        value = match.group(1).replace(',', '.')
-                        nutrients[nutrient] = Decimal(value)
-                        break
-                    except:
-                        continue
-
-        return nutrients
+        return nutrient_extractor.extract_nutrients(text)
 
     def _extract_mapa_registration(self, text: str) -> Optional[str]:
         """
         Extrai registro MAPA do texto.
         Formato esperado: XX-12345-6.000001 ou variações
         """
-        text_upper = text.upper()
+        return nutrient_extractor.extract_mapa_registration(text)
 
-        for pattern in self.MAPA_PATTERNS:
-            match = re.search(pattern, text_upper)
-            if match:
-                # Normalizar formato (remover espaços extras)
-                registro = match.group(1).strip()
-                registro = re.sub(r'\s+', '-', registro)
-                return registro
 
-        return None
+class NFeStreamExtractor:
+    """
+    Monta NFeData a partir de eventos de parsing incremental
+    (etree.iterparse ou etree.XMLPullParser).
+
+    Reproduz a semântica do modo árvore: primeiro infNFe/ide/emit/dest do
+    documento e todos os det. Cada bloco é liberado da memória assim que
+    processado, então o consumo não cresce com o número de itens.
+    """
+
+    EVENTS = ('start', 'end')
+
+    TAG_INF_NFE = f'{NFE_NS}infNFe'
+    TAG_IDE = f'{NFE_NS}ide'
+    TAG_EMIT = f'{NFE_NS}emit'
+    TAG_DEST = f'{NFE_NS}dest'
+    TAG_DET = f'{NFE_NS}det'
+
+    TAGS = (TAG_INF_NFE, TAG_IDE, TAG_EMIT, TAG_DEST, TAG_DET)
+
+    def __init__(self, processor: NFeProcessor):
+        self.processor = processor
+        self.nfe_data = NFeData()
+        self._seen = set()
+
+    def handle(self, event: str, elem):
+        """Processa um evento (start/end) do parser incremental."""
+        tag = elem.tag
+
+        # Elemento raiz não é considerado (equivalente ao './/' do modo árvore)
+        if elem.getparent() is None:
+            return
+
+        if event == 'start':
+            # Id está disponível no start; o end de infNFe só chega no fim do documento
+            if tag == self.TAG_INF_NFE and self._first(tag):
+                self.processor._extract_inf_nfe(elem, self.nfe_data)
+            return
+
+        if tag == self.TAG_DET:
+            produto = self.processor._extract_product_from_xml(elem, self.processor.NAMESPACES)
+            if produto:
+                self.nfe_data.produtos.append(produto)
+        elif tag == self.TAG_IDE:
+            if self._first(tag):
+                self.processor._extract_ide(elem, self.nfe_data)
+        elif tag == self.TAG_EMIT:
+            if self._first(tag):
+                self.processor._extract_emit(elem, self.nfe_data)
+        elif tag == self.TAG_DEST:
+            if self._first(tag):
+                self.processor._extract_dest(elem, self.nfe_data)
+        else:
+            return
+
+        self._release(elem)
+
+    def result(self) -> NFeData:
+        """Retorna os dados extraídos."""
+        return self.nfe_data
+
+    def seen(self, tag: str) -> bool:
+        """True se a tag (infNFe/ide/emit/dest) já foi encontrada."""
+        return tag in self._seen
+
+    def _first(self, tag: str) -> bool:
+        """True apenas na primeira ocorrência da tag."""
+        if tag in self._seen:
+            return False
+        self._seen.add(tag)
+        return True
+
+    def _release(self, elem):
+        """Libera o elemento processado e os irmãos anteriores já lidos."""
+        elem.clear(keep_tail=True)
+        parent = elem.getparent()
+        if parent is not None:
+            while elem.getprevious() is not None:
+                del parent[0]
+
+
+class NFeFeedParser:
+    """
+    Parser incremental de NF-e: recebe o XML em blocos (feed) e extrai os
+    dados durante a leitura, com as mesmas opções seguras (XXE) e a mesma
+    semântica do modo streaming.
+    """
+
+    def __init__(self, processor: Optional[NFeProcessor] = None):
+        self.processor = processor or NFeProcessor()
+        self._extractor = NFeStreamExtractor(self.processor)
+        self._parser = etree.XMLPullParser(
+            events=NFeStreamExtractor.EVENTS,
+            tag=NFeStreamExtractor.TAGS,
+            **NFeProcessor.SECURE_PARSER_OPTIONS
+        )
+
+    def feed(self, chunk: bytes):
+        """Alimenta o parser. Levanta etree.XMLSyntaxError se o XML for inválido."""
+        self._parser.feed(chunk)
+        self._drain()
+
+    def close(self) -> NFeData:
+        """Finaliza o documento e retorna os dados extraídos."""
+        self._parser.close()
+        self._drain()
+        return self._extractor.result()
+
+    @property
+    def found_nfe(self) -> bool:
+        """True se o documento contém infNFe no namespace da NF-e."""
+        return self._extractor.seen(NFeStreamExtractor.TAG_INF_NFE)
+
+    def _drain(self):
+        for event, elem in self._parser.read_events():
+            self._extractor.handle(event, elem)
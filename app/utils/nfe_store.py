@@ -0,0 +1,150 @@
+"""
+Persistência dos dados extraídos de NF-e.
+O XML é parseado uma única vez no upload e gravado em nfe_documents/nfe_items;
+relatórios leem essas linhas em vez de re-parsear os arquivos.
+"""
+
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.file_store import upload_local_path
+from app.utils.nfe_processor import NFeData, NFeProcessor, NFeProduct
+from app.utils.report_facts import replace_report_facts
+
+logger = logging.getLogger(__name__)
+
+# Campos do cabeçalho copiados 1:1 entre NFeData e NFeDocument
+HEADER_FIELDS = (
+    "chave_acesso",
+    "numero_nota",
+    "serie",
+    "data_emissao",
+    "emitente_cnpj",
+    "emitente_razao_social",
+    "emitente_nome_fantasia",
+    "emitente_uf",
+    "destinatario_cnpj",
+    "destinatario_razao_social",
+)
+
+
+def needs_extraction(document: Optional[models.NFeDocument]) -> bool:
+    """Indica se o upload precisa ser (re)extraído do arquivo."""
+    return document is None or document.parser_version != NFeProcessor.PARSER_VERSION
+
+
+def persist_nfe_data(db: Session, upload: models.XMLUpload, nfe_data: NFeData) -> models.NFeDocument:
+    """
+    Grava (ou substitui) os dados extraídos de um upload e os fatos de
+    relatório correspondentes.
+    Não faz commit: o chamador controla a transação.
+    """
+    document = upload.nfe_document
+    if document is None:
+        document = models.NFeDocument(xml_upload=upload)
+        db.add(document)
+    else:
+        document.items.clear()
+
+    document.parser_version = NFeProcessor.PARSER_VERSION
+    for field in HEADER_FIELDS:
+        setattr(document, field, getattr(nfe_data, field))
+    # Cópia no upload: validação de duplicatas pelo índice (user_id, nfe_key)
+    upload.nfe_key = nfe_data.chave_acesso
+
+    for position, produto in enumerate(nfe_data.produtos):
+        document.items.append(models.NFeItem(
+            position=position,
+            numero_item=produto.numero_item,
+            codigo=produto.codigo,
+            descricao=produto.descricao,
+            ncm=produto.ncm,
+            cfop=produto.cfop,
+            unidade=produto.unidade,
+            quantidade=produto.quantidade,
+            valor_unitario=produto.valor_unitario,
+            valor_total=produto.valor_total,
+            info_adicional=produto.info_adicional,
+            registro_mapa=produto.registro_mapa,
+            nutrientes={k: str(v) for k, v in produto.nutrientes.items()},
+        ))
+
+    replace_report_facts(upload, nfe_data)
+    return document
+
+
+def document_to_nfe_data(document: models.NFeDocument) -> NFeData:
+    """Reconstrói NFeData a partir das linhas persistidas."""
+    nfe_data = NFeData()
+    for field in HEADER_FIELDS:
+        setattr(nfe_data, field, getattr(document, field))
+
+    for item in document.items:
+        nfe_data.produtos.append(NFeProduct.create(
+            numero_item=item.numero_item,
+            codigo=item.codigo,
+            descricao=item.descricao,
+            ncm=item.ncm,
+            cfop=item.cfop,
+            unidade=item.unidade,
+            quantidade=from_db_decimal(item.quantidade),
+            valor_unitario=from_db_decimal(item.valor_unitario),
+            valor_total=from_db_decimal(item.valor_total),
+            info_adicional=item.info_adicional or "",
+            nutrientes={k: Decimal(v) for k, v in (item.nutrientes or {}).items()},
+            registro_mapa=item.registro_mapa,
+        ))
+
+    return nfe_data
+
+
+def extract_upload(
+    db: Session,
+    upload: models.XMLUpload,
+    processor: Optional[NFeProcessor] = None
+) -> Optional[NFeData]:
+    """
+    Parseia o arquivo do upload e persiste o resultado.
+    Retorna None se não foi possível extrair dados. Não faz commit.
+    """
+    processor = processor or NFeProcessor()
+    with upload_local_path(upload) as file_path:
+        nfe_data = processor.process_file(file_path)
+
+    if nfe_data is None:
+        logger.warning(f"Não foi possível extrair dados do upload {upload.id} ({upload.file_path})")
+        return None
+
+    persist_nfe_data(db, upload, nfe_data)
+    return nfe_data
+
+
+def period_from_emission(data_emissao) -> Optional[str]:
+    """Período trimestral (ex: "Q3-2025") a partir da data de emissão."""
+    if not data_emissao:
+        return None
+    try:
+        if isinstance(data_emissao, str):
+            data_emissao = datetime.fromisoformat(data_emissao.split('T')[0])
+        trimestre = (data_emissao.month - 1) // 3 + 1
+        return f"Q{trimestre}-{data_emissao.year}"
+    except (ValueError, AttributeError):
+        return None
+
+
+def from_db_decimal(value) -> Optional[Decimal]:
+    """
+    Remove a escala fixa da coluna Numeric (36.0000 -> 36) para que os
+    valores voltem com a mesma representação do XML.
+    """
+    if value is None:
+        return None
+    value = Decimal(value)
+    if value == value.to_integral_value():
+        return value.quantize(Decimal(1))
+    return value.normalize()
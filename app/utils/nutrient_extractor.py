@@ -0,0 +1,178 @@
+"""
+Extração de garantias nutricionais e registro MAPA do texto dos produtos.
+O texto é convertido para maiúsculas uma vez e os nutrientes saem de uma
+única passada (ver _REVERSED_NUTRIENTS); o registro MAPA usa padrões
+compilados uma vez, com pré-filtro por literal e o genérico ancorado.
+"""
+
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Optional, Tuple
+
+# Valor percentual comum a todos os padrões de nutrientes
+_VALUE = r'\s*[:\-]?\s*(\d+(?:[.,]\d+)?)\s*%'
+
+# Padrões regex para nutrientes (ordem = prioridade dentro de cada nutriente)
+NUTRIENT_PATTERNS = {
+    'N': [r'N\s*TOTAL' + _VALUE, r'NITROGENIO' + _VALUE],
+    'P2O5_TOTAL': [r'P2?O5?\s*TOTAL' + _VALUE],
+    'P2O5_SOLUVEL': [r'P2?O5?\s*SOL[UÚ]VEL' + _VALUE],
+    'K2O': [r'K2?O' + _VALUE],
+    'Ca': [r'Ca' + _VALUE, r'CALCIO' + _VALUE],
+    'Mg': [r'Mg' + _VALUE, r'MAGNESIO' + _VALUE],
+    'S': [r'S' + _VALUE, r'ENXOFRE' + _VALUE],
+}
+
+# Os mesmos padrões, de trás para frente, em uma única regex para o texto
+# invertido: cada casamento começa em um "%" (prefixo literal, localizado
+# sem testar as demais posições), segue pelo valor e termina na chave do
+# nutriente, em um grupo nomeado por padrão (mesma ordem de NUTRIENT_PATTERNS).
+# Antes de um "%" cabe no máximo uma chave; o último casamento de cada grupo
+# no texto invertido é o primeiro (re.search) no texto original.
+_REVERSED_VALUE = r'%\s*((?:\d+[.,])?\d+)\s*[:\-]?\s*'
+_REVERSED_KEYS = {
+    'N': [r'LATOT\s*N', r'OINEGORTIN'],
+    'P2O5_TOTAL': [r'LATOT\s*5?O2?P'],
+    'P2O5_SOLUVEL': [r'LEV[UÚ]LOS\s*5?O2?P'],
+    'K2O': [r'O2?K'],
+    'Ca': [r'aC', r'OICLAC'],
+    'Mg': [r'gM', r'OISENGAM'],
+    'S': [r'S', r'ERFOXNE'],
+}
+
+
+def _reversed_nutrient_regex():
+    """Regex do texto invertido e nutriente -> grupos, em ordem de prioridade."""
+    alternatives = []
+    groups = []
+    for nutrient, keys in _REVERSED_KEYS.items():
+        assert len(keys) == len(NUTRIENT_PATTERNS[nutrient]), nutrient
+        names = []
+        for key in keys:
+            name = f"k{len(alternatives)}"
+            alternatives.append(f"(?P<{name}>{key})")
+            names.append(name)
+        groups.append((nutrient, names))
+    return re.compile(_REVERSED_VALUE + '(?:' + '|'.join(alternatives) + ')'), groups
+
+
+# Padrões para registro MAPA (o último é genérico: só casa no início de uma
+# palavra, como "PR-12345-6.000001" ou "SP 123456-7.000001")
+MAPA_PATTERNS = [
+    r'REGISTRO\s*MAPA[:\-]?\s*([A-Z]{2}[\-\s]?\d{5,6}[\-\s]?\d{1,7}\.?\d{0,6})',
+    r'REG\.?\s*MAPA[:\-]?\s*([A-Z]{2}[\-\s]?\d{5,6}[\-\s]?\d{1,7}\.?\d{0,6})',
+    r'\b([A-Z]{2}[\-\s]?\d{5,6}[\-\s]?\d{1,7}\.?\d{0,6})',
+]
+
+# Literal obrigatório de cada padrão acima (pré-filtro barato com "in")
+MAPA_KEYWORDS = ['MAPA', 'MAPA', None]
+
+# Fórmula NPK (ex: 15-15-15, 04-14-08, NPK 10-10-10). Cada componente tem até
+# 2 dígitos inteiros e não pode estar colado a outros números, barras ou
+# hífens (evita datas como 27-09-2028 e registros como 001177-0.000016).
+NPK_PATTERN = re.compile(
+    r'(?<![\d.,/\-])(\d{1,2}(?:[.,]\d+)?)-(\d{1,2}(?:[.,]\d+)?)-(\d{1,2}(?:[.,]\d+)?)(?![\d/\-]|[.,]\d)'
+)
+
+# Nutrientes preenchidos pela fórmula NPK, na ordem dos componentes
+NPK_NUTRIENTS = ('N', 'P2O5_TOTAL', 'K2O')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+class NutrientExtractor:
+    """
+    Motor de extração de nutrientes e registro MAPA.
+    Instâncias são imutáveis e podem ser compartilhadas entre threads.
+    """
+
+    def __init__(self, npk_formula: bool = True):
+        self.npk_formula = npk_formula
+
+        # Regex única (texto invertido) + nutriente -> [grupo] em ordem de prioridade
+        self._nutrient_regex, self._nutrient_groups = _reversed_nutrient_regex()
+
+        self._mapa_rules = [
+            (keyword, re.compile(pattern))
+            for keyword, pattern in zip(MAPA_KEYWORDS, MAPA_PATTERNS)
+        ]
+
+    def extract(self, text: str) -> Tuple[Dict[str, Decimal], Optional[str]]:
+        """
+        Extrai nutrientes e registro MAPA do mesmo texto.
+        O texto é convertido para maiúsculas uma única vez.
+        """
+        if not text:
+            return {}, None
+
+        text_upper = text.upper()
+        return self._nutrients(text_upper), self._mapa_registration(text_upper)
+
+    def extract_nutrients(self, text: str) -> Dict[str, Decimal]:
+        """Extrai garantias nutricionais (ex: {'N': Decimal('46')})."""
+        if not text:
+            return {}
+        return self._nutrients(text.upper())
+
+    def extract_mapa_registration(self, text: str) -> Optional[str]:
+        """
+        Extrai registro MAPA do texto.
+        Formato esperado: XX-12345-6.000001 ou variações
+        """
+        if not text:
+            return None
+        return self._mapa_registration(text.upper())
+
+    def _nutrients(self, text_upper: str) -> Dict[str, Decimal]:
+        nutrients = {}
+
+        # Todos os padrões explícitos exigem "%"
+        if '%' in text_upper:
+            # Uma passada do fim para o início: o valor que fica é o mais à esquerda
+            found = {
+                match.lastgroup: match.group(1)
+                for match in self._nutrient_regex.finditer(text_upper[::-1])
+            }
+
+            if found:
+                for nutrient, names in self._nutrient_groups:
+                    for name in names:
+                        value = _to_decimal(found[name][::-1]) if name in found else None
+                        if value is not None:
+                            nutrients[nutrient] = value
+                            break
+
+        # Fórmula NPK completa apenas os nutrientes não declarados explicitamente
+        if self.npk_formula and '-' in text_upper:
+            match = NPK_PATTERN.search(text_upper)
+            if match:
+                for nutrient, raw in zip(NPK_NUTRIENTS, match.groups()):
+                    if nutrient not in nutrients:
+                        value = _to_decimal(raw)
+                        if value is not None:
+                            nutrients[nutrient] = value
+
+        return nutrients
+
+    def _mapa_registration(self, text_upper: str) -> Optional[str]:
+        for keyword, regex in self._mapa_rules:
+            if keyword is not None and keyword not in text_upper:
+                continue
+            match = regex.search(text_upper)
+            if match:
+                # Normalizar formato (remover espaços extras)
+                return _WHITESPACE.sub('-', match.group(1).strip())
+
+        return None
+
+
+def _to_decimal(raw: str) -> Optional[Decimal]:
+    """Converte valor com vírgula ou ponto decimal."""
+    try:
+        return Decimal(raw.replace(',', '.'))
+    except InvalidOperation:
+        return None
+
+
+# Instância compartilhada (padrões compilados uma única vez por processo)
+nutrient_extractor = NutrientExtractor()
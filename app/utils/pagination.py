@@ -0,0 +1,74 @@
+"""
+Paginação por keyset (cursor) das listagens.
+
+As páginas são ordenadas por (data, id) decrescente; o cursor codifica a
+última linha entregue e a próxima página continua a partir dela com
+WHERE (data, id) < (:data, :id). Ao contrário de OFFSET, o custo de uma
+página não cresce com a posição e linhas inseridas entre as requisições
+não duplicam nem escondem itens.
+
+O corpo da resposta continua sendo a lista; o cursor da próxima página
+vai no header X-Next-Cursor (ausente na última página).
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import func, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """Cursor opaco (base64 de [data ISO, id])."""
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(data, id) do cursor. HTTPException 400 se for inválido."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginação inválido"
+        )
+
+
+def keyset_page(db, stmt, sort_column, id_column, cursor: Optional[str], limit: int):
+    """
+    Aplica ordem (data, id) decrescente, o cursor e o limite a um select()
+    ou Query de db (Session ou AsyncSession). Busca limit + 1 linhas para
+    saber se há próxima página.
+    """
+    sort_value = None
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite guarda datas como texto em formatos diferentes (com e sem
+        # microssegundos): compara pelo valor numérico (julianday)
+        sort_column = func.julianday(sort_column)
+        if sort_value is not None:
+            sort_value = func.julianday(sort_value.replace(tzinfo=None).isoformat(" "))
+
+    if cursor:
+        stmt = stmt.where(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    return stmt.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def finish_page(rows: list, limit: int, response: Response, sort_attr: str) -> List:
+    """Descarta a linha extra e, se havia, publica o cursor da próxima página."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, sort_attr), last.id)
+    return rows
@@ -0,0 +1,320 @@
+"""
+Cache de resultados de parsing de NF-e.
+A chave é o SHA-256 do conteúdo do arquivo + NFeProcessor.PARSER_VERSION:
+o mesmo arquivo (preview, confirmação, re-upload) é parseado uma única vez.
+
+Dois níveis:
+- memória: LRU limitado (settings.parse_cache_max_entries) por processo;
+- disco: um JSON compacto por arquivo em {parse_cache_dir}/v{versão}/ab/<hash>.json,
+  compartilhado entre processos (inclusive os workers do pool de parsing).
+  Limitado por idade e tamanho total (settings.parse_cache_disk_max_age /
+  parse_cache_disk_max_bytes): o worker chama purge_disk junto da limpeza
+  do file store, que também apaga os diretórios de versões anteriores.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Callable, Dict, Optional
+
+from app.config import settings
+from app.utils.compression import open_file
+from app.utils.nfe_processor import NFeData, NFeProcessor, NFeProduct
+from app.utils.nfe_store import HEADER_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Campos decimais dos produtos (gravados como string para não perder precisão)
+DECIMAL_FIELDS = ("quantidade", "valor_unitario", "valor_total")
+
+_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(file_path: str) -> str:
+    """
+    SHA-256 do conteúdo do arquivo, lido em blocos. Arquivos comprimidos
+    são descomprimidos: a chave é a mesma do conteúdo original.
+    """
+    digest = hashlib.sha256()
+    with open_file(file_path) as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_if_small(file_path: str, limit: int) -> Optional[bytes]:
+    """Conteúdo original do arquivo se tiver menos que limit bytes (senão None)."""
+    with open_file(file_path) as f:
+        content = f.read(limit)
+    return content if len(content) < limit else None
+
+
+def serialize_nfe_data(nfe_data: NFeData) -> dict:
+    """NFeData -> dicionário compatível com JSON."""
+    produtos = []
+    for produto in nfe_data.produtos:
+        item = produto.to_dict()
+        for field in DECIMAL_FIELDS:
+            if item[field] is not None:
+                item[field] = str(item[field])
+        item["nutrientes"] = {k: str(v) for k, v in item["nutrientes"].items()}
+        produtos.append(item)
+
+    payload = {field: getattr(nfe_data, field) for field in HEADER_FIELDS}
+    payload["produtos"] = produtos
+    return payload
+
+
+def deserialize_nfe_data(payload: dict) -> NFeData:
+    """Dicionário gravado por serialize_nfe_data -> NFeData."""
+    nfe_data = NFeData()
+    for field in HEADER_FIELDS:
+        setattr(nfe_data, field, payload.get(field))
+
+    for item in payload.get("produtos", []):
+        values = dict(item)
+        for field in DECIMAL_FIELDS:
+            if values.get(field) is not None:
+                values[field] = Decimal(values[field])
+        values["nutrientes"] = {k: Decimal(v) for k, v in (values.get("nutrientes") or {}).items()}
+        nfe_data.produtos.append(NFeProduct.create(**values))
+
+    return nfe_data
+
+
+class ParseCache:
+    """
+    Cache em dois níveis (memória LRU + disco) de resultados do NFeProcessor.
+    Falhas de parsing (None) não são armazenadas.
+    """
+
+    def __init__(self, max_entries: int, cache_dir: Optional[str]):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._memory: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "stores": 0,
+            "disk_errors": 0,
+        }
+
+    def get_or_parse(
+        self,
+        file_path: str,
+        parse: Callable[[str], Optional[NFeData]],
+        parse_bytes: Optional[Callable[[bytes], Optional[NFeData]]] = None
+    ) -> Optional[NFeData]:
+        """
+        Retorna o resultado em cache ou parseia o arquivo e armazena.
+        Com parse_bytes, arquivos abaixo de settings.xml_streaming_threshold
+        são lidos (e descomprimidos) uma única vez: o mesmo conteúdo gera a
+        chave e vai para o parser. Os maiores são lidos duas vezes em blocos
+        (hash e parsing em streaming) para manter a memória constante.
+        """
+        if parse_bytes is not None:
+            content = _read_if_small(file_path, settings.xml_streaming_threshold)
+            if content is not None:
+                return self.get_or_parse_bytes(content, parse_bytes)
+
+        return self._get_or_compute(file_digest(file_path), lambda: parse(file_path))
+
+    def get_or_parse_bytes(self, content: bytes, parse: Callable[[bytes], Optional[NFeData]]) -> Optional[NFeData]:
+        """Igual a get_or_parse, para conteúdo já carregado em memória."""
+        return self._get_or_compute(hashlib.sha256(content).hexdigest(), lambda: parse(content))
+
+    def _get_or_compute(self, content_hash: str, compute: Callable[[], Optional[NFeData]]) -> Optional[NFeData]:
+        key = self.make_key(content_hash)
+
+        payload = self._get_memory(key)
+        if payload is not None:
+            self._count("memory_hits")
+            return deserialize_nfe_data(payload)
+
+        payload = self._get_disk(key)
+        if payload is not None:
+            self._count("disk_hits")
+            self._put_memory(key, payload)
+            return deserialize_nfe_data(payload)
+
+        self._count("misses")
+        nfe_data = compute()
+        if nfe_data is not None:
+            payload = serialize_nfe_data(nfe_data)
+            self._put_memory(key, payload)
+            self._put_disk(key, payload)
+            self._count("stores")
+
+        return nfe_data
+
+    def store(self, content_hash: str, nfe_data: NFeData):
+        """Armazena um resultado obtido fora do cache (ex: parsing em streaming do upload)."""
+        key = self.make_key(content_hash)
+        payload = serialize_nfe_data(nfe_data)
+        self._put_memory(key, payload)
+        self._put_disk(key, payload)
+        self._count("stores")
+
+    @staticmethod
+    def make_key(content_hash: str) -> str:
+        """Chave = hash do conteúdo + versão do parser."""
+        return f"v{NFeProcessor.PARSER_VERSION}/{content_hash}"
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de uso (por processo) e ocupação do nível em memória."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+        stats["max_entries"] = self.max_entries
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear_memory(self):
+        """Esvazia o nível em memória (o disco é mantido)."""
+        with self._lock:
+            self._memory.clear()
+
+    def purge_disk(self, max_bytes: Optional[int] = None, max_age: Optional[int] = None) -> int:
+        """
+        Limpa o nível em disco: apaga os diretórios de versões anteriores do
+        parser, as entradas sem uso há mais de max_age segundos e, acima de
+        max_bytes no total, as usadas há mais tempo (0 = sem limite).
+        Retorna quantas entradas da versão atual foram removidas.
+        """
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return 0
+        max_bytes = settings.parse_cache_disk_max_bytes if max_bytes is None else max_bytes
+        max_age = settings.parse_cache_disk_max_age if max_age is None else max_age
+
+        current = f"v{NFeProcessor.PARSER_VERSION}"
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name != current and name.startswith("v") and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Cache de parsing da versão {name} removido")
+
+        entries = sorted(self._disk_entries(os.path.join(self.cache_dir, current)))
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - max_age if max_age > 0 else None
+
+        removed = 0
+        for used_at, size, path in entries:
+            expired = cutoff is not None and used_at < cutoff
+            if not expired and (max_bytes <= 0 or total <= max_bytes):
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Falha ao apagar cache {path}: {e}")
+                continue
+            total -= size
+            removed += 1
+
+        if removed:
+            logger.info(f"{removed} entrada(s) removida(s) do cache de parsing em disco")
+        return removed
+
+    @staticmethod
+    def _disk_entries(version_dir: str):
+        """(último uso, tamanho, caminho) de cada entrada; o uso é o mtime."""
+        for root, _, files in os.walk(version_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    # ─── memória ──────────────────────────────────────────────────────────────
+
+    def _get_memory(self, key: str) -> Optional[dict]:
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+            return payload
+
+    def _put_memory(self, key: str, payload: dict):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = payload
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    # ─── disco ────────────────────────────────────────────────────────────────
+
+    def _disk_path(self, key: str) -> str:
+        version, content_hash = key.split("/", 1)
+        return os.path.join(self.cache_dir, version, content_hash[:2], f"{content_hash}.json")
+
+    def _get_disk(self, key: str) -> Optional[dict]:
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Entrada de cache inválida {path}: {e}")
+            self._count("disk_errors")
+            return None
+
+        # mtime = último uso: purge_disk remove primeiro as usadas há mais tempo
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return payload
+
+    def _put_disk(self, key: str, payload: dict):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Escrita atômica: arquivo temporário + rename
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"Falha ao gravar cache {path}: {e}")
+            self._count("disk_errors")
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+
+# Instância compartilhada (uma por processo)
+parse_cache = ParseCache(
+    max_entries=settings.parse_cache_max_entries,
+    cache_dir=(
+        settings.parse_cache_dir or os.path.join(settings.upload_dir, ".cache")
+    ) if settings.parse_cache_disk else None,
+)
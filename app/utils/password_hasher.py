@@ -0,0 +1,145 @@
+"""
+Hash e verificação de senhas (bcrypt) em um executor dedicado e limitado.
+
+Cada operação bcrypt custa ~250 ms de CPU. No threadpool das rotas, um pico
+de logins (início do expediente) ocupa as threads que atendem o resto da
+API. Aqui as operações vão para um ThreadPoolExecutor próprio
+(settings.password_hash_workers threads; o bcrypt libera o GIL) com fila
+limitada (settings.password_hash_max_queue): com a fila cheia,
+PasswordHasherBusy (503 com Retry-After, handler em app/main.py).
+Fila, espera e duração em GET /api/admin/auth-stats.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from passlib.context import CryptContext
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Amostras de espera/duração mantidas para os percentis (janela móvel)
+_MAX_SAMPLES = 1000
+
+# Configuração de hash de senhas
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHasherBusy(Exception):
+    """Fila do executor de senhas cheia (tente novamente em instantes)."""
+
+
+def _percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class PasswordHasher:
+    """Executor de bcrypt com fila limitada e métricas (um por processo)."""
+
+    def __init__(self, context: CryptContext, workers: int, max_queue: int):
+        self.context = context
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0  # na fila + executando
+        self._running = 0
+        self._counters = {"completed": 0, "rejected": 0}
+        self._wait_ms = deque(maxlen=_MAX_SAMPLES)
+        self._run_ms = deque(maxlen=_MAX_SAMPLES)
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self._counters["rejected"] += 1
+                raise PasswordHasherBusy("Muitas operações de senha em andamento")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+                logger.info(f"✓ Executor de senhas criado com {self.workers} threads")
+            self._pending += 1
+            executor = self._executor
+
+        submitted = time.monotonic()
+
+        def run():
+            started = time.monotonic()
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                finished = time.monotonic()
+                with self._lock:
+                    self._running -= 1
+                    self._counters["completed"] += 1
+                    self._wait_ms.append((started - submitted) * 1000)
+                    self._run_ms.append((finished - started) * 1000)
+
+        try:
+            future = executor.submit(run)
+        except RuntimeError:
+            # Executor encerrado (shutdown do app)
+            with self._lock:
+                self._pending -= 1
+            raise
+        # Também quando cancelado antes de rodar (cliente desconectou)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future: Future):
+        with self._lock:
+            self._pending -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(self._submit(self.context.verify, plain_password, hashed_password))
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(self.context.hash, password))
+
+    def verify_sync(self, plain_password: str, hashed_password: str) -> bool:
+        """Para rotas síncronas/scripts: bloqueia a thread atual até o resultado."""
+        return self._submit(self.context.verify, plain_password, hashed_password).result()
+
+    def hash_sync(self, password: str) -> str:
+        return self._submit(self.context.hash, password).result()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            waits = sorted(self._wait_ms)
+            runs = sorted(self._run_ms)
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                **self._counters,
+                "wait_ms": {
+                    "p50": round(_percentile(waits, 0.5), 1) if waits else 0.0,
+                    "p99": round(_percentile(waits, 0.99), 1) if waits else 0.0,
+                    "max": round(waits[-1], 1) if waits else 0.0,
+                },
+                "run_ms": {
+                    "p50": round(_percentile(runs, 0.5), 1) if runs else 0.0,
+                    "p99": round(_percentile(runs, 0.99), 1) if runs else 0.0,
+                },
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Instância compartilhada (uma por processo)
+password_hasher = PasswordHasher(
+    pwd_context,
+    workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue
+)
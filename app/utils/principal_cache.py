@@ -0,0 +1,98 @@
+"""
+Cache dos usuários autenticados (principal por token).
+
+get_current_user decodifica o JWT e procura o sub (e-mail) aqui antes de ir
+ao banco: um Principal imutável (id, e-mail, is_admin, is_active,
+token_version) fica em um LRU por processo, válido por
+settings.auth_cache_ttl segundos. Alterações feitas pelo próprio processo
+(PATCH/DELETE /users/{id}, troca de senha) invalidam a entrada na hora; nas
+demais réplicas/workers a entrada expira com o TTL.
+
+users.token_version vai no claim "ver" do token: a troca de senha incrementa
+a versão e os tokens emitidos antes dela deixam de valer.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Usuário autenticado, sem sessão do banco (apenas o necessário para autorizar)."""
+    id: int
+    email: str
+    is_admin: bool
+    is_active: bool
+    token_version: int
+
+
+class PrincipalCache:
+    """LRU de Principal por sub do token, com TTL por entrada."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Incrementado a cada invalidação: cargas iniciadas antes não são gravadas
+        self._generation = 0
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, subject: str) -> Tuple[Optional[Principal], int]:
+        """(principal em cache ou None, geração a repassar para put)."""
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is not None:
+                principal, expires = entry
+                if time.monotonic() < expires:
+                    self._entries.move_to_end(subject)
+                    self._counters["hits"] += 1
+                    return principal, self._generation
+                del self._entries[subject]
+            self._counters["misses"] += 1
+            return None, self._generation
+
+    def put(self, subject: str, principal: Principal, generation: int):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            # Invalidação concorrente: o que foi lido do banco pode estar velho
+            if generation != self._generation:
+                return
+            self._entries[subject] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def invalidate(self, subject: str):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(subject, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            total = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self._counters["hits"] / total, 4) if total else 0.0,
+            }
+
+
+# Instância compartilhada (uma por processo)
+principal_cache = PrincipalCache(
+    ttl=settings.auth_cache_ttl,
+    max_entries=settings.auth_cache_max_entries
+)
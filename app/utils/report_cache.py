@@ -0,0 +1,142 @@
+"""
+Cache do resultado de relatório por período.
+
+A chave reúne tudo de que o resultado depende:
+(user_id, período, catalog_version, digest dos uploads do período).
+Qualquer mudança nessas entradas (novo upload, exclusão, mudança de
+período/status, re-extração, alteração do catálogo) gera outra chave,
+então não há invalidação explícita. generate-report e download usam o
+mesmo cache: o download logo após gerar não recalcula nada.
+
+Single-flight: requisições concorrentes com a mesma chave esperam o
+cálculo em andamento em vez de repeti-lo.
+"""
+
+import copy
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+ReportKey = Tuple[int, str, int, str]
+
+
+def period_inputs_digest(db: Session, user_id: int, period: str) -> str:
+    """
+    SHA-256 dos uploads processados do período: id, hash do conteúdo
+    (content_sha256; troca de arquivo no mesmo upload muda a chave), chave
+    de acesso e versão do parser de cada um (uma consulta indexada, sem ler
+    itens).
+    """
+    rows = db.query(
+        models.XMLUpload.id,
+        models.XMLUpload.content_sha256,
+        models.NFeDocument.chave_acesso,
+        models.NFeDocument.parser_version
+    ).outerjoin(
+        models.NFeDocument, models.NFeDocument.xml_upload_id == models.XMLUpload.id
+    ).filter(
+        models.XMLUpload.user_id == user_id,
+        models.XMLUpload.status == "processed",
+        models.XMLUpload.period == period
+    ).order_by(models.XMLUpload.id).all()
+
+    digest = hashlib.sha256()
+    for upload_id, content_sha256, chave_acesso, parser_version in rows:
+        digest.update(
+            f"{upload_id}:{content_sha256 or ''}:{chave_acesso or ''}:{parser_version or 0};".encode()
+        )
+    return digest.hexdigest()
+
+
+class ReportCache:
+    """
+    LRU de resultados de MAPAProcessor.process_period.
+    Guarda só a versão mais recente de cada (usuário, período): uma chave
+    nova substitui a anterior, então entradas obsoletas não ocupam espaço.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[ReportKey, dict]]" = OrderedDict()
+        self._inflight: Dict[ReportKey, Future] = {}
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "waits": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(user_id: int, period: str, catalog_version: int, inputs_digest: str) -> ReportKey:
+        return (user_id, period, catalog_version, inputs_digest)
+
+    def get_or_compute(self, key: ReportKey, compute: Callable[[], dict]) -> dict:
+        """
+        Resultado em cache para a chave ou calculado por compute().
+        Erros não são armazenados e são repassados a quem estava esperando.
+        """
+        slot = key[:2]
+
+        with self._lock:
+            cached = self._entries.get(slot)
+            if cached is not None and cached[0] == key:
+                self._entries.move_to_end(slot)
+                self._counters["hits"] += 1
+                return copy.deepcopy(cached[1])
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self._counters["misses"] += 1
+            else:
+                self._counters["waits"] += 1
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._entries[slot] = (key, result)
+            self._entries.move_to_end(slot)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+        future.set_result(result)
+        return copy.deepcopy(result)
+
+    def invalidate(self, user_id: int):
+        """Remove todos os períodos do usuário."""
+        with self._lock:
+            for slot in [slot for slot in self._entries if slot[0] == user_id]:
+                del self._entries[slot]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            total = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self._counters["hits"] / total, 4) if total else 0.0,
+            }
+
+
+# Instância compartilhada (uma por processo)
+report_cache = ReportCache(max_entries=settings.report_cache_max_entries)
@@ -0,0 +1,212 @@
+"""
+Fatos de relatório (report_facts).
+
+Cada item de NF-e vira uma linha com a quantidade já convertida para
+toneladas e a classificação importação/nacional. As linhas são gravadas
+junto com nfe_items (persist_nfe_data) e acompanham o período do upload,
+então o relatório é uma consulta agrupada por (empresa, produto) cujo
+tamanho depende do catálogo, não da quantidade de notas do período.
+
+O vínculo com o catálogo (registro MAPA) é resolvido na leitura: alterar
+empresas/produtos não exige recalcular os fatos.
+"""
+
+import logging
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import Session
+
+from app import models
+from app.utils.nfe_processor import NFeData, NFeProcessor
+
+logger = logging.getLogger(__name__)
+
+# Unidades já em toneladas (após remover pontos, vírgulas e espaços)
+TONNES_UNITS = frozenset({
+    "TON", "TONELADA", "TONELADAS", "TN", "T", "TONS",
+    "TONELADA(S)", "TON(S)", "TONNE", "TONNES", "MT"
+})
+
+# Unidades em quilogramas
+KG_UNITS = frozenset({
+    "KG", "QUILOGRAMA", "QUILOGRAMAS", "KGS", "KILO", "KILOS",
+    "QUILOGRAMA(S)", "KG(S)", "KILOGRAMAS", "KILOGRAMA"
+})
+
+# Fatos guardam toneladas como miligramas inteiros (qCom tem até 4 decimais)
+MG_PER_TONNE = Decimal(10) ** 9
+
+# Separador das notas agregadas por string_agg/group_concat
+_NFE_SEPARATOR = ","
+
+
+def convert_to_tonnes(quantity: Optional[Decimal], unit: Optional[str]) -> Decimal:
+    """
+    Converte quantidade para toneladas.
+    Unidade desconhecida é tratada como KG (padrão seguro).
+    """
+    if quantity is None:
+        return Decimal("0")
+
+    unit_normalized = (unit or "").upper().strip().replace('.', '').replace(',', '').replace(' ', '')
+
+    if unit_normalized in TONNES_UNITS:
+        return quantity
+
+    if unit_normalized not in KG_UNITS:
+        logger.warning(f"Unidade desconhecida '{unit}' (normalizada: '{unit_normalized}'). Assumindo KG.")
+
+    return quantity / Decimal("1000")
+
+
+def tonnes_to_mg(tonnes: Decimal) -> int:
+    """Toneladas -> miligramas (inteiro)."""
+    return int((tonnes * MG_PER_TONNE).to_integral_value())
+
+
+def mg_to_tonnes(milligrams) -> Decimal:
+    """Miligramas (resultado de SUM) -> toneladas, sem perda."""
+    return Decimal(int(milligrams or 0)) / MG_PER_TONNE
+
+
+def build_report_facts(upload: models.XMLUpload, nfe_data: NFeData) -> List[models.ReportFact]:
+    """Linhas de fato para os itens de uma NF-e."""
+    company_name = (nfe_data.emitente_razao_social or "").strip()
+    is_import = nfe_data.emitente_uf == "EX"
+
+    return [
+        models.ReportFact(
+            user_id=upload.user_id,
+            period=upload.period,
+            position=position,
+            company_name=company_name,
+            product_name=(produto.descricao or "").strip(),
+            is_import=is_import,
+            quantity=produto.quantidade,
+            unit=produto.unidade,
+            quantity_mg=tonnes_to_mg(convert_to_tonnes(produto.quantidade, produto.unidade)),
+            nfe_number=nfe_data.numero_nota,
+        )
+        for position, produto in enumerate(nfe_data.produtos)
+    ]
+
+
+def replace_report_facts(upload: models.XMLUpload, nfe_data: NFeData):
+    """
+    Substitui os fatos do upload (as linhas antigas são removidas pelo
+    delete-orphan) e marca o documento como em dia. Não faz commit.
+    """
+    upload.report_facts = build_report_facts(upload, nfe_data)
+    if upload.nfe_document is not None:
+        upload.nfe_document.facts_version = NFeProcessor.PARSER_VERSION
+
+
+def move_report_facts(db: Session, upload_id: int, period: Optional[str]):
+    """Retira os fatos do período anterior e os atribui ao novo. Não faz commit."""
+    db.query(models.ReportFact).filter(
+        models.ReportFact.xml_upload_id == upload_id
+    ).update({models.ReportFact.period: period}, synchronize_session=False)
+
+
+def stale_uploads(db: Session, user_id: int, period: str) -> List[models.XMLUpload]:
+    """
+    Uploads processados do período cujos fatos ainda não foram gerados
+    pela versão atual do parser (NFeDocument.facts_version): enviados antes
+    da tabela report_facts ou extraídos por versão antiga do parser.
+    """
+    return db.query(models.XMLUpload).outerjoin(
+        models.NFeDocument, models.NFeDocument.xml_upload_id == models.XMLUpload.id
+    ).filter(
+        models.XMLUpload.user_id == user_id,
+        models.XMLUpload.status == "processed",
+        models.XMLUpload.period == period,
+        or_(
+            models.NFeDocument.id.is_(None),
+            models.NFeDocument.parser_version != NFeProcessor.PARSER_VERSION,
+            models.NFeDocument.facts_version.is_(None),
+            models.NFeDocument.facts_version != NFeProcessor.PARSER_VERSION
+        )
+    ).all()
+
+
+def count_period_nfes(db: Session, user_id: int, period: str) -> int:
+    """Quantidade de NF-e com dados extraídos no período."""
+    return db.query(func.count(models.NFeDocument.id)).join(
+        models.XMLUpload, models.NFeDocument.xml_upload_id == models.XMLUpload.id
+    ).filter(
+        models.XMLUpload.user_id == user_id,
+        models.XMLUpload.status == "processed",
+        models.XMLUpload.period == period
+    ).scalar() or 0
+
+
+def _distinct_nfe_numbers(db: Session):
+    """string_agg(DISTINCT ...) no PostgreSQL, group_concat(DISTINCT ...) no SQLite."""
+    column = models.ReportFact.nfe_number.distinct()
+    if db.get_bind().dialect.name == "postgresql":
+        return func.string_agg(column, _NFE_SEPARATOR)
+    return func.group_concat(column)
+
+
+def aggregate_period(db: Session, user_id: int, period: str) -> List[Tuple]:
+    """
+    Totais do período por (empresa, produto).
+
+    Returns:
+        Lista de (company_name, product_name, quantity_import,
+        quantity_domestic, nfe_numbers): quantidades em toneladas (Decimal)
+        e nfe_numbers já separado em lista.
+    """
+    fact = models.ReportFact
+    rows = db.query(
+        fact.company_name,
+        fact.product_name,
+        func.sum(case((fact.is_import.is_(True), fact.quantity_mg), else_=0)),
+        func.sum(case((fact.is_import.is_(True), 0), else_=fact.quantity_mg)),
+        _distinct_nfe_numbers(db)
+    ).join(
+        models.XMLUpload, fact.xml_upload_id == models.XMLUpload.id
+    ).filter(
+        fact.user_id == user_id,
+        fact.period == period,
+        models.XMLUpload.status == "processed"
+    ).group_by(
+        fact.company_name, fact.product_name
+    ).all()
+
+    return [
+        (
+            company_name,
+            product_name,
+            mg_to_tonnes(quantity_import),
+            mg_to_tonnes(quantity_domestic),
+            nfe_numbers.split(_NFE_SEPARATOR) if nfe_numbers else []
+        )
+        for company_name, product_name, quantity_import, quantity_domestic, nfe_numbers in rows
+    ]
+
+
+def period_fact_items(
+    db: Session,
+    user_id: int,
+    period: str,
+    company_names: Iterable[str]
+) -> List[models.ReportFact]:
+    """Fatos individuais das empresas informadas (usado para listar pendências)."""
+    company_names = list(set(company_names))
+    if not company_names:
+        return []
+
+    return db.query(models.ReportFact).join(
+        models.XMLUpload, models.ReportFact.xml_upload_id == models.XMLUpload.id
+    ).filter(
+        models.ReportFact.user_id == user_id,
+        models.ReportFact.period == period,
+        models.ReportFact.company_name.in_(company_names),
+        models.XMLUpload.status == "processed"
+    ).order_by(
+        models.ReportFact.xml_upload_id, models.ReportFact.position
+    ).all()
+
@@ -3,10 +3,16 @@ Validadores de segurança para uploads de arquivos.
 Valida extensão, MIME type, magic numbers e tamanho.
 """
 
+import hashlib
 import logging
 import os
 import re
 from pathlib import Path
+from typing import BinaryIO, Optional
+
+from lxml import etree
+
+from app.utils.nfe_processor import NFeFeedParser, NFeProcessor
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +33,12 @@ ALLOWED_MIME_TYPES = {
     "application/pdf"
 }
 
+# Tamanho dos blocos lidos do upload na validação em streaming
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Bytes iniciais usados na detecção de MIME type e magic numbers
+HEADER_SNIFF_SIZE = 8 * 1024
+
 # Magic numbers (primeiros bytes dos arquivos)
 MAGIC_NUMBERS = {
     "xml": [b"<?xml", b"<"],
@@ -128,13 +140,7 @@ def validate_file_size(content: bytes, max_size: int) -> bool:
     file_size = len(content)
 
     if file_size > max_size:
-        max_size_mb = max_size / (1024 * 1024)
-        file_size_mb = file_size / (1024 * 1024)
-
-        raise ValueError(
-            f"Arquivo muito grande: {file_size_mb:.2f}MB. "
-            f"Tamanho máximo: {max_size_mb:.2f}MB"
-        )
+        _raise_file_too_large(file_size, max_size)
 
     if file_size == 0:
         raise ValueError("Arquivo vazio")
@@ -142,6 +148,16 @@ def validate_file_size(content: bytes, max_size: int) -> bool:
     return True
 
 
+def _raise_file_too_large(file_size: int, max_size: int):
+    max_size_mb = max_size / (1024 * 1024)
+    file_size_mb = file_size / (1024 * 1024)
+
+    raise ValueError(
+        f"Arquivo muito grande: {file_size_mb:.2f}MB. "
+        f"Tamanho máximo: {max_size_mb:.2f}MB"
+    )
+
+
 def validate_xml_structure(content: bytes) -> bool:
     """
     Valida estrutura básica do XML.
@@ -205,3 +221,133 @@ def validate_file_security(filename: str, content: bytes, max_size: int) -> dict
         "mime_type": mime_type,
         "size": len(content)
     }
+
+
+class StreamingUploadValidator:
+    """
+    Validação de upload em uma única passada, bloco a bloco.
+
+    - tamanho: verificado a cada bloco (o upload nunca é acumulado em memória);
+    - MIME type e magic numbers: verificados nos primeiros bytes;
+    - XML: os blocos alimentam um NFeFeedParser, então a boa formação,
+      o namespace da NF-e e a extração dos dados acontecem na mesma leitura.
+
+    PDFs são apenas validados; a extração fica a cargo do NFeProcessor.
+    Com extract=False o XML também é apenas validado (tamanho, MIME e magic
+    numbers) e a extração é feita depois (ex: em paralelo, no upload em lote).
+
+    Uso:
+        validator = StreamingUploadValidator(filename, settings.max_upload_size)
+        for chunk in chunks:
+            validator.feed(chunk)
+        info = validator.close()  # info["nfe_data"] (XML) e info["sha256"]
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        max_size: int,
+        processor: Optional[NFeProcessor] = None,
+        extract: bool = True
+    ):
+        self.filename = sanitize_filename(filename)
+        self.extension = validate_file_extension(self.filename)
+        self.max_size = max_size
+        self.size = 0
+        self.mime_type: Optional[str] = None
+
+        self._head = bytearray()
+        self._header_checked = False
+        self._digest = hashlib.sha256()
+        self._feed_parser = NFeFeedParser(processor) if extract and self.extension == "xml" else None
+
+    def feed(self, chunk: bytes):
+        """Valida e processa o próximo bloco do upload."""
+        if not chunk:
+            return
+
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            _raise_file_too_large(self.size, self.max_size)
+
+        self._digest.update(chunk)
+
+        if not self._header_checked:
+            self._head.extend(chunk)
+            if len(self._head) < HEADER_SNIFF_SIZE:
+                return  # Aguarda bytes suficientes para os cabeçalhos
+            self._check_header()
+            # Blocos retidos até aqui são enviados ao parser de uma vez
+            chunk = bytes(self._head)
+            self._head = bytearray()
+
+        self._feed_xml(chunk)
+
+    def close(self) -> dict:
+        """
+        Finaliza a validação.
+        Returns:
+            dict com filename, extension, mime_type, size, sha256 e nfe_data
+            (NFeData extraído para XML; None para PDF ou extract=False)
+        """
+        if self.size == 0:
+            raise ValueError("Arquivo vazio")
+
+        if not self._header_checked:
+            self._check_header()
+            self._feed_xml(bytes(self._head))
+            self._head = bytearray()
+
+        nfe_data = None
+        if self._feed_parser is not None:
+            try:
+                nfe_data = self._feed_parser.close()
+            except etree.XMLSyntaxError:
+                raise ValueError("Arquivo não contém estrutura XML válida")
+
+            if not self._feed_parser.found_nfe:
+                raise ValueError(
+                    "Arquivo XML não parece ser uma NF-e (Nota Fiscal Eletrônica)"
+                )
+
+        return {
+            "filename": self.filename,
+            "extension": self.extension,
+            "mime_type": self.mime_type,
+            "size": self.size,
+            "sha256": self._digest.hexdigest(),
+            "nfe_data": nfe_data
+        }
+
+    def _check_header(self):
+        head = bytes(self._head)
+        self.mime_type = validate_mime_type(head)
+        validate_magic_numbers(head, self.extension)
+        self._header_checked = True
+
+    def _feed_xml(self, chunk: bytes):
+        if self._feed_parser is None or not chunk:
+            return
+        try:
+            self._feed_parser.feed(chunk)
+        except etree.XMLSyntaxError:
+            raise ValueError("Arquivo não contém estrutura XML válida")
+
+
+def read_upload_stream(stream: BinaryIO, filename: str, max_size: int) -> dict:
+    """
+    Valida e extrai um upload a partir de um arquivo aberto
+    (StreamingUploadValidator; PDFs são extraídos pelo NFeProcessor em seguida).
+    Levanta ValueError se o arquivo for inválido.
+    """
+    validator = StreamingUploadValidator(filename, max_size)
+    for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+        validator.feed(chunk)
+    upload_info = validator.close()
+
+    if upload_info["extension"] == "pdf":
+        # PDF não tem parsing incremental: extrai do arquivo já validado
+        stream.seek(0)
+        upload_info["nfe_data"] = NFeProcessor().process_stream(stream, filename)
+
+    return upload_info
@@ -0,0 +1,233 @@
+"""
+Worker da fila de jobs (tabela jobs).
+
+Executa relatórios, importações em lote e backfills fora do processo da
+API. Vários workers (em outras máquinas, inclusive) podem consumir a mesma
+fila: a reserva usa SELECT ... FOR UPDATE SKIP LOCKED no PostgreSQL.
+Entre um job e outro, apaga do file store os arquivos sem referência e
+limpa o cache de parsing em disco (a cada settings.file_store_gc_interval),
+reconstrói os contadores do dashboard (a cada
+settings.stats_reconcile_interval) e apaga os refresh tokens expirados
+(a cada settings.refresh_token_purge_interval).
+
+Usage:
+    python -m app.worker
+    python -m app.worker --kinds report,backfill_facts
+    python -m app.worker --once          # processa o que estiver pronto e sai
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from typing import List, Optional
+
+from app.auth import purge_refresh_tokens
+from app.config import settings
+from app.database import SessionLocal, init_db
+from app.utils.batch_parser import shutdown_parse_pool
+from app.utils.dashboard_stats import rebuild_counters
+from app.utils.file_store import purge_unreferenced
+from app.utils.job_handlers import HANDLERS
+from app.utils.job_queue import (
+    PermanentJobError, claim_job, complete_job, fail_job, heartbeat, requeue_expired
+)
+from app.utils.parse_cache import parse_cache
+
+logger = logging.getLogger("app.worker")
+
+
+class _Heartbeat:
+    """Renova o lease do job em uma thread (sessão própria) enquanto ele executa."""
+
+    def __init__(self, job_id: int, worker_id: str, interval: float):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job_id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            db = SessionLocal()
+            try:
+                if not heartbeat(db, self.job_id, self.worker_id):
+                    logger.warning(f"Job {self.job_id} não pertence mais a este worker")
+                    return
+            except Exception:
+                logger.exception(f"Falha ao renovar o lease do job {self.job_id}")
+            finally:
+                db.close()
+
+
+class Worker:
+    """Laço de consumo: reserva, executa e registra o resultado de cada job."""
+
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        kinds: Optional[List[str]] = None,
+        poll_interval: Optional[float] = None
+    ):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.kinds = kinds
+        self.poll_interval = poll_interval or settings.job_poll_interval
+        self._stopping = threading.Event()
+        self._next_purge = 0.0
+        self._next_reconcile = 0.0
+        self._next_token_purge = 0.0
+
+    def stop(self, *_):
+        """Termina após o job em andamento (SIGTERM/SIGINT)."""
+        logger.info("Encerrando worker após o job atual...")
+        self._stopping.set()
+
+    def run(self, once: bool = False):
+        logger.info(f"Worker {self.worker_id} iniciado (tipos: {', '.join(self.kinds or HANDLERS)})")
+        while not self._stopping.is_set():
+            self._requeue_expired()
+            self._purge_blobs()
+            self._reconcile_counters()
+            self._purge_refresh_tokens()
+            if self.run_one():
+                continue
+            if once:
+                break
+            self._stopping.wait(self.poll_interval)
+
+    def run_one(self) -> bool:
+        """Executa um job pronto. False se a fila estava vazia."""
+        db = SessionLocal()
+        try:
+            job = claim_job(db, self.worker_id, self.kinds)
+            if job is None:
+                return False
+
+            job_id = job.id
+            logger.info(f"Job {job_id} ({job.kind}) tentativa {job.attempts}/{job.max_attempts}")
+            handler = HANDLERS.get(job.kind)
+
+            try:
+                if handler is None:
+                    raise PermanentJobError(f"Tipo de job desconhecido: {job.kind}")
+                with _Heartbeat(job_id, self.worker_id, max(settings.job_lease_seconds / 3, 1)):
+                    result = handler(db, job)
+                complete_job(db, job, result)
+                logger.info(f"Job {job_id} concluído")
+            except (PermanentJobError, ValueError) as e:
+                db.rollback()
+                fail_job(db, job_id, str(e), retry=False, result=getattr(e, "result", None))
+                logger.warning(f"Job {job_id} falhou: {e}")
+            except Exception as e:
+                db.rollback()
+                logger.exception(f"Job {job_id} falhou")
+                job = fail_job(db, job_id, f"Erro interno: {type(e).__name__}", retry=True)
+                if job is not None and job.status == "queued":
+                    logger.info(f"Job {job_id} volta à fila em {job.run_after.isoformat()}")
+
+            return True
+        finally:
+            db.close()
+
+    def _requeue_expired(self):
+        db = SessionLocal()
+        try:
+            requeue_expired(db)
+        except Exception:
+            logger.exception("Falha ao verificar jobs com lease expirado")
+        finally:
+            db.close()
+
+    def _purge_blobs(self):
+        if time.monotonic() < self._next_purge:
+            return
+        self._next_purge = time.monotonic() + settings.file_store_gc_interval
+
+        db = SessionLocal()
+        try:
+            purge_unreferenced(db)
+        except Exception:
+            logger.exception("Falha ao limpar o file store")
+        finally:
+            db.close()
+
+        try:
+            parse_cache.purge_disk()
+        except Exception:
+            logger.exception("Falha ao limpar o cache de parsing em disco")
+
+    def _reconcile_counters(self):
+        if time.monotonic() < self._next_reconcile:
+            return
+        self._next_reconcile = time.monotonic() + settings.stats_reconcile_interval
+
+        db = SessionLocal()
+        try:
+            rebuild_counters(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Falha ao reconstruir os contadores do dashboard")
+        finally:
+            db.close()
+
+    def _purge_refresh_tokens(self):
+        if time.monotonic() < self._next_token_purge:
+            return
+        self._next_token_purge = time.monotonic() + settings.refresh_token_purge_interval
+
+        db = SessionLocal()
+        try:
+            purged = purge_refresh_tokens(db)
+            db.commit()
+            if purged:
+                logger.info(f"{purged} refresh token(s) expirado(s) removido(s)")
+        except Exception:
+            db.rollback()
+            logger.exception("Falha ao remover refresh tokens expirados")
+        finally:
+            db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker da fila de jobs")
+    parser.add_argument("--kinds", help=f"Tipos de job separados por vírgula (padrão: todos: {', '.join(HANDLERS)})")
+    parser.add_argument("--poll-interval", type=float, default=None, help="Segundos entre consultas com a fila vazia")
+    parser.add_argument("--worker-id", default=None, help="Identificação do worker (padrão: host:pid)")
+    parser.add_argument("--once", action="store_true", help="Processa os jobs prontos e sai")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if settings.debug else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()] if args.kinds else None
+    unknown = set(kinds or []) - set(HANDLERS)
+    if unknown:
+        parser.error(f"Tipos de job desconhecidos: {', '.join(sorted(unknown))}")
+
+    init_db()
+    worker = Worker(worker_id=args.worker_id, kinds=kinds, poll_interval=args.poll_interval)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+
+    try:
+        worker.run(once=args.once)
+    finally:
+        shutdown_parse_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark do matching com o catálogo (CatalogSnapshot).
+
+Gera um catálogo sintético (empresas x produtos com nomes no estilo das
+NF-e) e mede:
+- match exato por nome normalizado (variações de caixa/acento/pontuação);
+- sugestões por trigramas para nomes com erros de digitação, por pendência;
+- construção do snapshot (custo pago a cada mudança de catalog_version) e
+  dos índices de trigramas (montados na primeira sugestão de cada empresa).
+
+Usage:
+    python benchmarks/bench_catalog_matching.py
+    python benchmarks/bench_catalog_matching.py --companies 200 --products 100
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from app.utils.catalog_cache import CatalogSnapshot
+
+PREFIXOS = ["FERTILIZANTE", "ADUBO", "CORRETIVO", "SUBSTRATO", "INOCULANTE", "CONDICIONADOR"]
+TIPOS = ["MINERAL MISTO", "ORGÂNICO", "ORGANOMINERAL", "FOLIAR", "SIMPLES", "COMPOSTO"]
+FORMULAS = ["NPK", "NK", "PK", "MAP", "SSP", "KCL", "UREIA"]
+EMPRESAS = ["AGRO", "FÉRTIL", "NUTRI", "SOLO", "CAMPO", "SAFRA", "TERRA", "VERDE"]
+SUFIXOS = ["LTDA", "LTDA.", "S.A.", "S/A", "EIRELI", "ME"]
+
+
+def company_name(rng: random.Random, index: int) -> str:
+    return f"{rng.choice(EMPRESAS)} {rng.choice(EMPRESAS)} INDÚSTRIA {index} {rng.choice(SUFIXOS)}"
+
+
+def product_name(rng: random.Random, index: int) -> str:
+    formula = "-".join(f"{rng.randint(0, 30):02d}" for _ in range(3))
+    return f"{rng.choice(PREFIXOS)} {rng.choice(TIPOS)} {rng.choice(FORMULAS)} {formula} LOTE {index}"
+
+
+def build_rows(rng: random.Random, companies: int, products: int) -> list:
+    rows = []
+    product_id = 0
+    for company_id in range(1, companies + 1):
+        company = SimpleNamespace(
+            id=company_id,
+            company_name=company_name(rng, company_id),
+            mapa_registration=f"PR-{company_id:05d}",
+        )
+        for _ in range(products):
+            product_id += 1
+            rows.append((company, SimpleNamespace(
+                id=product_id,
+                product_name=product_name(rng, product_id),
+                mapa_registration=f"6.{product_id:06d}",
+                product_reference=f"REF-{product_id}",
+            )))
+    return rows
+
+
+def variant(rng: random.Random, name: str) -> str:
+    """Mesma chave normalizada: caixa, acentos e pontuação diferentes."""
+    name = name.lower() if rng.random() < 0.5 else name
+    name = name.replace("Ú", "U").replace("É", "E").replace("Â", "A")
+    return f"  {name.replace('-', '.')} "
+
+
+def typo(rng: random.Random, name: str) -> str:
+    """Erros de digitação: troca, remoção e duplicação de caracteres."""
+    chars = list(name)
+    for _ in range(3):
+        position = rng.randrange(len(chars))
+        operation = rng.random()
+        if operation < 0.33:
+            chars[position] = rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+        elif operation < 0.66 and len(chars) > 5:
+            del chars[position]
+        else:
+            chars.insert(position, chars[position])
+    return "".join(chars)
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do matching com o catálogo")
+    parser.add_argument("--companies", type=int, default=100)
+    parser.add_argument("--products", type=int, default=50, help="Produtos por empresa")
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    rows = build_rows(rng, args.companies, args.products)
+
+    start = time.perf_counter()
+    snapshot = CatalogSnapshot.build(user_id=1, version=1, rows=rows)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    samples = [rng.choice(rows) for _ in range(args.queries)]
+
+    # Match exato (normalizado)
+    hits = 0
+    start = time.perf_counter()
+    for company, product in samples:
+        matched = snapshot.match_company(variant(rng, company.company_name))
+        if matched and snapshot.match_product(matched, variant(rng, product.product_name)):
+            hits += 1
+    exact_us = (time.perf_counter() - start) / len(samples) * 1e6
+
+    # Índices de trigramas (montados sob demanda; medidos à parte)
+    start = time.perf_counter()
+    snapshot.suggest_companies("x")
+    for company in snapshot.companies:
+        snapshot.suggest_products(company, "x")
+    trigram_ms = (time.perf_counter() - start) * 1000
+
+    # Sugestões para nomes com erro de digitação
+    latencies = []
+    top1 = 0
+    for company, product in samples:
+        query = typo(rng, product.product_name)
+        catalog_company = snapshot.match_company(company.company_name)
+        start = time.perf_counter()
+        suggestions = snapshot.suggest_products(catalog_company, query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if suggestions and suggestions[0][0].id == product.id:
+            top1 += 1
+
+    company_latencies = []
+    for company, _ in samples:
+        query = typo(rng, company.company_name)
+        start = time.perf_counter()
+        snapshot.suggest_companies(query)
+        company_latencies.append((time.perf_counter() - start) * 1000)
+
+    print("=" * 60)
+    print(f"  Catálogo: {args.companies} empresas x {args.products} produtos ({len(rows)} produtos)")
+    print("=" * 60)
+    print(f"  Construção do snapshot:        {build_ms:10.1f} ms")
+    print(f"  Índices de trigramas (todos):  {trigram_ms:10.1f} ms")
+    print(f"  Match exato (normalizado):     {exact_us:10.1f} µs/item   acertos {hits / len(samples):.1%}")
+    print(f"  Sugestão de produto:   média {statistics.mean(latencies):.3f} ms   p99 {percentile(latencies, 0.99):.3f} ms"
+          f"   top-1 {top1 / len(samples):.1%}")
+    print(f"  Sugestão de empresa:   média {statistics.mean(company_latencies):.3f} ms"
+          f"   p99 {percentile(company_latencies, 0.99):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latência da API sob carga mista.
+
+Requisições pesadas (upload-preview de XMLs grandes: parsing + cópia do
+arquivo) rodam ao mesmo tempo que requisições leves (GET /profile). Mede a
+latência das leves (p50/p99/máximo) e o atraso do event loop amostrado a
+cada 10 ms. Com rotas bloqueando o loop, as leves esperam o parsing das
+pesadas; com as rotas no threadpool, só disputam CPU.
+
+Roda a app em processo (httpx.ASGITransport), com SQLite temporário, sem
+rate limit e sem cache de parsing. Independe do código medido: serve para
+comparar duas versões (git checkout + mesma linha de comando).
+
+Usage:
+    python benchmarks/bench_event_loop.py
+    python benchmarks/bench_event_loop.py --heavy 4 --light 8 --duration 10 --items 990
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_WORK_DIR = tempfile.mkdtemp(prefix="bench_event_loop_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_WORK_DIR}/bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_WORK_DIR, "uploads"))
+os.environ.setdefault("PARSE_CACHE_ENABLED", "false")
+
+import httpx
+
+from nfe_corpus import generate_nfe
+
+# Intervalo de amostragem do atraso do event loop
+_LAG_INTERVAL = 0.01
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def setup_app():
+    """Tabelas, usuário e token (sem passar pelo bcrypt do login)."""
+    import logging
+
+    from app import auth, models
+    from app.database import SessionLocal, init_db
+    from app.main import app, limiter as app_limiter
+    from app.routers import admin, user
+
+    logging.disable(logging.WARNING)
+    for limiter in (app_limiter, admin.limiter, user.limiter):
+        limiter.enabled = False
+
+    init_db()
+    db = SessionLocal()
+    user_row = models.User(
+        email="bench@example.com",
+        hashed_password="x",
+        full_name="Benchmark",
+        company_name="Benchmark",
+        is_active=True,
+    )
+    db.add(user_row)
+    db.commit()
+    db.close()
+
+    return app, auth.create_access_token({"sub": "bench@example.com"})
+
+
+async def sample_lag(stop: asyncio.Event, lags: list):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(_LAG_INTERVAL)
+        lags.append(max((loop.time() - start - _LAG_INTERVAL) * 1000, 0.0))
+
+
+async def heavy_worker(client, headers, xml: bytes, stop: asyncio.Event, durations: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.post(
+            "/api/user/upload-preview",
+            files={"file": ("nota.xml", xml, "text/xml")},
+            headers=headers,
+        )
+        response.raise_for_status()
+        durations.append((time.perf_counter() - start) * 1000)
+
+
+async def light_worker(client, headers, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/api/user/profile", headers=headers)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.005)
+
+
+async def run(args):
+    app, token = setup_app()
+    headers = {"Authorization": f"Bearer {token}"}
+    xml = generate_nfe(random.Random(42), numero=1, items=args.items, info_size=args.info_size).xml
+
+    # Mesma inicialização do startup do app, quando existir nesta versão
+    try:
+        from app.utils.event_loop import configure_threadpool
+        configure_threadpool()
+    except ImportError:
+        pass
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # Aquecimento (imports, conexões, primeiro parsing)
+        await client.get("/api/user/profile", headers=headers)
+        await client.post("/api/user/upload-preview", files={"file": ("nota.xml", xml, "text/xml")}, headers=headers)
+
+        results = {}
+        for label, heavy in (("sem carga", 0), ("carga mista", args.heavy)):
+            stop = asyncio.Event()
+            lags, heavy_ms, light_ms = [], [], []
+            tasks = [asyncio.create_task(sample_lag(stop, lags))]
+            tasks += [asyncio.create_task(heavy_worker(client, headers, xml, stop, heavy_ms)) for _ in range(heavy)]
+            tasks += [asyncio.create_task(light_worker(client, headers, stop, light_ms)) for _ in range(args.light)]
+            await asyncio.sleep(args.duration)
+            stop.set()
+            await asyncio.gather(*tasks)
+            results[label] = (lags, heavy_ms, light_ms)
+
+    print("=" * 72)
+    print(f"  XML de {len(xml) / 1024:.0f} KB ({args.items} itens), {args.heavy} pesadas x {args.light} leves, "
+          f"{args.duration:.0f}s por cenário")
+    print("=" * 72)
+    for label, (lags, heavy_ms, light_ms) in results.items():
+        print(f"  [{label}]")
+        print(f"    GET /profile:      {len(light_ms):6d} req   p50 {percentile(light_ms, 0.5):8.1f} ms"
+              f"   p99 {percentile(light_ms, 0.99):8.1f} ms   máx {max(light_ms):8.1f} ms")
+        if heavy_ms:
+            print(f"    upload-preview:    {len(heavy_ms):6d} req   média {statistics.mean(heavy_ms):8.1f} ms")
+        print(f"    atraso do loop:    p50 {percentile(lags, 0.5):8.1f} ms   p99 {percentile(lags, 0.99):8.1f} ms"
+              f"   máx {max(lags):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência da API sob carga mista")
+    parser.add_argument("--heavy", type=int, default=2, help="Clientes enviando upload-preview")
+    parser.add_argument("--light", type=int, default=4, help="Clientes em GET /profile")
+    parser.add_argument("--duration", type=float, default=5.0, help="Segundos por cenário")
+    parser.add_argument("--items", type=int, default=990, help="Itens do XML pesado")
+    parser.add_argument("--info-size", type=int, default=600, help="Tamanho do infAdProd")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark de um pico de logins (bcrypt) sobre o resto da API.
+
+Clientes fazendo login sem parar (POST /auth/login: bcrypt a cada
+requisição) rodam ao mesmo tempo que requisições leves (GET /profile).
+Mede a latência das leves (p50/p99/máximo), a vazão e a latência dos logins
+(e quantos receberam 503 por fila cheia) e, quando a versão tiver
+refresh tokens, a latência de POST /auth/refresh (renovação sem bcrypt).
+
+Roda a app em processo (httpx.ASGITransport), com SQLite temporário e sem
+rate limit. Independe do código medido: serve para comparar duas versões
+(git checkout + mesma linha de comando).
+
+Usage:
+    python benchmarks/bench_login_burst.py
+    python benchmarks/bench_login_burst.py --logins 32 --light 8 --duration 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, ROOT_DIR)
+
+_WORK_DIR = tempfile.mkdtemp(prefix="bench_login_burst_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_WORK_DIR}/bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_WORK_DIR, "uploads"))
+
+import httpx
+
+_EMAIL = "bench@example.com"
+_PASSWORD = "Benchmark@12345"
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def setup_app():
+    """Tabelas e usuário com senha real (bcrypt no login)."""
+    import logging
+
+    from passlib.context import CryptContext
+
+    from app import auth, models
+    from app.database import SessionLocal, init_db
+    from app.main import app, limiter as app_limiter
+    from app.routers import admin, user
+
+    logging.disable(logging.WARNING)
+    for limiter in (app_limiter, admin.limiter, user.limiter):
+        limiter.enabled = False
+
+    init_db()
+    db = SessionLocal()
+    db.add(models.User(
+        email=_EMAIL,
+        hashed_password=CryptContext(schemes=["bcrypt"]).hash(_PASSWORD),
+        full_name="Benchmark",
+        company_name="Benchmark",
+        is_active=True,
+    ))
+    db.commit()
+    db.close()
+
+    return app, auth.create_access_token({"sub": _EMAIL})
+
+
+async def login_worker(client, stop: asyncio.Event, durations: list, statuses: dict):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.post("/api/admin/auth/login", data={"username": _EMAIL, "password": _PASSWORD})
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 200:
+            durations.append((time.perf_counter() - start) * 1000)
+        elif response.status_code == 503:
+            # Fila cheia: espera o Retry-After como um cliente faria
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+        else:
+            response.raise_for_status()
+
+
+async def light_worker(client, headers, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/api/user/profile", headers=headers)
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.005)
+
+
+async def measure_refresh(client, rounds: int) -> list:
+    """Latência de POST /auth/refresh em série (vazio se a versão não tiver)."""
+    response = await client.post("/api/admin/auth/login", data={"username": _EMAIL, "password": _PASSWORD})
+    refresh_token = response.json().get("refresh_token")
+    if not refresh_token:
+        return []
+
+    durations = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = await client.post("/api/admin/auth/refresh", json={"refresh_token": refresh_token})
+        response.raise_for_status()
+        durations.append((time.perf_counter() - start) * 1000)
+        refresh_token = response.json()["refresh_token"]
+    return durations
+
+
+async def run(args):
+    app, token = setup_app()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # Mesma inicialização do startup do app, quando existir nesta versão
+    try:
+        from app.utils.event_loop import configure_threadpool
+        configure_threadpool()
+    except ImportError:
+        pass
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # Aquecimento (imports, conexões, primeiro bcrypt)
+        await client.get("/api/user/profile", headers=headers)
+        await client.post("/api/admin/auth/login", data={"username": _EMAIL, "password": _PASSWORD})
+
+        results = {}
+        for label, logins in (("sem carga", 0), ("pico de logins", args.logins)):
+            stop = asyncio.Event()
+            login_ms, light_ms, statuses = [], [], {}
+            tasks = [asyncio.create_task(login_worker(client, stop, login_ms, statuses)) for _ in range(logins)]
+            tasks += [asyncio.create_task(light_worker(client, headers, stop, light_ms)) for _ in range(args.light)]
+            await asyncio.sleep(args.duration)
+            stop.set()
+            await asyncio.gather(*tasks)
+            results[label] = (login_ms, light_ms, statuses)
+
+        refresh_ms = await measure_refresh(client, args.refresh_rounds)
+
+    print("=" * 78)
+    print(f"  {args.logins} clientes em login x {args.light} leves, {args.duration:.0f}s por cenário")
+    print("=" * 78)
+    for label, (login_ms, light_ms, statuses) in results.items():
+        print(f"  [{label}]")
+        print(f"    GET /profile:      {len(light_ms):6d} req   p50 {percentile(light_ms, 0.5):8.1f} ms"
+              f"   p99 {percentile(light_ms, 0.99):8.1f} ms   máx {max(light_ms):8.1f} ms")
+        if statuses:
+            rejected = statuses.get(503, 0)
+            print(f"    POST /auth/login:  {len(login_ms):6d} ok    {len(login_ms) / args.duration:6.1f}/s"
+                  f"   média {statistics.mean(login_ms) if login_ms else 0.0:8.1f} ms   503: {rejected}")
+    if refresh_ms:
+        print(f"  POST /auth/refresh (série): {len(refresh_ms)} req   p50 {percentile(refresh_ms, 0.5):6.1f} ms"
+              f"   p99 {percentile(refresh_ms, 0.99):6.1f} ms")
+    else:
+        print("  POST /auth/refresh: não disponível nesta versão")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pico de logins (bcrypt) vs. latência do resto da API")
+    parser.add_argument("--logins", type=int, default=16, help="Clientes fazendo login sem parar")
+    parser.add_argument("--light", type=int, default=4, help="Clientes em GET /profile")
+    parser.add_argument("--duration", type=float, default=5.0, help="Segundos por cenário")
+    parser.add_argument("--refresh-rounds", type=int, default=50, help="Renovações medidas em série")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
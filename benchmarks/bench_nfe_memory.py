@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memória da representação de NF-e (bytes por item).
+
+Compara a representação anterior (um dict de 12 chaves por item, strings
+não internadas) com NFeProduct (dataclass congelada com __slots__ e
+unidade/NCM/CFOP internados), medindo com tracemalloc a memória retida
+pelos itens parseados de uma nota sintética (benchmarks/nfe_corpus.py).
+
+Usage:
+    python benchmarks/bench_nfe_memory.py
+    python benchmarks/bench_nfe_memory.py --items 990 --notes 20
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from lxml import etree
+
+from app.utils.nfe_processor import NFeProcessor
+from app.utils.nutrient_extractor import nutrient_extractor
+from nfe_corpus import generate_nfe
+
+
+def legacy_products(processor: NFeProcessor, root) -> list:
+    """Itens no formato anterior: um dict por det."""
+    ns = processor.NAMESPACES
+    produtos = []
+    for det in root.findall('.//nfe:det', ns):
+        prod = det.find('nfe:prod', ns)
+        info = processor._get_text(det, 'nfe:infAdProd', ns) or ""
+        nutrientes, registro = nutrient_extractor.extract(info)
+        produtos.append({
+            "numero_item": det.get('nItem'),
+            "codigo": processor._get_text(prod, 'nfe:cProd', ns),
+            "descricao": processor._get_text(prod, 'nfe:xProd', ns),
+            "ncm": processor._get_text(prod, 'nfe:NCM', ns),
+            "cfop": processor._get_text(prod, 'nfe:CFOP', ns),
+            "unidade": processor._get_text(prod, 'nfe:uCom', ns),
+            "quantidade": processor._get_decimal(prod, 'nfe:qCom', ns),
+            "valor_unitario": processor._get_decimal(prod, 'nfe:vUnCom', ns),
+            "valor_total": processor._get_decimal(prod, 'nfe:vProd', ns),
+            "info_adicional": info,
+            "nutrientes": nutrientes,
+            "registro_mapa": registro,
+        })
+    return produtos
+
+
+def slotted_products(processor: NFeProcessor, root) -> list:
+    """Itens como NFeProduct (mesmo extrator usado em produção)."""
+    return processor._extract_from_tree(root).produtos
+
+
+def retained_bytes(build, roots) -> int:
+    """Memória Python retida pelos itens construídos a partir das árvores."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(root) for root in roots]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert kept
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de memória por item de NF-e")
+    parser.add_argument("--items", type=int, default=500, help="Itens por nota (até 990)")
+    parser.add_argument("--notes", type=int, default=10, help="Notas mantidas em memória")
+    parser.add_argument("--info-size", type=int, default=120, help="Tamanho aproximado do infAdProd")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    processor = NFeProcessor()
+    roots = [
+        etree.fromstring(generate_nfe(rng, numero=n, items=args.items, info_size=args.info_size).xml)
+        for n in range(1, args.notes + 1)
+    ]
+    total_items = args.items * args.notes
+
+    legacy = retained_bytes(lambda root: legacy_products(processor, root), roots)
+    slotted = retained_bytes(lambda root: slotted_products(processor, root), roots)
+
+    print("=" * 60)
+    print(f"  Memória por item - {args.notes} notas x {args.items} itens")
+    print("=" * 60)
+    print(f"  Antes (dict por item):      {legacy / total_items:10,.0f} bytes/item")
+    print(f"  Depois (NFeProduct):        {slotted / total_items:10,.0f} bytes/item")
+    print(f"  Redução:                    {1 - slotted / legacy:10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark da extração de nutrientes/registro MAPA (infAdProd).
+
+Compara a implementação anterior (re.search sem compilar, texto convertido
+para maiúsculas duas vezes por item) com o NutrientExtractor, em um corpus
+determinístico de textos no formato enviado pelas distribuidoras.
+Também confere que os resultados são idênticos (sem a fórmula NPK, que a
+implementação anterior não reconhecia).
+
+Usage:
+    python benchmarks/bench_nutrient_extraction.py
+    python benchmarks/bench_nutrient_extraction.py --items 50000 --repeat 5
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from decimal import Decimal
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.nutrient_extractor import MAPA_PATTERNS, NUTRIENT_PATTERNS, NutrientExtractor
+
+
+# ─── implementação anterior (referência) ──────────────────────────────────────
+
+def legacy_extract_nutrients(text: str) -> dict:
+    nutrients = {}
+    text_upper = text.upper()
+
+    for nutrient, patterns in NUTRIENT_PATTERNS.items():
+        for pattern in patterns:
+            match = re.search(pattern, text_upper)
+            if match:
+                try:
+                    value = match.group(1).replace(',', '.')
+                    nutrients[nutrient] = Decimal(value)
+                    break
+                except Exception:
+                    continue
+
+    return nutrients
+
+
+def legacy_extract_mapa_registration(text: str):
+    text_upper = text.upper()
+
+    for pattern in MAPA_PATTERNS:
+        match = re.search(pattern, text_upper)
+        if match:
+            registro = match.group(1).strip()
+            registro = re.sub(r'\s+', '-', registro)
+            return registro
+
+    return None
+
+
+def legacy_extract(text: str):
+    return legacy_extract_nutrients(text), legacy_extract_mapa_registration(text)
+
+
+# ─── corpus ───────────────────────────────────────────────────────────────────
+
+UFS = ["PR", "SP", "MG", "GO", "MT", "RS", "SC", "BA", "MS", "EX"]
+
+FILLERS = [
+    "ORIGEM: NACIONAL",
+    "ORIGEM: IMPORTADO",
+    "NATUREZA FISICA: SOLIDO",
+    "NATUREZA FISICA: FLUIDO",
+    "APLICACAO: VIA SOLO",
+    "APLICACAO: FOLIAR",
+    "LOTE: EL19060",
+    "FABRICACAO 01/2025 VALIDADE 27/09/2028",
+    "PRODUTO IMPORTADO, CONSERVAR EM LOCAL SECO E AREJADO",
+    "EMBALAGEM BIG BAG 1000 KG",
+    "GRANEL",
+]
+
+
+def build_corpus(size: int, seed: int = 42) -> list:
+    """Gera textos de infAdProd determinísticos."""
+    rng = random.Random(seed)
+    corpus = []
+
+    for _ in range(size):
+        parts = rng.sample(FILLERS, rng.randint(1, 4))
+        kind = rng.random()
+
+        if kind < 0.35:
+            parts.append(f"GARANTIAS: NTOTAL {rng.randint(5, 46)}%")
+        elif kind < 0.55:
+            parts.append(
+                f"N TOTAL: {rng.randint(1, 20)}% P2O5 TOTAL {rng.randint(1, 30)},{rng.randint(0, 9)}% "
+                f"K2O {rng.randint(1, 30)}% S {rng.randint(1, 12)}%"
+            )
+        elif kind < 0.70:
+            parts.append(f"FORMULA {rng.randint(1, 20):02d}-{rng.randint(1, 30):02d}-{rng.randint(1, 30):02d}")
+        elif kind < 0.80:
+            parts.append(f"CALCIO {rng.randint(1, 30)}% MAGNESIO {rng.randint(1, 15)}% ENXOFRE {rng.randint(1, 15)}%")
+        # restante: sem garantias
+
+        uf = rng.choice(UFS)
+        reg = rng.random()
+        if reg < 0.4:
+            parts.append(f"REGISTRO MAPA: {uf}-{rng.randint(10000, 999999)}-{rng.randint(1, 9)}.{rng.randint(1, 999999):06d}")
+        elif reg < 0.7:
+            parts.append(f"{uf} {rng.randint(100000, 999999)}-{rng.randint(0, 9)}.{rng.randint(1, 999999):06d}")
+
+        rng.shuffle(parts)
+        corpus.append(" | ".join(parts))
+
+    return corpus
+
+
+# ─── benchmark ────────────────────────────────────────────────────────────────
+
+def measure(func, corpus, repeat: int) -> float:
+    """Retorna o melhor items/sec entre as repetições."""
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            func(text)
+        elapsed = time.perf_counter() - start
+        best = max(best, len(corpus) / elapsed)
+    return best
+
+
+def check_equivalence(corpus) -> int:
+    """Confere resultados da implementação anterior x nova (sem NPK)."""
+    extractor = NutrientExtractor(npk_formula=False)
+    mismatches = 0
+    for text in corpus:
+        if legacy_extract(text) != extractor.extract(text):
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de extração de nutrientes")
+    parser.add_argument("--items", type=int, default=20000, help="Tamanho do corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições (usa a melhor)")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.items)
+    extractor = NutrientExtractor()
+
+    mismatches = check_equivalence(corpus)
+    before = measure(legacy_extract, corpus, args.repeat)
+    after = measure(extractor.extract, corpus, args.repeat)
+    npk_hits = sum(1 for text in corpus if "K2O" in extractor.extract(text)[0])
+
+    print("=" * 60)
+    print(f"  Extração de nutrientes - {len(corpus)} itens")
+    print("=" * 60)
+    print(f"  Antes (re.search sem compilar): {before:12,.0f} itens/s")
+    print(f"  Depois (NutrientExtractor):     {after:12,.0f} itens/s")
+    print(f"  Ganho:                          {after / before:12.2f}x")
+    print(f"  Divergências (sem NPK):         {mismatches:12d}")
+    print(f"  Itens com K2O (incl. NPK):      {npk_hits:12d}")
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
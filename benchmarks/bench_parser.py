@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Benchmark do NFeProcessor e do MAPAProcessor sobre um corpus sintético
+(benchmarks/nfe_corpus.py).
+
+Mede arquivos/s, itens/s e pico de RSS de:
+- process_xml: parsing dos XMLs (sem cache de parsing);
+- process_pdf: extração dos DANFEs em PDF;
+- process_uploads (extração): MAPAProcessor com nfe_documents vazio (parse + persistência);
+- process_uploads (persistido): MAPAProcessor lendo os dados já gravados.
+
+Cada benchmark roda em um processo separado (spawn), para que o pico de RSS
+seja dele. O parsing em lote usa 1 worker (PARSE_POOL_WORKERS=1) e o banco é
+um SQLite temporário. Os resultados podem ser gravados em JSON e comparados
+com uma execução anterior.
+
+Usage:
+    python benchmarks/bench_parser.py
+    python benchmarks/bench_parser.py --files 200 --max-items 990 --output results.json
+    python benchmarks/bench_parser.py --compare baseline.json --fail-threshold 0.10
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from nfe_corpus import EMITENTES, PRODUTOS, generate_corpus
+
+BENCHMARKS = ("process_xml", "process_pdf", "process_uploads_extract", "process_uploads_stored")
+
+
+# ─── execução (processo filho) ────────────────────────────────────────────────
+
+def _peak_rss_mb() -> float:
+    """Pico de RSS do processo atual (ru_maxrss: KB no Linux, bytes no macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return peak / divisor
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Descarta os prints de debug dos processadores durante a medição."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _best_of(func, repeat: int, setup=None) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        with _quiet():
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _bench_process_xml(corpus: dict, repeat: int) -> dict:
+    from app.utils.nfe_processor import NFeProcessor
+
+    processor = NFeProcessor()
+    paths = corpus["xml_paths"]
+    seconds = _best_of(lambda: [processor.process_xml(path) for path in paths], repeat)
+    return {"files": len(paths), "items": corpus["items"], "seconds": seconds}
+
+
+def _bench_process_pdf(corpus: dict, repeat: int) -> dict:
+    from app.utils.nfe_processor import NFeProcessor
+
+    processor = NFeProcessor()
+    paths = corpus["pdf_paths"]
+    seconds = _best_of(lambda: [processor.process_pdf(path) for path in paths], repeat)
+    return {"files": len(paths), "items": corpus["items"], "seconds": seconds}
+
+
+def _setup_catalog(db, xml_paths):
+    """Usuário com todas as empresas/produtos do gerador cadastrados e os uploads do corpus."""
+    from app import models
+
+    user = models.User(
+        email="bench@example.com",
+        hashed_password="x",
+        full_name="Benchmark",
+        company_name="Benchmark",
+        is_active=True,
+    )
+    db.add(user)
+    db.flush()
+
+    for index, (_, razao_social, _) in enumerate(EMITENTES, start=1):
+        company = models.Company(
+            user_id=user.id,
+            company_name=razao_social,
+            mapa_registration=f"PR-{index:05d}",
+        )
+        db.add(company)
+        db.flush()
+        for product_index, (descricao, _, _) in enumerate(PRODUTOS, start=1):
+            db.add(models.Product(
+                company_id=company.id,
+                product_name=descricao,
+                mapa_registration=f"{product_index:06d}",
+                product_reference=f"REF-{product_index}",
+            ))
+
+    for path in xml_paths:
+        db.add(models.XMLUpload(
+            user_id=user.id,
+            filename=os.path.basename(path),
+            file_path=path,
+            status="processed",
+        ))
+
+    db.commit()
+    return user
+
+
+def _bench_process_uploads(corpus: dict, repeat: int, stored: bool) -> dict:
+    from app import models
+    from app.database import SessionLocal, init_db
+    from app.utils.mapa_processor import MAPAProcessor
+
+    init_db()
+    db = SessionLocal()
+    try:
+        user = _setup_catalog(db, corpus["xml_paths"])
+        uploads = db.query(models.XMLUpload).filter(models.XMLUpload.user_id == user.id).all()
+
+        def reset_documents():
+            db.query(models.NFeItem).delete()
+            db.query(models.NFeDocument).delete()
+            db.commit()
+            db.expire_all()
+
+        def run():
+            result = MAPAProcessor(db, user.id).process_uploads(uploads)
+            if not result["success"]:
+                raise RuntimeError(result.get("error"))
+
+        if stored:
+            with _quiet():
+                run()  # Aquecimento: grava nfe_documents
+            seconds = _best_of(run, repeat, setup=db.expire_all)
+        else:
+            seconds = _best_of(run, repeat, setup=reset_documents)
+    finally:
+        db.close()
+
+    return {"files": len(corpus["xml_paths"]), "items": corpus["items"], "seconds": seconds}
+
+
+def run_benchmark(name: str, corpus: dict, repeat: int) -> dict:
+    """Executado no processo filho: roda um benchmark e mede o pico de RSS."""
+    if name == "process_xml":
+        result = _bench_process_xml(corpus, repeat)
+    elif name == "process_pdf":
+        result = _bench_process_pdf(corpus, repeat)
+    elif name == "process_uploads_extract":
+        result = _bench_process_uploads(corpus, repeat, stored=False)
+    elif name == "process_uploads_stored":
+        result = _bench_process_uploads(corpus, repeat, stored=True)
+    else:
+        raise ValueError(f"Benchmark desconhecido: {name}")
+
+    result["files_per_sec"] = result["files"] / result["seconds"]
+    result["items_per_sec"] = result["items"] / result["seconds"]
+    result["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    return result
+
+
+# ─── orquestração ─────────────────────────────────────────────────────────────
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Lista de regressões (queda de itens/s acima de threshold)."""
+    regressions = []
+    print()
+    print(f"  {'Comparação':<26}{'antes':>12}{'depois':>12}{'variação':>10}")
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        delta = result["items_per_sec"] / previous["items_per_sec"] - 1
+        print(f"  {name:<26}{previous['items_per_sec']:>12,.0f}{result['items_per_sec']:>12,.0f}{delta:>+10.1%}")
+        if delta < -threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de parsing de NF-e")
+    parser.add_argument("--files", type=int, default=100, help="Notas no corpus")
+    parser.add_argument("--min-items", type=int, default=1)
+    parser.add_argument("--max-items", type=int, default=30)
+    parser.add_argument("--info-size", type=int, default=120, help="Tamanho aproximado do infAdProd")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetições (usa a melhor)")
+    parser.add_argument("--only", choices=BENCHMARKS, action="append", help="Executa apenas estes benchmarks")
+    parser.add_argument("--output", help="Grava os resultados em JSON")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparação")
+    parser.add_argument("--fail-threshold", type=float, default=0.10,
+                        help="Queda de itens/s considerada regressão (com --compare)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="nfe_bench_")
+    corpus_dir = os.path.join(work_dir, "corpus")
+    selected = args.only or list(BENCHMARKS)
+
+    notes = generate_corpus(
+        corpus_dir,
+        files=args.files,
+        min_items=args.min_items,
+        max_items=args.max_items,
+        info_size=args.info_size,
+        pdf="process_pdf" in selected,
+    )
+    corpus = {
+        "xml_paths": [os.path.join(corpus_dir, f"nfe_{i:05d}.xml") for i in range(1, len(notes) + 1)],
+        "pdf_paths": [os.path.join(corpus_dir, f"nfe_{i:05d}.pdf") for i in range(1, len(notes) + 1)],
+        "items": sum(nfe.items for nfe in notes),
+    }
+
+    # Ambiente dos processos filhos: SQLite temporário, sem cache, parsing serial
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ["UPLOAD_DIR"] = os.path.join(work_dir, "uploads")
+    os.environ["PARSE_CACHE_ENABLED"] = "false"
+    os.environ["PARSE_POOL_WORKERS"] = "1"
+
+    print("=" * 70)
+    print(f"  Benchmark NF-e - {len(notes)} notas, {corpus['items']} itens")
+    print("=" * 70)
+
+    results = {}
+    for name in selected:
+        if name.startswith("process_uploads") and os.path.exists(os.path.join(work_dir, "bench.db")):
+            os.remove(os.path.join(work_dir, "bench.db"))
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            result = executor.submit(run_benchmark, name, corpus, args.repeat).result()
+        results[name] = result
+        print(
+            f"  {name:<26}{result['files_per_sec']:>10,.1f} arq/s"
+            f"{result['items_per_sec']:>12,.0f} itens/s{result['peak_rss_mb']:>9,.1f} MB"
+        )
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpus": {
+                "files": len(notes),
+                "items": corpus["items"],
+                "min_items": args.min_items,
+                "max_items": args.max_items,
+                "info_size": args.info_size,
+            },
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Resultados gravados em {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.fail_threshold)
+        if regressions:
+            print(f"\n❌ Regressão acima de {args.fail_threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Gerador determinístico de NF-e 4.00 sintéticas para benchmarks.
+
+Gera XMLs válidos (leiaute 4.00, chave de acesso com DV módulo 11) com
+quantidade de itens configurável (1 a 990 det), tamanho do infAdProd,
+UFs do emitente (incluindo EX = importação) e grafias de unidade.
+Também gera um DANFE simplificado em PDF para cada nota (reportlab).
+
+Os emitentes e produtos vêm de listas fixas (EMITENTES/PRODUTOS), para que
+o benchmark de MAPAProcessor possa cadastrá-los no catálogo.
+
+Usage:
+    python benchmarks/nfe_corpus.py --out /tmp/corpus --files 50
+    python benchmarks/nfe_corpus.py --out /tmp/corpus --files 10 --min-items 990 --max-items 990 --pdf
+"""
+import argparse
+import os
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+NFE_NAMESPACE = "http://www.portalfiscal.inf.br/nfe"
+
+# Limite do leiaute 4.00 para a quantidade de det por nota
+MAX_ITEMS = 990
+
+# Código IBGE das UFs (cUF) usadas pelos emitentes; EX = exterior (importação)
+UF_CODES = {
+    "PR": "41", "SP": "35", "MG": "31", "GO": "52", "MT": "51",
+    "RS": "43", "SC": "42", "BA": "29", "MS": "50", "EX": "99",
+}
+
+DEFAULT_UFS = ("PR", "SP", "MG", "GO", "MT", "RS", "EX")
+
+# Grafias de unidade reconhecidas por MAPAProcessor._convert_to_tonnes
+DEFAULT_UNITS = ("TON", "T", "TN", "TONELADA", "TONS", "MT", "KG", "KGS", "QUILOGRAMA", "KILO")
+
+EMITENTES = [
+    ("10615891000659", "FERTIFER IMPORTADORA E EXPORTADORA DE PRODUTOS GERAIS LTDA", "FERTIFER"),
+    ("82601345000165", "SOLO VIVO INDUSTRIA E COMERCIO DE FERTILIZANTES LTDA", "SOLO VIVO"),
+    ("33931486000130", "AGRO NUTRI FERTILIZANTES S.A.", "AGRO NUTRI"),
+    ("04215677000112", "MINERACAO CAMPO VERDE LTDA", "CAMPO VERDE"),
+    ("59104273000129", "YARA BRASIL FERTILIZANTES S/A", "YARA"),
+]
+
+DESTINATARIO = ("07569161001111", "COOPERATIVA AGROINDUSTRIAL DO VALE")
+
+# (descrição, NCM, texto de garantias)
+PRODUTOS = [
+    ("UREIA GRANULADA GRANEL", "31021010", "GARANTIAS: NTOTAL 46%"),
+    ("CLORETO DE POTASSIO GRANULADO", "31042010", "GARANTIAS: K2O 60%"),
+    ("SUPERFOSFATO SIMPLES FARELADO", "31031030", "P2O5 SOLUVEL 18% CALCIO 16% ENXOFRE 10%"),
+    ("MAP PURIFICADO 11-52-00", "31054000", "FORMULA 11-52-00"),
+    ("FERTILIZANTE MINERAL MISTO 04-14-08", "31052000", "N TOTAL: 4% P2O5 TOTAL 14% K2O 8%"),
+    ("SULFATO DE AMONIO CRISTAL", "31022100", "N TOTAL 20% S 22%"),
+    ("NITRATO DE AMONIO", "31023000", "NITROGENIO 33%"),
+    ("FOSFATO NATURAL REATIVO", "25101010", "P2O5 TOTAL 29% CALCIO 30%"),
+    ("CALCARIO DOLOMITICO", "25210000", "CALCIO 30% MAGNESIO 18%"),
+    ("SULFATO DE MAGNESIO", "28332100", "MAGNESIO 9% ENXOFRE 12%"),
+]
+
+_FILLER = (
+    "ORIGEM: NACIONAL NATUREZA FISICA: SOLIDO APLICACAO: VIA SOLO "
+    "PRODUTO IMPORTADO, CONSERVAR EM LOCAL SECO E AREJADO LOTE: EL19060 "
+)
+
+
+@dataclass
+class GeneratedNFe:
+    """Nota gerada (metadados usados pelos benchmarks)."""
+    chave_acesso: str
+    numero_nota: str
+    emitente_razao_social: str
+    emitente_uf: str
+    data_emissao: str
+    items: int
+    xml: bytes
+    product_names: List[str] = field(default_factory=list)
+
+
+def access_key_check_digit(key43: str) -> str:
+    """Dígito verificador da chave de acesso (módulo 11, pesos 2..9)."""
+    total = 0
+    weight = 2
+    for digit in reversed(key43):
+        total += int(digit) * weight
+        weight = 2 if weight == 9 else weight + 1
+    remainder = total % 11
+    return "0" if remainder < 2 else str(11 - remainder)
+
+
+def build_access_key(uf: str, emission: datetime, cnpj: str, serie: int, numero: int, codigo: int) -> str:
+    """Monta a chave de acesso de 44 dígitos."""
+    key43 = (
+        f"{UF_CODES[uf]}{emission:%y%m}{cnpj}55{serie:03d}{numero:09d}1{codigo:08d}"
+    )
+    return key43 + access_key_check_digit(key43)
+
+
+def build_info_adicional(rng: random.Random, garantias: str, size: int, uf: str) -> str:
+    """Texto do infAdProd com garantias + registro MAPA, completado até ~size caracteres."""
+    registro = f"{'PR' if uf == 'EX' else uf} {rng.randint(100000, 999999)}-{rng.randint(0, 9)}.{rng.randint(1, 999999):06d}"
+    text = f"{garantias} | REGISTRO MAPA: {registro}"
+    if size > len(text):
+        filler = (_FILLER * (size // len(_FILLER) + 1))[: size - len(text) - 3]
+        text = f"{filler} | {text}"
+    return text
+
+
+def generate_nfe(
+    rng: random.Random,
+    numero: int,
+    items: int,
+    info_size: int = 120,
+    ufs: Sequence[str] = DEFAULT_UFS,
+    units: Sequence[str] = DEFAULT_UNITS,
+    base_date: Optional[datetime] = None,
+) -> GeneratedNFe:
+    """Gera uma NF-e 4.00 com `items` itens (1 a 990)."""
+    if not 1 <= items <= MAX_ITEMS:
+        raise ValueError(f"items deve estar entre 1 e {MAX_ITEMS}")
+
+    uf = rng.choice(list(ufs))
+    cnpj, razao_social, fantasia = rng.choice(EMITENTES)
+    base_date = base_date or datetime(2025, 7, 1)
+    emission = base_date + timedelta(days=rng.randint(0, 89), seconds=rng.randint(0, 86399))
+    serie = rng.randint(1, 99)
+    codigo = rng.randint(10000000, 99999999)
+    chave = build_access_key(uf, emission, cnpj, serie, numero, codigo)
+
+    if uf == "EX":
+        ender = (
+            "<enderEmit><xLgr>EXTERIOR</xLgr><nro>0</nro><xBairro>EXTERIOR</xBairro>"
+            "<cMun>9999999</cMun><xMun>EXTERIOR</xMun><UF>EX</UF><cPais>2496</cPais>"
+            "<xPais>ESTADOS UNIDOS</xPais></enderEmit>"
+        )
+    else:
+        ender = (
+            f"<enderEmit><xLgr>RUA RODRIGUES ALVES</xLgr><nro>800</nro><xBairro>CENTRO</xBairro>"
+            f"<cMun>{UF_CODES[uf]}18204</cMun><xMun>CIDADE</xMun><UF>{uf}</UF><CEP>83203170</CEP>"
+            f"<cPais>1058</cPais><xPais>Brasil</xPais></enderEmit>"
+        )
+
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        f'<nfeProc xmlns="{NFE_NAMESPACE}" versao="4.00"><NFe xmlns="{NFE_NAMESPACE}">',
+        f'<infNFe Id="NFe{chave}" versao="4.00">',
+        f"<ide><cUF>{UF_CODES[uf]}</cUF><cNF>{codigo:08d}</cNF><natOp>VENDA DE MERCADORIA</natOp>"
+        f"<mod>55</mod><serie>{serie}</serie><nNF>{numero}</nNF>"
+        f"<dhEmi>{emission:%Y-%m-%dT%H:%M:%S}-03:00</dhEmi><tpNF>1</tpNF><idDest>1</idDest>"
+        f"<cMunFG>4118204</cMunFG><tpImp>2</tpImp><tpEmis>1</tpEmis><cDV>{chave[-1]}</cDV>"
+        f"<tpAmb>1</tpAmb><finNFe>1</finNFe><indFinal>0</indFinal><indPres>0</indPres>"
+        f"<procEmi>0</procEmi><verProc>bench-1.0</verProc></ide>",
+        f"<emit><CNPJ>{cnpj}</CNPJ><xNome>{escape(razao_social)}</xNome><xFant>{escape(fantasia)}</xFant>"
+        f"{ender}<IE>9078212770</IE><CRT>3</CRT></emit>",
+        f"<dest><CNPJ>{DESTINATARIO[0]}</CNPJ><xNome>{escape(DESTINATARIO[1])}</xNome>"
+        f"<enderDest><xLgr>ROD BR 476</xLgr><nro>S/N</nro><xBairro>RURAL</xBairro><cMun>4101804</cMun>"
+        f"<xMun>ARAUCARIA</xMun><UF>PR</UF><cPais>1058</cPais><xPais>Brasil</xPais></enderDest>"
+        f"<indIEDest>1</indIEDest><IE>1070247352</IE></dest>",
+    ]
+
+    total = Decimal("0")
+    product_names = []
+    for n_item in range(1, items + 1):
+        descricao, ncm, garantias = rng.choice(PRODUTOS)
+        unit = rng.choice(list(units))
+        is_kg = unit.startswith("K") or unit.startswith("Q")
+        quantidade = Decimal(rng.randint(1000, 40000) if is_kg else rng.randint(1, 40))
+        valor_unitario = Decimal(rng.randint(100, 400000)) / 100
+        valor_total = (quantidade * valor_unitario).quantize(Decimal("0.01"))
+        total += valor_total
+        product_names.append(descricao)
+        info = build_info_adicional(rng, garantias, info_size, uf)
+
+        parts.append(
+            f'<det nItem="{n_item}"><prod><cProd>{1000 + n_item}</cProd><cEAN>SEM GTIN</cEAN>'
+            f"<xProd>{escape(descricao)}</xProd><NCM>{ncm}</NCM><CFOP>5106</CFOP>"
+            f"<uCom>{unit}</uCom><qCom>{quantidade}</qCom><vUnCom>{valor_unitario}</vUnCom>"
+            f"<vProd>{valor_total}</vProd><cEANTrib>SEM GTIN</cEANTrib><uTrib>{unit}</uTrib>"
+            f"<qTrib>{quantidade}</qTrib><vUnTrib>{valor_unitario}</vUnTrib><indTot>1</indTot></prod>"
+            f"<imposto><ICMS><ICMS51><orig>0</orig><CST>51</CST></ICMS51></ICMS>"
+            f"<PIS><PISNT><CST>06</CST></PISNT></PIS><COFINS><COFINSNT><CST>06</CST></COFINSNT></COFINS>"
+            f"</imposto><infAdProd>{escape(info)}</infAdProd></det>"
+        )
+
+    parts.append(
+        f"<total><ICMSTot><vBC>0.00</vBC><vICMS>0.00</vICMS><vProd>{total}</vProd>"
+        f"<vNF>{total}</vNF></ICMSTot></total>"
+        f"<transp><modFrete>0</modFrete></transp>"
+        f"<pag><detPag><indPag>1</indPag><tPag>01</tPag><vPag>{total}</vPag></detPag></pag>"
+        f"<infAdic><infCpl>NOTA GERADA PARA BENCHMARK</infCpl></infAdic>"
+        f"</infNFe></NFe></nfeProc>"
+    )
+
+    return GeneratedNFe(
+        chave_acesso=chave,
+        numero_nota=str(numero),
+        emitente_razao_social=razao_social,
+        emitente_uf=uf,
+        data_emissao=emission.strftime("%Y-%m-%d"),
+        items=items,
+        xml="".join(parts).encode("utf-8"),
+        product_names=product_names,
+    )
+
+
+def render_danfe_pdf(nfe: GeneratedNFe, path: str):
+    """DANFE simplificado (chave, número, série) no formato lido por process_pdf."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    pdf = canvas.Canvas(path, pagesize=A4)
+    width, height = A4
+    y = height - 50
+    pdf.drawString(40, y, f"DANFE - {nfe.emitente_razao_social}")
+    y -= 20
+    pdf.drawString(40, y, f"Nº {nfe.numero_nota}   SÉRIE: 1   EMISSÃO: {nfe.data_emissao}")
+    y -= 20
+    pdf.drawString(40, y, " ".join(nfe.chave_acesso[i:i + 4] for i in range(0, 44, 4)))
+    y -= 30
+    for n_item, name in enumerate(nfe.product_names, start=1):
+        if y < 50:
+            pdf.showPage()
+            y = height - 50
+        pdf.drawString(40, y, f"{n_item:03d}  {name}")
+        y -= 14
+    pdf.save()
+
+
+def generate_corpus(
+    out_dir: str,
+    files: int,
+    min_items: int = 1,
+    max_items: int = 30,
+    info_size: int = 120,
+    ufs: Sequence[str] = DEFAULT_UFS,
+    units: Sequence[str] = DEFAULT_UNITS,
+    pdf: bool = False,
+    seed: int = 42,
+) -> List[GeneratedNFe]:
+    """Grava `files` notas em out_dir (nfe_00001.xml, ...) e retorna os metadados."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    notes = []
+    for index in range(1, files + 1):
+        nfe = generate_nfe(
+            rng,
+            numero=index,
+            items=rng.randint(min_items, max_items),
+            info_size=info_size,
+            ufs=ufs,
+            units=units,
+        )
+        base = os.path.join(out_dir, f"nfe_{index:05d}")
+        with open(f"{base}.xml", "wb") as f:
+            f.write(nfe.xml)
+        if pdf:
+            render_danfe_pdf(nfe, f"{base}.pdf")
+        notes.append(nfe)
+
+    return notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de NF-e sintéticas")
+    parser.add_argument("--out", required=True, help="Diretório de saída")
+    parser.add_argument("--files", type=int, default=50, help="Quantidade de notas")
+    parser.add_argument("--min-items", type=int, default=1, help="Mínimo de det por nota")
+    parser.add_argument("--max-items", type=int, default=30, help=f"Máximo de det por nota (até {MAX_ITEMS})")
+    parser.add_argument("--info-size", type=int, default=120, help="Tamanho aproximado do infAdProd")
+    parser.add_argument("--ufs", default=",".join(DEFAULT_UFS), help="UFs do emitente (EX = importação)")
+    parser.add_argument("--units", default=",".join(DEFAULT_UNITS), help="Grafias de unidade")
+    parser.add_argument("--pdf", action="store_true", help="Gera também o DANFE em PDF")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    notes = generate_corpus(
+        args.out,
+        files=args.files,
+        min_items=args.min_items,
+        max_items=args.max_items,
+        info_size=args.info_size,
+        ufs=[uf.strip().upper() for uf in args.ufs.split(",") if uf.strip()],
+        units=[unit.strip() for unit in args.units.split(",") if unit.strip()],
+        pdf=args.pdf,
+        seed=args.seed,
+    )
+
+    total_items = sum(nfe.items for nfe in notes)
+    print(f"✓ {len(notes)} NF-e geradas em {args.out} ({total_items} itens)")
+
+
+if __name__ == "__main__":
+    main()
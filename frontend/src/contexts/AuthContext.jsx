@@ -1,5 +1,5 @@
 import React, { createContext, useState, useContext, useEffect } from 'react';
-import { auth as authService } from '../services/api';
+import { auth as authService, saveSession, clearSession } from '../services/api';
 
 const AuthContext = createContext({});
 
@@ -40,9 +40,7 @@ export const AuthProvider = ({ children }) => {
       setError(null);
       setLoading(true);
 
-      const { access_token } = await authService.login(email, password);
-
-      localStorage.setItem('token', access_token);
+      saveSession(await authService.login(email, password));
 
       // Buscar dados do usuário
       const userData = await authService.getMe();
@@ -60,8 +58,9 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
-    localStorage.removeItem('token');
-    localStorage.removeItem('user');
+    // Revoga o refresh token no servidor; a sessão local é encerrada mesmo se falhar
+    authService.logout().catch((err) => console.error('Erro ao encerrar sessão:', err));
+    clearSession();
     setUser(null);
     setError(null);
   };
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useAuth } from '../contexts/AuthContext';
-import api from '../services/api';
+import api, { saveSession } from '../services/api';
 import {
   User,
   Building,
@@ -138,11 +138,14 @@ const Settings = () => {
     }
 
     try {
-      await api.post('/user/change-password', {
+      const response = await api.post('/user/change-password', {
         current_password: passwordData.current_password,
         new_password: passwordData.new_password,
       });
 
+      // A troca revoga os tokens anteriores: usar os da nova sessão
+      saveSession(response.data);
+
       setPasswordSuccess('Senha alterada com sucesso!');
       setPasswordData({
         current_password: '',
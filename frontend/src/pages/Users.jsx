@@ -13,7 +13,7 @@ import {
   Eye,
   EyeOff
 } from 'lucide-react';
-import { users as usersAPI } from '../services/api';
+import { users as usersAPI, saveSession } from '../services/api';
 import { useAuth } from '../contexts/AuthContext';
 import ConfirmDialog from '../components/ConfirmDialog';
 import AlertDialog from '../components/AlertDialog';
@@ -149,7 +149,11 @@ const Users = () => {
       }
 
       if (editingUser) {
-        await usersAPI.update(editingUser.id, userData);
+        const updated = await usersAPI.update(editingUser.id, userData);
+        // Própria senha alterada: os tokens anteriores foram revogados
+        if (updated.access_token) {
+          saveSession(updated);
+        }
       } else {
         await usersAPI.create(userData);
       }
@@ -25,13 +25,63 @@ api.interceptors.request.use(
   }
 );
 
-// Interceptor para tratar erros de autenticação
+// Tokens da sessão: access token (curto) e refresh token (rotacionado a cada uso)
+export const saveSession = ({ access_token, refresh_token }) => {
+  if (access_token) {
+    localStorage.setItem('token', access_token);
+  }
+  if (refresh_token) {
+    localStorage.setItem('refresh_token', refresh_token);
+  }
+};
+
+export const clearSession = () => {
+  localStorage.removeItem('token');
+  localStorage.removeItem('refresh_token');
+  localStorage.removeItem('user');
+};
+
+// Uma renovação por vez: o refresh token só vale uma vez (reuso revoga a sessão)
+let refreshPromise = null;
+
+const refreshSession = () => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem('refresh_token');
+    refreshPromise = (refreshToken
+      ? axios.post(`${API_BASE_URL}/admin/auth/refresh`, { refresh_token: refreshToken })
+      : Promise.reject(new Error('Sem refresh token'))
+    )
+      .then(({ data }) => {
+        saveSession(data);
+        return data.access_token;
+      })
+      .finally(() => {
+        refreshPromise = null;
+      });
+  }
+  return refreshPromise;
+};
+
+// Interceptor para tratar erros de autenticação: renova a sessão e repete a requisição uma vez
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const request = error.config;
+    const isAuthRoute = request?.url?.startsWith('/admin/auth/');
+
+    if (error.response?.status === 401 && request && !request._retried && !isAuthRoute) {
+      request._retried = true;
+      try {
+        const token = await refreshSession();
+        request.headers.Authorization = `Bearer ${token}`;
+        return api(request);
+      } catch (refreshError) {
+        // Sessão expirada ou revogada: segue para o login
+      }
+    }
+
     if (error.response?.status === 401) {
-      localStorage.removeItem('token');
-      localStorage.removeItem('user');
+      clearSession();
       window.location.href = '/login';
     }
     return Promise.reject(error);
@@ -56,6 +106,13 @@ export const auth = {
     return response.data;
   },
 
+  logout: async () => {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+      await api.post('/admin/auth/logout', { refresh_token: refreshToken });
+    }
+  },
+
   getMe: async () => {
     const response = await api.get('/admin/me');
     return response.data;
@@ -0,0 +1,49 @@
+"""
+Migration: Add catalog_version column to users table
+"""
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+def upgrade():
+    """Add catalog_version column to users"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect() as conn:
+        # Check if column already exists
+        result = conn.execute(text("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = 'users'
+            AND column_name = 'catalog_version'
+        """))
+
+        if not result.fetchone():
+            # Add column
+            conn.execute(text("""
+                ALTER TABLE users
+                ADD COLUMN catalog_version INTEGER NOT NULL DEFAULT 0
+            """))
+            conn.commit()
+            print("✅ Column 'catalog_version' added to users table")
+        else:
+            print("ℹ️  Column 'catalog_version' already exists")
+
+def downgrade():
+    """Remove catalog_version column from users"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect() as conn:
+        conn.execute(text("""
+            ALTER TABLE users
+            DROP COLUMN IF EXISTS catalog_version
+        """))
+        conn.commit()
+        print("✅ Column 'catalog_version' removed from users table")
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "downgrade":
+        downgrade()
+    else:
+        upgrade()
@@ -0,0 +1,61 @@
+"""
+Migration: Add compression columns (xml_uploads.compression_ratio,
+stored_blobs.stored_size, stored_blobs.codec)
+
+Arquivos existentes são comprimidos depois, por scripts/compress_uploads.py.
+"""
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+COLUMNS = (
+    ("xml_uploads", "compression_ratio", "FLOAT"),
+    ("stored_blobs", "stored_size", "BIGINT"),
+    ("stored_blobs", "codec", "VARCHAR(10)"),
+)
+
+def upgrade():
+    """Add compression_ratio to xml_uploads and stored_size/codec to stored_blobs"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect() as conn:
+        for table, column, column_type in COLUMNS:
+            # Check if column already exists
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = :table
+                AND column_name = :column
+            """), {"table": table, "column": column})
+
+            if not result.fetchone():
+                # Add column
+                conn.execute(text(f"""
+                    ALTER TABLE {table}
+                    ADD COLUMN {column} {column_type}
+                """))
+                print(f"✅ Column '{column}' added to {table} table")
+            else:
+                print(f"ℹ️  Column '{column}' already exists in {table}")
+
+        conn.commit()
+
+def downgrade():
+    """Remove compression columns"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect() as conn:
+        for table, column, _ in COLUMNS:
+            conn.execute(text(f"""
+                ALTER TABLE {table}
+                DROP COLUMN IF EXISTS {column}
+            """))
+        conn.commit()
+        print("✅ Compression columns removed")
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "downgrade":
+        downgrade()
+    else:
+        upgrade()
@@ -0,0 +1,59 @@
+"""
+Migration: Add facts_version column to nfe_documents table (report_facts em dia)
+"""
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+def upgrade():
+    """Add facts_version column to nfe_documents"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect() as conn:
+        # Check if column already exists
+        result = conn.execute(text("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = 'nfe_documents'
+            AND column_name = 'facts_version'
+        """))
+
+        if not result.fetchone():
+            # Add column
+            conn.execute(text("""
+                ALTER TABLE nfe_documents
+                ADD COLUMN facts_version INTEGER
+            """))
+            # Documentos que já têm fatos estão em dia; os demais são
+            # gerados uma única vez no próximo relatório do período
+            conn.execute(text("""
+                UPDATE nfe_documents
+                SET facts_version = parser_version
+                WHERE EXISTS (
+                    SELECT 1 FROM report_facts
+                    WHERE report_facts.xml_upload_id = nfe_documents.xml_upload_id
+                )
+            """))
+            conn.commit()
+            print("✅ Column 'facts_version' added to nfe_documents table")
+        else:
+            print("ℹ️  Column 'facts_version' already exists")
+
+def downgrade():
+    """Remove facts_version column from nfe_documents"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect() as conn:
+        conn.execute(text("""
+            ALTER TABLE nfe_documents
+            DROP COLUMN IF EXISTS facts_version
+        """))
+        conn.commit()
+        print("✅ Column 'facts_version' removed from nfe_documents table")
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "downgrade":
+        downgrade()
+    else:
+        upgrade()
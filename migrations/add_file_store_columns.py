@@ -0,0 +1,66 @@
+"""
+Migration: Add file store columns (xml_uploads.content_sha256, jobs.artifact_sha256)
+
+A tabela stored_blobs é criada pelo init_db (create_all).
+Uploads antigos continuam lidos de file_path (content_sha256 nulo).
+"""
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+COLUMNS = (
+    ("xml_uploads", "content_sha256"),
+    ("jobs", "artifact_sha256"),
+)
+
+def upgrade():
+    """Add content_sha256 to xml_uploads and artifact_sha256 to jobs"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect() as conn:
+        for table, column in COLUMNS:
+            # Check if column already exists
+            result = conn.execute(text("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = :table
+                AND column_name = :column
+            """), {"table": table, "column": column})
+
+            if not result.fetchone():
+                # Add column
+                conn.execute(text(f"""
+                    ALTER TABLE {table}
+                    ADD COLUMN {column} VARCHAR(64)
+                """))
+                print(f"✅ Column '{column}' added to {table} table")
+            else:
+                print(f"ℹ️  Column '{column}' already exists in {table}")
+
+        conn.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_xml_uploads_content_sha256
+            ON xml_uploads (content_sha256)
+        """))
+        conn.commit()
+        print("✅ Index 'ix_xml_uploads_content_sha256' ready")
+
+def downgrade():
+    """Remove file store columns"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS ix_xml_uploads_content_sha256"))
+        for table, column in COLUMNS:
+            conn.execute(text(f"""
+                ALTER TABLE {table}
+                DROP COLUMN IF EXISTS {column}
+            """))
+        conn.commit()
+        print("✅ File store columns removed")
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "downgrade":
+        downgrade()
+    else:
+        upgrade()
@@ -0,0 +1,110 @@
+"""
+Migration: Add xml_uploads.nfe_key and the composite indexes of the hot queries
+
+- nfe_key: chave de acesso copiada de nfe_documents (backfill em lotes),
+  usada na validação de duplicatas por usuário;
+- índices compostos por usuário: relatório do período (user_id, status,
+  period), listagens por data (user_id, upload_date, id) e
+  (user_id, generated_at, id), duplicatas (user_id, nfe_key);
+- índices simples das atividades recentes do dashboard admin e da
+  exclusão em cascata de uploads (reports.xml_upload_id).
+
+Substitui add_nfe_key_to_uploads.sql (pode rodar depois dele). Os índices
+são criados com CREATE INDEX CONCURRENTLY: a aplicação pode ficar no ar.
+Confira os planos com benchmarks/check_query_plans.py.
+"""
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+# (índice, tabela, colunas)
+INDEXES = (
+    ("ix_user_nfe_key", "xml_uploads", "user_id, nfe_key"),
+    ("ix_xml_upload_user_status_period", "xml_uploads", "user_id, status, period"),
+    ("ix_xml_upload_user_date", "xml_uploads", "user_id, upload_date, id"),
+    ("ix_xml_uploads_upload_date", "xml_uploads", "upload_date"),
+    ("ix_report_user_generated", "reports", "user_id, generated_at, id"),
+    ("ix_reports_generated_at", "reports", "generated_at"),
+    ("ix_reports_xml_upload_id", "reports", "xml_upload_id"),
+    ("ix_companies_created_at", "companies", "created_at"),
+    ("ix_products_created_at", "products", "created_at"),
+)
+
+# Uploads atualizados por transação no backfill de nfe_key
+BACKFILL_BATCH = 5000
+
+def upgrade():
+    """Add nfe_key (with backfill) and create the query indexes"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect() as conn:
+        # Check if column already exists
+        result = conn.execute(text("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = 'xml_uploads'
+            AND column_name = 'nfe_key'
+        """))
+
+        if not result.fetchone():
+            # Add column
+            conn.execute(text("""
+                ALTER TABLE xml_uploads
+                ADD COLUMN nfe_key VARCHAR(44)
+            """))
+            conn.commit()
+            print("✅ Column 'nfe_key' added to xml_uploads table")
+        else:
+            print("ℹ️  Column 'nfe_key' already exists in xml_uploads")
+
+        # Backfill a partir dos dados extraídos (lotes curtos: poucos locks por vez)
+        total = 0
+        while True:
+            result = conn.execute(text("""
+                UPDATE xml_uploads
+                SET nfe_key = nfe_documents.chave_acesso
+                FROM nfe_documents
+                WHERE nfe_documents.xml_upload_id = xml_uploads.id
+                AND xml_uploads.id IN (
+                    SELECT u.id
+                    FROM xml_uploads u
+                    JOIN nfe_documents d ON d.xml_upload_id = u.id
+                    WHERE u.nfe_key IS NULL
+                    AND d.chave_acesso IS NOT NULL
+                    LIMIT :batch
+                )
+            """), {"batch": BACKFILL_BATCH})
+            conn.commit()
+            if not result.rowcount:
+                break
+            total += result.rowcount
+            print(f"  ✓ {total} upload(s) com nfe_key preenchida")
+
+    # CONCURRENTLY não roda dentro de transação
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, table, columns in INDEXES:
+            conn.execute(text(f"""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}
+                ON {table} ({columns})
+            """))
+            print(f"✅ Index '{name}' ready on {table} ({columns})")
+
+        # Atualiza as estatísticas do planejador com os índices novos
+        for table in sorted({table for _, table, _ in INDEXES}):
+            conn.execute(text(f"ANALYZE {table}"))
+
+def downgrade():
+    """Remove the query indexes (nfe_key is kept: add_nfe_key_to_uploads.sql may own it)"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name, _, _ in INDEXES:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        print("✅ Query indexes removed")
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "downgrade":
+        downgrade()
+    else:
+        upgrade()
@@ -0,0 +1,49 @@
+"""
+Migration: Add token_version column to users table (JWT "ver" claim)
+"""
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+def upgrade():
+    """Add token_version column to users"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect() as conn:
+        # Check if column already exists
+        result = conn.execute(text("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = 'users'
+            AND column_name = 'token_version'
+        """))
+
+        if not result.fetchone():
+            # Add column
+            conn.execute(text("""
+                ALTER TABLE users
+                ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0
+            """))
+            conn.commit()
+            print("✅ Column 'token_version' added to users table")
+        else:
+            print("ℹ️  Column 'token_version' already exists")
+
+def downgrade():
+    """Remove token_version column from users"""
+    engine = create_engine(settings.database_url)
+
+    with engine.connect() as conn:
+        conn.execute(text("""
+            ALTER TABLE users
+            DROP COLUMN IF EXISTS token_version
+        """))
+        conn.commit()
+        print("✅ Column 'token_version' removed from users table")
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "downgrade":
+        downgrade()
+    else:
+        upgrade()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Backfill de nfe_documents/nfe_items a partir dos arquivos já enviados.
+Parseia os XMLs/PDFs já enviados (file store local ou S3; uploads antigos em
+file_path) e grava os dados extraídos, para que os relatórios deixem de
+re-parsear os arquivos.
+
+Também re-extrai uploads gravados por uma versão antiga do NFeProcessor
+(coluna parser_version).
+
+Usage:
+    python scripts/backfill_nfe_documents.py                  # apenas pendentes/desatualizados
+    python scripts/backfill_nfe_documents.py --all            # re-extrai todos os uploads
+    python scripts/backfill_nfe_documents.py --batch-size 500
+"""
+import argparse
+import os
+import sys
+from contextlib import ExitStack
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import or_
+
+from app import models
+from app.database import SessionLocal, init_db
+from app.utils.batch_parser import parse_files, shutdown_parse_pool
+from app.utils.file_store import upload_file_exists, upload_local_path
+from app.utils.nfe_processor import NFeProcessor
+from app.utils.nfe_store import persist_nfe_data
+
+
+def backfill(batch_size: int = 200, reextract_all: bool = False):
+    """Processa uploads em lotes ordenados por id (keyset)."""
+    init_db()
+    db = SessionLocal()
+
+    stats = {"processed": 0, "missing_file": 0, "errors": 0}
+    last_id = 0
+
+    try:
+        while True:
+            query = db.query(models.XMLUpload).outerjoin(
+                models.NFeDocument,
+                models.NFeDocument.xml_upload_id == models.XMLUpload.id
+            ).filter(
+                models.XMLUpload.id > last_id,
+                models.XMLUpload.status == "processed"
+            )
+
+            if not reextract_all:
+                query = query.filter(or_(
+                    models.NFeDocument.id.is_(None),
+                    models.NFeDocument.parser_version != NFeProcessor.PARSER_VERSION
+                ))
+
+            uploads = query.order_by(models.XMLUpload.id).limit(batch_size).all()
+            if not uploads:
+                break
+
+            available = []
+            for upload in uploads:
+                if upload_file_exists(upload):
+                    available.append(upload)
+                else:
+                    stats["missing_file"] += 1
+                    print(f"  ⚠️  Arquivo não encontrado: upload {upload.id} ({upload.content_sha256 or upload.file_path})")
+
+            # Parsing do lote em paralelo (pool de processos); objetos remotos
+            # ficam em cópia local temporária até o fim do parsing
+            with ExitStack() as stack:
+                paths = [stack.enter_context(upload_local_path(upload)) for upload in available]
+                results = parse_files(paths)
+            for upload, nfe_data in zip(available, results):
+                if nfe_data is None:
+                    stats["errors"] += 1
+                else:
+                    persist_nfe_data(db, upload, nfe_data)
+                    stats["processed"] += 1
+
+            db.commit()
+            last_id = uploads[-1].id
+            print(f"  ✓ Lote concluído até upload {last_id} ({stats['processed']} extraídos)")
+
+    finally:
+        db.close()
+        shutdown_parse_pool()
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill de dados extraídos de NF-e")
+    parser.add_argument("--batch-size", type=int, default=200, help="Uploads por transação")
+    parser.add_argument("--all", action="store_true", help="Re-extrai todos os uploads")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"  BACKFILL NF-e (parser v{NFeProcessor.PARSER_VERSION})")
+    print("=" * 70)
+
+    stats = backfill(batch_size=args.batch_size, reextract_all=args.all)
+
+    print()
+    print(f"✅ Extraídos: {stats['processed']}")
+    print(f"⚠️  Arquivos ausentes: {stats['missing_file']}")
+    print(f"❌ Falhas de extração: {stats['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Comprime (zstd/gzip) os arquivos gravados antes da compressão transparente.
+
+- Objetos do file store sem stored_size: regravados comprimidos na mesma
+  chave (SHA-256 do conteúdo original);
+- uploads antigos (só file_path, em uploads/user_*): comprimidos no
+  próprio arquivo.
+
+Leitores detectam o codec pelo conteúdo, então a troca é transparente e o
+script pode rodar com a aplicação no ar. PDFs e ZIPs ficam como estão.
+Grava a taxa de compressão de cada upload e informa o espaço economizado.
+
+Usage:
+    python scripts/compress_uploads.py                 # codec de FILE_STORE_COMPRESSION
+    python scripts/compress_uploads.py --codec gzip
+    python scripts/compress_uploads.py --batch-size 500
+"""
+import argparse
+import os
+import sys
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import models
+from app.database import SessionLocal, init_db
+from app.utils.compression import CODECS, compress_file, configured_codec
+from app.utils.file_store import compression_ratio, file_store
+
+
+def _new_stats() -> dict:
+    return {"compressed": 0, "skipped": 0, "missing_file": 0, "original_bytes": 0, "stored_bytes": 0}
+
+
+def _account(stats: dict, size: int, stored_size: int):
+    stats["original_bytes"] += size
+    stats["stored_bytes"] += stored_size
+    if stored_size < size:
+        stats["compressed"] += 1
+    else:
+        stats["skipped"] += 1
+
+
+def compress_store_objects(db, codec: str, batch_size: int) -> dict:
+    """Objetos do file store anteriores à compressão (stored_size nulo)."""
+    stats = _new_stats()
+    last_sha = ""
+
+    while True:
+        # Só objetos em uso: os sem referência podem estar sendo apagados
+        blobs = db.query(models.StoredBlob).filter(
+            models.StoredBlob.sha256 > last_sha,
+            models.StoredBlob.stored_size.is_(None),
+            models.StoredBlob.ref_count > 0
+        ).order_by(models.StoredBlob.sha256).limit(batch_size).all()
+        if not blobs:
+            break
+
+        for blob in blobs:
+            try:
+                spooled = file_store.recompress(blob.sha256, codec)
+            except FileNotFoundError:
+                stats["missing_file"] += 1
+                print(f"  ⚠️  Objeto não encontrado: {file_store.uri(blob.sha256)}")
+                continue
+
+            # None: PDF/ZIP ou sem ganho, objeto mantido como está
+            blob.stored_size = spooled.stored_size if spooled else blob.size
+            blob.codec = spooled.codec if spooled else None
+            _account(stats, blob.size, blob.stored_size)
+
+            db.query(models.XMLUpload).filter(
+                models.XMLUpload.content_sha256 == blob.sha256
+            ).update({
+                models.XMLUpload.compression_ratio: compression_ratio(blob.size, blob.stored_size)
+            }, synchronize_session=False)
+
+        db.commit()
+        last_sha = blobs[-1].sha256
+        print(f"  ✓ {stats['compressed'] + stats['skipped']} objeto(s) verificado(s)")
+
+    return stats
+
+
+def compress_legacy_uploads(db, codec: str, batch_size: int) -> dict:
+    """Uploads anteriores ao file store: arquivo em file_path comprimido no lugar."""
+    stats = _new_stats()
+    last_id = 0
+
+    while True:
+        uploads = db.query(models.XMLUpload).filter(
+            models.XMLUpload.id > last_id,
+            models.XMLUpload.content_sha256.is_(None),
+            models.XMLUpload.compression_ratio.is_(None)
+        ).order_by(models.XMLUpload.id).limit(batch_size).all()
+        if not uploads:
+            break
+
+        for upload in uploads:
+            if not upload.file_path or not os.path.isfile(upload.file_path):
+                stats["missing_file"] += 1
+                print(f"  ⚠️  Arquivo não encontrado: upload {upload.id} ({upload.file_path})")
+                continue
+
+            size = os.path.getsize(upload.file_path)
+            result = compress_file(upload.file_path, codec)
+            if result:
+                size, stored_size = result
+            else:
+                stored_size = size
+
+            _account(stats, size, stored_size)
+            upload.compression_ratio = compression_ratio(size, stored_size)
+
+        db.commit()
+        last_id = uploads[-1].id
+        print(f"  ✓ Lote concluído até upload {last_id}")
+
+    return stats
+
+
+def _report(title: str, stats: dict):
+    original, stored = stats["original_bytes"], stats["stored_bytes"]
+    saved = original - stored
+    ratio = compression_ratio(original, stored) or 1.0
+    print()
+    print(f"{title}")
+    print(f"  ✅ Comprimidos: {stats['compressed']}")
+    print(f"  ℹ️  Mantidos como estão: {stats['skipped']}")
+    print(f"  ⚠️  Arquivos ausentes: {stats['missing_file']}")
+    print(f"  💾 {original / 1024 / 1024:.1f}MB -> {stored / 1024 / 1024:.1f}MB "
+          f"(economia de {saved / 1024 / 1024:.1f}MB, taxa {ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressão dos arquivos já armazenados")
+    parser.add_argument("--codec", choices=CODECS, help="Padrão: FILE_STORE_COMPRESSION")
+    parser.add_argument("--batch-size", type=int, default=200, help="Arquivos por transação")
+    args = parser.parse_args()
+
+    codec = args.codec or configured_codec()
+    if not codec:
+        parser.error("FILE_STORE_COMPRESSION=none: informe --codec")
+
+    print("=" * 70)
+    print(f"  COMPRESSÃO DOS ARQUIVOS ({codec})")
+    print("=" * 70)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        store_stats = compress_store_objects(db, codec, args.batch_size)
+        legacy_stats = compress_legacy_uploads(db, codec, args.batch_size)
+    finally:
+        db.close()
+
+    _report("File store:", store_stats)
+    _report("Uploads antigos (file_path):", legacy_stats)
+
+
+if __name__ == "__main__":
+    main()
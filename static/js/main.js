@@ -5,8 +5,30 @@
 // Configuração global
 const API_BASE = '';
 
+// Renova a sessão com o refresh token (sem senha). true se conseguiu
+async function refreshSession() {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) return false;
+
+    const response = await fetch(API_BASE + '/api/admin/auth/refresh', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refresh_token: refreshToken })
+    });
+
+    if (!response.ok) {
+        localStorage.removeItem('refresh_token');
+        return false;
+    }
+
+    const data = await response.json();
+    localStorage.setItem('access_token', data.access_token);
+    localStorage.setItem('refresh_token', data.refresh_token);
+    return true;
+}
+
 // Função helper para fazer requests autenticadas
-async function apiRequest(url, options = {}) {
+async function apiRequest(url, options = {}, retried = false) {
     const token = localStorage.getItem('access_token');
 
     const defaultOptions = {
@@ -29,7 +51,12 @@ async function apiRequest(url, options = {}) {
 
     if (!response.ok) {
         if (response.status === 401) {
-            // Token inválido/expirado - redirecionar para login
+            // Token expirado: renova uma vez e repete a requisição
+            if (!retried && await refreshSession()) {
+                return apiRequest(url, options, true);
+            }
+
+            // Sessão inválida - redirecionar para login
             localStorage.removeItem('access_token');
             window.location.href = '/login.html';
             throw new Error('Sessão expirada');
@@ -44,7 +71,18 @@ async function apiRequest(url, options = {}) {
 
 // Função de logout
 function logout() {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+        // Revoga a sessão no servidor (não espera a resposta)
+        fetch(API_BASE + '/api/admin/auth/logout', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken }),
+            keepalive: true
+        });
+    }
     localStorage.removeItem('access_token');
+    localStorage.removeItem('refresh_token');
     window.location.href = '/login.html';
 }
 
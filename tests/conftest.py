@@ -0,0 +1,72 @@
+"""
+Configuração dos testes: banco SQLite temporário (antes de importar o app).
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+# Gerador de NF-e sintéticas (benchmarks/nfe_corpus.py)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+_WORK_DIR = tempfile.mkdtemp(prefix="mapa_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_WORK_DIR}/tests.db"
+os.environ["UPLOAD_DIR"] = os.path.join(_WORK_DIR, "uploads")
+os.environ.setdefault("SECRET_KEY", "tests")
+
+import pytest
+
+from app.database import init_db
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """Tabelas criadas uma vez para a sessão de testes."""
+    assert init_db()
+
+
+@pytest.fixture
+def client():
+    """TestClient da API, sem rate limit durante o teste."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app, limiter as app_limiter
+    from app.routers import admin, user
+
+    limiters = (app_limiter, admin.limiter, user.limiter)
+    for limiter in limiters:
+        limiter.enabled = False
+    try:
+        yield TestClient(app)
+    finally:
+        for limiter in limiters:
+            limiter.enabled = True
+
+
+@pytest.fixture
+def make_user():
+    """Cria um usuário e retorna (id, cabeçalhos com token de acesso válido)."""
+    import uuid
+
+    from app import auth, models
+    from app.database import SessionLocal
+
+    def create(is_admin: bool = False, password: str = "x"):
+        db = SessionLocal()
+        try:
+            user = models.User(
+                email=f"{uuid.uuid4().hex}@example.com",
+                hashed_password=password,
+                full_name="Teste",
+                is_active=True,
+                is_admin=is_admin
+            )
+            db.add(user)
+            db.commit()
+            return user.id, {"Authorization": f"Bearer {auth.create_user_token(user)}"}
+        finally:
+            db.close()
+
+    return create
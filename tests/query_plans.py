@@ -0,0 +1,402 @@
+"""
+Verificação dos planos de execução das consultas das rotas (EXPLAIN).
+
+Popula o banco com vários usuários (inserção em massa) e, para um deles,
+chama as rotas de usuário e admin pela API (httpx.ASGITransport). Todas as
+consultas enviadas ao banco pelos engines síncrono e assíncrono são
+capturadas (before_cursor_execute) e repetidas com EXPLAIN:
+
+- SQLite: EXPLAIN QUERY PLAN; falha em "SCAN <tabela>" sem índice
+  (varredura completa) de uma tabela grande;
+- PostgreSQL: EXPLAIN com enable_seqscan=off (o planejador só escolhe
+  Seq Scan se nenhum índice serve); falha em "Seq Scan on <tabela>" de
+  uma tabela grande.
+
+Ordenações sem índice (USE TEMP B-TREE / Sort) são apenas avisos (no
+SQLite, a paginação ordena por julianday(data) e sempre ordena à parte).
+
+Usado por tests/test_query_plans.py (SQLite temporário) e por
+benchmarks/check_query_plans.py (CLI, inclusive contra PostgreSQL).
+Requer o diretório benchmarks/ no sys.path (nfe_corpus).
+"""
+
+import io
+import random
+import re
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import httpx
+
+from nfe_corpus import EMITENTES, PRODUTOS, generate_nfe
+
+# Tabelas que crescem com o uso: varredura completa reprova a consulta
+BIG_TABLES = {
+    "xml_uploads", "nfe_documents", "nfe_items", "report_facts", "reports",
+    "companies", "products", "upload_batches", "jobs", "stored_blobs",
+}
+
+_EMAIL = "plans@example.com"
+_ADMIN_EMAIL = "plans-admin@example.com"
+
+# Inserção em blocos (executemany)
+_INSERT_CHUNK = 5000
+
+# Varredura sem índice ("SCAN t USING INDEX" é percurso ordenado pelo índice)
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+_POSTGRES_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+class QueryLog:
+    """Consultas distintas enviadas ao banco, com as rotas que as geraram."""
+
+    def __init__(self):
+        self.route = None
+        self.queries = OrderedDict()
+
+    def listen(self, engine, name: str):
+        from sqlalchemy import event
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _capture(conn, cursor, statement, parameters, context, executemany):
+            if self.route is None or executemany:
+                return
+            if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+                return
+            entry = self.queries.setdefault((name, statement), {"parameters": parameters, "routes": []})
+            if self.route not in entry["routes"]:
+                entry["routes"].append(self.route)
+
+
+def _table_name(name: str) -> str:
+    """Nome da tabela a partir do alias do SQLAlchemy (xml_uploads_1 -> xml_uploads)."""
+    return re.sub(r"_\d+$", "", name)
+
+
+def sqlite_plan(conn, statement: str, parameters):
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    lines = [row[3] for row in rows]
+    scans = {_table_name(m.group(1)) for line in lines if (m := _SQLITE_SCAN.match(line))}
+    sorts = [line for line in lines if "TEMP B-TREE" in line]
+    return lines, scans & BIG_TABLES, sorts
+
+
+def postgres_lines(rows) -> tuple:
+    lines = [row[0] for row in rows]
+    scans = {_table_name(m.group(1)) for line in lines for m in _POSTGRES_SEQ_SCAN.finditer(line)}
+    sorts = [line.strip() for line in lines if line.strip().startswith("->  Sort") or line.startswith("Sort")]
+    return lines, scans & BIG_TABLES, sorts
+
+
+def seed(users: int, uploads: int, reports: int):
+    """Usuários com catálogo, uploads, documentos, itens, fatos e relatórios (core insert)."""
+    from sqlalchemy import insert, text
+
+    from app import models
+    from app.database import SessionLocal
+    from app.utils.dashboard_stats import rebuild_counters
+
+    db = SessionLocal()
+    try:
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for n_user in range(users):
+            user_row = models.User(
+                email=f"seed{n_user:04d}@example.com",
+                hashed_password="x",
+                full_name=f"Seed {n_user}",
+                company_name="Seed",
+                is_active=n_user % 7 != 0,
+            )
+            db.add(user_row)
+            db.flush()
+
+            companies = []
+            for n_company, (cnpj, razao_social, _) in enumerate(EMITENTES):
+                company = models.Company(
+                    user_id=user_row.id, company_name=razao_social, mapa_registration=f"PR-{n_company:05d}"
+                )
+                company.products = [
+                    models.Product(product_name=descricao, mapa_registration=f"6.{n_product:06d}")
+                    for n_product, (descricao, _, _) in enumerate(PRODUTOS)
+                ]
+                companies.append(company)
+            db.add_all(companies)
+            db.flush()
+
+            upload_rows = [
+                {
+                    "user_id": user_row.id,
+                    "filename": f"nfe_{n_user:04d}_{i:06d}.xml",
+                    "file_path": f"/dev/null/nfe_{n_user:04d}_{i:06d}.xml",
+                    "upload_date": start + timedelta(minutes=i),
+                    "period": f"Q{i % 4 + 1}-2025",
+                    "nfe_key": f"{n_user:04d}{i:040d}",
+                    "status": "processed" if i % 10 else "error",
+                }
+                for i in range(uploads)
+            ]
+            for offset in range(0, len(upload_rows), _INSERT_CHUNK):
+                db.execute(insert(models.XMLUpload), upload_rows[offset:offset + _INSERT_CHUNK])
+
+            upload_ids = [row[0] for row in db.query(models.XMLUpload.id).filter(
+                models.XMLUpload.user_id == user_row.id
+            ).order_by(models.XMLUpload.id)]
+            db.execute(insert(models.NFeDocument), [
+                {
+                    "xml_upload_id": upload_id,
+                    "parser_version": 0,
+                    "chave_acesso": f"{n_user:04d}{i:040d}",
+                    "numero_nota": str(upload_id),
+                    "emitente_razao_social": EMITENTES[upload_id % len(EMITENTES)][1],
+                    "emitente_uf": "PR",
+                }
+                for i, upload_id in enumerate(upload_ids)
+            ])
+            db.execute(insert(models.ReportFact), [
+                {
+                    "user_id": user_row.id,
+                    "xml_upload_id": upload_id,
+                    "period": f"Q{i % 4 + 1}-2025",
+                    "position": 0,
+                    "company_name": EMITENTES[upload_id % len(EMITENTES)][1],
+                    "product_name": PRODUTOS[upload_id % len(PRODUTOS)][0],
+                    "quantity_mg": 1_000_000,
+                }
+                for i, upload_id in enumerate(upload_ids)
+            ])
+            db.execute(insert(models.Report), [
+                {
+                    "user_id": user_row.id,
+                    "report_period": f"Q{i % 4 + 1}-{2000 + i // 4}",
+                    "generated_at": start + timedelta(hours=i),
+                }
+                for i in range(reports)
+            ])
+            db.commit()
+
+        document_ids = [row[0] for row in db.query(models.NFeDocument.id)]
+        for offset in range(0, len(document_ids), _INSERT_CHUNK):
+            db.execute(insert(models.NFeItem), [
+                {"document_id": document_id, "position": 0, "descricao": PRODUTOS[0][0]}
+                for document_id in document_ids[offset:offset + _INSERT_CHUNK]
+            ])
+
+        db.add_all([
+            models.User(email=_EMAIL, hashed_password="x", full_name="Plans", company_name="Plans", is_active=True),
+            models.User(email=_ADMIN_EMAIL, hashed_password="x", full_name="Admin", is_active=True, is_admin=True),
+        ])
+        rebuild_counters(db)
+        db.commit()
+
+        # Estatísticas do planejador com os dados recém-inseridos (no SQLite,
+        # sem ANALYZE, qualquer índice utilizável é escolhido)
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("ANALYZE"))
+            db.commit()
+    finally:
+        db.close()
+
+
+def prepare(users: int, uploads: int, reports: int):
+    """Tabelas, dados, tokens (sem bcrypt) e captura das consultas. Desativa o rate limit."""
+    from app import auth
+    from app.database import async_engine, engine, init_db
+    from app.main import limiter as app_limiter
+    from app.routers import admin, user
+
+    for limiter in (app_limiter, admin.limiter, user.limiter):
+        limiter.enabled = False
+
+    init_db()
+    seed(users, uploads, reports)
+
+    log = QueryLog()
+    log.listen(engine, "sync")
+    log.listen(async_engine.sync_engine, "async")
+
+    tokens = (auth.create_access_token({"sub": _EMAIL}), auth.create_access_token({"sub": _ADMIN_EMAIL}))
+    return log, tokens
+
+
+async def exercise(client, log: QueryLog, token: str, admin_token: str):
+    """Chama as rotas de usuário e admin (o rótulo identifica a rota no relatório)."""
+    headers = {"Authorization": f"Bearer {token}"}
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+
+    async def call(label: str, method: str, url: str, admin_route: bool = False, **kwargs):
+        log.route = label
+        response = await client.request(
+            method, url, headers=admin_headers if admin_route else headers, **kwargs
+        )
+        if response.status_code >= 500:
+            raise RuntimeError(f"{label}: HTTP {response.status_code} {response.text[:200]}")
+        return response
+
+    async def walk(label: str, url: str, params: dict, admin_route: bool = False):
+        """Primeira página e a seguinte (cursor)."""
+        response = await call(label, "GET", url, admin_route, params=params)
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor:
+            await call(label + " (cursor)", "GET", url, admin_route, params=dict(params, cursor=cursor))
+
+    rng = random.Random(42)
+    notes = [generate_nfe(rng, numero=n, items=5) for n in range(1, 9)]
+
+    await call("GET /user/profile", "GET", "/api/user/profile")
+    await call("GET /user/stats", "GET", "/api/user/stats")
+
+    # Catálogo com os emitentes e produtos das notas geradas
+    company_ids = []
+    for n_company, (_, razao_social, _) in enumerate(EMITENTES):
+        response = await call("POST /user/companies", "POST", "/api/user/companies", json={
+            "company_name": razao_social, "mapa_registration": f"PR-{n_company:05d}"
+        })
+        company_ids.append(response.json()["id"])
+        for n_product, (descricao, _, _) in enumerate(PRODUTOS):
+            await call("POST /user/products", "POST", "/api/user/products", json={
+                "company_id": company_ids[-1], "product_name": descricao,
+                "mapa_registration": f"6.{n_product:06d}"
+            })
+
+    await call("GET /user/companies", "GET", "/api/user/companies")
+    await call("PATCH /user/companies/{id}", "PATCH", f"/api/user/companies/{company_ids[0]}", json={
+        "company_name": EMITENTES[0][1], "mapa_registration": "PR-99999"
+    })
+    await walk("GET /user/products", "/api/user/products", {"limit": 10})
+    await walk("GET /user/products?company_id", "/api/user/products", {"company_id": company_ids[0], "limit": 5})
+    await call("GET /user/catalog", "GET", "/api/user/catalog")
+
+    # Uploads: direto, preview + confirmação (com duplicata) e lote
+    upload_ids = []
+    for note in notes[:3]:
+        response = await call("POST /user/upload", "POST", "/api/user/upload",
+                              files={"file": ("nota.xml", note.xml, "text/xml")})
+        upload_ids.append(response.json()["id"])
+
+    preview = (await call("POST /user/upload-preview", "POST", "/api/user/upload-preview",
+                          files={"file": ("nota.xml", notes[3].xml, "text/xml")})).json()
+    confirm = {
+        "temp_file_path": preview["temp_file_path"],
+        "filename": "nota.xml",
+        "nfe_data": preview.get("nfe_data"),
+    }
+    await call("POST /user/upload-confirm", "POST", "/api/user/upload-confirm", json=confirm)
+    await call("POST /user/upload-confirm (duplicata)", "POST", "/api/user/upload-confirm", json=confirm)
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for n, note in enumerate(notes[2:]):
+            zf.writestr(f"nfe_{n:02d}.xml", note.xml)
+    response = await call("POST /user/upload-batch", "POST", "/api/user/upload-batch",
+                          files={"file": ("lote.zip", archive.getvalue(), "application/zip")})
+    await call("GET /user/upload-batch/{id}", "GET", f"/api/user/upload-batch/{response.json()['job_id']}")
+
+    await walk("GET /user/uploads", "/api/user/uploads", {"limit": 3})
+    await walk("GET /user/uploads?status", "/api/user/uploads", {"status": "processed", "limit": 3})
+    await walk("GET /user/uploads?period", "/api/user/uploads", {"period": "Q3-2025", "limit": 3})
+    await call("GET /user/uploads/{id}", "GET", f"/api/user/uploads/{upload_ids[0]}")
+    await call("PUT /user/uploads/{id}", "PUT", f"/api/user/uploads/{upload_ids[0]}", json={})
+    await call("GET /user/stats (com dados)", "GET", "/api/user/stats")
+
+    # Relatórios
+    await call("POST /user/generate-report", "POST", "/api/user/generate-report", json={"period": "Q3-2025"})
+    await call("POST /user/generate-report", "POST", "/api/user/generate-report", json={"period": "Q3-2025"})
+    await call("GET /user/reports/{period}/download", "GET", "/api/user/reports/Q3-2025/download")
+    await walk("GET /user/reports", "/api/user/reports", {"limit": 1})
+    await walk("GET /user/reports?period", "/api/user/reports", {"period": "Q3-2025", "limit": 1})
+    response = await call("POST /user/jobs", "POST", "/api/user/jobs", json={"kind": "report", "period": "Q3-2025"})
+    job_id = response.json()["job_id"]
+    await call("GET /user/jobs/{id}", "GET", f"/api/user/jobs/{job_id}")
+    await call("GET /user/jobs/{id}/artifact", "GET", f"/api/user/jobs/{job_id}/artifact")
+
+    # Exclusões
+    report_id = (await call("GET /user/reports", "GET", "/api/user/reports")).json()[0]["id"]
+    await call("DELETE /user/reports/{id}", "DELETE", f"/api/user/reports/{report_id}")
+    await call("DELETE /user/uploads/{id}", "DELETE", f"/api/user/uploads/{upload_ids[0]}")
+    products = (await call("GET /user/products", "GET", "/api/user/products", params={"limit": 1})).json()
+    await call("DELETE /user/products/{id}", "DELETE", f"/api/user/products/{products[0]['id']}")
+    await call("DELETE /user/companies/{id}", "DELETE", f"/api/user/companies/{company_ids[-1]}")
+
+    # Admin
+    await call("GET /admin/me", "GET", "/api/admin/me", admin_route=True)
+    await call("GET /admin/dashboard-stats", "GET", "/api/admin/dashboard-stats", admin_route=True)
+    await walk("GET /admin/users", "/api/admin/users", {"limit": 5}, admin_route=True)
+    await walk("GET /admin/users?is_active", "/api/admin/users", {"is_active": "true", "limit": 5}, admin_route=True)
+    users = (await call("GET /admin/users", "GET", "/api/admin/users", admin_route=True,
+                        params={"is_active": "false"})).json()
+    await call("GET /admin/users/{id}", "GET", f"/api/admin/users/{users[-1]['id']}", admin_route=True)
+    await call("DELETE /admin/users/{id}", "DELETE", f"/api/admin/users/{users[-1]['id']}", admin_route=True)
+    await call("GET /admin/parse-cache", "GET", "/api/admin/parse-cache", admin_route=True)
+
+    log.route = None
+
+
+@dataclass
+class PlanResult:
+    """Plano de uma consulta capturada."""
+    routes: List[str]
+    statement: str
+    lines: List[str]
+    scans: set  # tabelas grandes varridas por completo
+    sorts: List[str]
+
+
+async def explain(log: QueryLog) -> List[PlanResult]:
+    """EXPLAIN de cada consulta capturada, no dialeto do banco configurado."""
+    from app.database import async_engine, engine
+
+    dialect = engine.dialect.name
+    results = []
+
+    with engine.connect() as sync_conn:
+        async with async_engine.connect() as async_conn:
+            if dialect == "postgresql":
+                sync_conn.exec_driver_sql("SET enable_seqscan = off")
+                await async_conn.exec_driver_sql("SET enable_seqscan = off")
+
+            for (name, statement), entry in log.queries.items():
+                parameters = entry["parameters"]
+                if dialect == "postgresql":
+                    # Cada engine repete a consulta no próprio driver (paramstyle)
+                    if name == "async":
+                        rows = (await async_conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)).all()
+                    else:
+                        rows = sync_conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+                    lines, scans, sorts = postgres_lines(rows)
+                else:
+                    lines, scans, sorts = sqlite_plan(sync_conn, statement, parameters)
+
+                results.append(PlanResult(entry["routes"], statement, lines, scans, sorts))
+
+            await async_conn.rollback()
+        sync_conn.rollback()
+
+    return results
+
+
+def format_plan(result: PlanResult) -> str:
+    """Rotas, consulta (abreviada) e plano, para relatório de falhas."""
+    return "\n".join(
+        [", ".join(result.routes), "      " + " ".join(result.statement.split())[:300]]
+        + [f"        {line}" for line in result.lines]
+    )
+
+
+async def check_plans(users: int, uploads: int, reports: int) -> List[PlanResult]:
+    """Popula o banco, percorre as rotas e retorna o plano de cada consulta capturada."""
+    from app.database import dispose_async_engine
+    from app.main import app
+
+    log, (token, admin_token) = prepare(users, uploads, reports)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://plans", timeout=600) as client:
+        await exercise(client, log, token, admin_token)
+
+    try:
+        return await explain(log)
+    finally:
+        await dispose_async_engine()
@@ -0,0 +1,140 @@
+"""
+Upload em lote (ZipBatchImporter): guardas por arquivo (zip bomb, senha),
+limite do conteúdo descompactado e deduplicação no ZIP e contra uploads
+já existentes.
+"""
+
+import io
+import random
+import struct
+import zipfile
+
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from nfe_corpus import generate_nfe
+
+
+def _zip(*members, encrypted=()) -> bytes:
+    """
+    ZIP em memória com membros (nome, bytes). Nomes em `encrypted` recebem o
+    bit de criptografia nos cabeçalhos (zipfile não grava ZIP com senha).
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+        infos = [info for info in archive.infolist() if info.filename in encrypted]
+        central_offset = archive.start_dir
+
+    payload = bytearray(buffer.getvalue())
+    for info in infos:
+        # Cabeçalho local: flags no byte 6
+        _set_encrypted(payload, info.header_offset + 6)
+    position = payload.find(b"PK\x01\x02", central_offset)
+    while position != -1:
+        # Diretório central: flags no byte 8, nome a partir do byte 46
+        name_length = struct.unpack_from("<H", payload, position + 28)[0]
+        name = bytes(payload[position + 46:position + 46 + name_length]).decode()
+        if name in encrypted:
+            _set_encrypted(payload, position + 8)
+        position = payload.find(b"PK\x01\x02", position + 46 + name_length)
+    return bytes(payload)
+
+
+def _set_encrypted(payload: bytearray, offset: int):
+    flags = struct.unpack_from("<H", payload, offset)[0]
+    struct.pack_into("<H", payload, offset, flags | 0x1)
+
+
+def _post(client, headers, payload: bytes):
+    return client.post(
+        "/api/user/upload-batch", headers=headers,
+        files={"file": ("lote.zip", payload, "application/zip")}
+    )
+
+
+def _statuses(body) -> list:
+    return [(result["filename"], result["status"]) for result in body["results"]]
+
+
+def test_duplicates_within_batch_and_against_existing_uploads(client, make_user):
+    _, headers = make_user()
+    rng = random.Random(10)
+    existing, repeated, fresh = (generate_nfe(rng, numero=numero, items=2) for numero in (1, 2, 3))
+
+    response = client.post("/api/user/upload", headers=headers, files={"file": ("nota.xml", existing.xml, "text/xml")})
+    assert response.status_code == 201, response.text
+
+    response = _post(client, headers, _zip(
+        ("a.xml", repeated.xml),
+        ("b.xml", existing.xml),
+        ("c.xml", repeated.xml),
+        ("d.xml", fresh.xml),
+    ))
+    assert response.status_code == 201, response.text
+    body = response.json()
+
+    assert body["status"] == "completed"
+    assert (body["total_files"], body["created"], body["duplicates"], body["errors"]) == (4, 2, 2, 0)
+    assert _statuses(body) == [
+        ("a.xml", "created"), ("b.xml", "duplicate"), ("c.xml", "duplicate"), ("d.xml", "created")
+    ]
+    assert [result["chave_acesso"] for result in body["results"]] == [
+        repeated.chave_acesso, existing.chave_acesso, repeated.chave_acesso, fresh.chave_acesso
+    ]
+    assert body["results"][1]["message"] == "NF-e já importada"
+    assert body["results"][0]["upload_id"] and body["results"][1]["upload_id"] is None
+
+    # Reimportar o mesmo ZIP não cria nada
+    body = _post(client, headers, _zip(("a.xml", repeated.xml), ("d.xml", fresh.xml))).json()
+    assert (body["status"], body["created"], body["duplicates"]) == ("completed", 0, 2)
+
+
+def test_zip_bomb_and_password_protected_members_are_rejected(client, make_user):
+    _, headers = make_user()
+    rng = random.Random(11)
+    protected, nfe = generate_nfe(rng, numero=1, items=1), generate_nfe(rng, numero=2, items=1)
+
+    bomb = b"<nfeProc>" + b"0" * (2 * 1024 * 1024) + b"</nfeProc>"
+
+    response = _post(client, headers, _zip(
+        ("bomba.xml", bomb),
+        ("senha.xml", protected.xml),
+        ("nota.xml", nfe.xml),
+        encrypted={"senha.xml"},
+    ))
+    assert response.status_code == 201, response.text
+    body = response.json()
+
+    # Membros suspeitos viram erro por arquivo; o restante do lote segue
+    assert body["status"] == "completed"
+    assert (body["created"], body["duplicates"], body["errors"]) == (1, 0, 2)
+    assert _statuses(body) == [("bomba.xml", "error"), ("senha.xml", "error"), ("nota.xml", "created")]
+    assert "zip bomb" in body["results"][0]["message"]
+    assert body["results"][1]["message"] == "Arquivo protegido por senha"
+
+
+def test_total_size_limit_fails_the_job(client, make_user, monkeypatch):
+    user_id, headers = make_user()
+    rng = random.Random(12)
+    first, second = generate_nfe(rng, numero=1, items=1), generate_nfe(rng, numero=2, items=1)
+    monkeypatch.setattr(settings, "batch_max_total_size", len(first.xml) + len(second.xml) // 2)
+
+    response = _post(client, headers, _zip(("a.xml", first.xml), ("b.xml", second.xml)))
+    assert response.status_code == 400
+    assert "excede o limite" in response.json()["detail"]
+
+    db = SessionLocal()
+    try:
+        job = db.query(models.UploadBatch).filter(models.UploadBatch.user_id == user_id).one()
+        assert db.query(models.XMLUpload).filter(models.XMLUpload.user_id == user_id).count() == 0
+        job_id = job.id
+    finally:
+        db.close()
+
+    # O job fica registrado como falho, sem criar uploads
+    body = client.get(f"/api/user/upload-batch/{job_id}", headers=headers).json()
+    assert body["status"] == "failed"
+    assert "excede o limite" in body["error_message"]
+    assert body["created"] == 0
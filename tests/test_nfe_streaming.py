@@ -0,0 +1,65 @@
+"""
+Modo streaming do NFeProcessor (iterparse e NFeFeedParser) x modo árvore:
+o mesmo XML deve produzir o mesmo NFeData, inclusive produtos, nutrientes
+e registro MAPA.
+"""
+
+import random
+
+import pytest
+
+from app.config import settings
+from app.utils.nfe_processor import NFeFeedParser, NFeProcessor
+from nfe_corpus import generate_nfe
+
+# Notas geradas: de 1 item a várias centenas, infAdProd curto e longo
+_CORPUS = [
+    generate_nfe(random.Random(seed), numero=seed + 1, items=items, info_size=info_size)
+    for seed, (items, info_size) in enumerate(
+        [(1, 60), (3, 120), (10, 400), (40, 120), (250, 80), (5, 2000)] * 5
+    )
+]
+
+
+def _parse(processor: NFeProcessor, monkeypatch, xml: bytes, threshold: int):
+    monkeypatch.setattr(settings, "xml_streaming_threshold", threshold)
+    return processor.process_xml_bytes(xml)
+
+
+@pytest.mark.parametrize("nfe", _CORPUS, ids=lambda nfe: f"{nfe.numero_nota}-{nfe.items}itens")
+def test_streaming_matches_tree(nfe, monkeypatch, tmp_path):
+    processor = NFeProcessor()
+
+    tree = _parse(processor, monkeypatch, nfe.xml, threshold=1 << 30)
+    streaming = _parse(processor, monkeypatch, nfe.xml, threshold=0)
+
+    # Sanidade: o extrator do modo árvore achou os dados da nota gerada
+    assert tree.chave_acesso == nfe.chave_acesso
+    assert [p.descricao for p in tree.produtos] == nfe.product_names
+    assert all(p.nutrientes and p.registro_mapa for p in tree.produtos)
+
+    assert streaming == tree
+    assert [p.nutrientes for p in streaming.produtos] == [p.nutrientes for p in tree.produtos]
+    assert [p.registro_mapa for p in streaming.produtos] == [p.registro_mapa for p in tree.produtos]
+
+    # Arquivo em disco (process_xml) nos dois modos
+    path = tmp_path / "nota.xml"
+    path.write_bytes(nfe.xml)
+    monkeypatch.setattr(settings, "xml_streaming_threshold", 0)
+    assert processor.process_xml(str(path)) == tree
+    monkeypatch.setattr(settings, "xml_streaming_threshold", 1 << 30)
+    assert processor.process_xml(str(path)) == tree
+
+
+@pytest.mark.parametrize("chunk_size", [7, 4096])
+def test_feed_parser_matches_tree(chunk_size, monkeypatch):
+    processor = NFeProcessor()
+    monkeypatch.setattr(settings, "xml_streaming_threshold", 1 << 30)
+
+    for nfe in _CORPUS[:12]:
+        parser = NFeFeedParser(processor)
+        for offset in range(0, len(nfe.xml), chunk_size):
+            parser.feed(nfe.xml[offset:offset + chunk_size])
+
+        assert parser.found_nfe
+        assert parser.close() == processor.process_xml_bytes(nfe.xml)
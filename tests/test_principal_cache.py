@@ -0,0 +1,136 @@
+"""
+Cache de usuários autenticados (app/utils/principal_cache.py): alterações
+feitas pelas rotas de admin e pela troca de senha valem na próxima
+requisição, mesmo com o principal em cache.
+"""
+
+import time
+
+from app import auth, models
+from app.database import SessionLocal
+from app.utils.principal_cache import Principal, PrincipalCache
+
+PASSWORD = "Senha@Forte12345"
+
+
+def _email(user_id: int) -> str:
+    db = SessionLocal()
+    try:
+        return db.get(models.User, user_id).email
+    finally:
+        db.close()
+
+
+def _cached(user_id: int):
+    """Principal em cache do usuário (None se não houver)."""
+    principal, _ = auth.principal_cache.get(_email(user_id))
+    return principal
+
+
+def _authenticate(client, headers, user_id: int):
+    """Requisição autenticada que deixa o principal em cache."""
+    assert client.get("/api/user/profile", headers=headers).status_code == 200
+    assert _cached(user_id) is not None
+
+
+def test_deactivation_rejects_cached_principal(client, make_user):
+    _, admin_headers = make_user(is_admin=True)
+    user_id, headers = make_user()
+    _authenticate(client, headers, user_id)
+
+    response = client.patch(f"/api/admin/users/{user_id}", headers=admin_headers, json={"is_active": False})
+    assert response.status_code == 200
+
+    assert client.get("/api/user/profile", headers=headers).status_code == 400
+    assert _cached(user_id).is_active is False
+
+
+def test_admin_password_change_revokes_old_token(client, make_user):
+    _, admin_headers = make_user(is_admin=True)
+    user_id, headers = make_user()
+    _authenticate(client, headers, user_id)
+
+    response = client.patch(f"/api/admin/users/{user_id}", headers=admin_headers, json={"password": PASSWORD})
+    assert response.status_code == 200
+    assert response.json()["access_token"] is None  # tokens só para o próprio admin
+
+    assert client.get("/api/user/profile", headers=headers).status_code == 401
+
+    # Novo login com a nova senha volta a autenticar
+    response = client.post("/api/admin/auth/login", data={"username": _email(user_id), "password": PASSWORD})
+    assert response.status_code == 200
+    new_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/api/user/profile", headers=new_headers).status_code == 200
+
+
+def test_own_password_change_revokes_old_token(client, make_user):
+    user_id, _ = make_user()
+    db = SessionLocal()
+    try:
+        user = db.get(models.User, user_id)
+        user.hashed_password = auth.get_password_hash(PASSWORD)
+        db.commit()
+        headers = {"Authorization": f"Bearer {auth.create_user_token(user)}"}
+    finally:
+        db.close()
+    _authenticate(client, headers, user_id)
+
+    response = client.post("/api/user/change-password", headers=headers, json={
+        "current_password": PASSWORD, "new_password": PASSWORD + "!"
+    })
+    assert response.status_code == 200, response.text
+
+    assert client.get("/api/user/profile", headers=headers).status_code == 401
+    new_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/api/user/profile", headers=new_headers).status_code == 200
+
+
+def test_role_change_applies_immediately(client, make_user):
+    _, admin_headers = make_user(is_admin=True)
+    user_id, headers = make_user(is_admin=True)
+    assert client.get("/api/admin/users", headers=headers).status_code == 200
+    assert _cached(user_id).is_admin is True
+
+    response = client.patch(f"/api/admin/users/{user_id}", headers=admin_headers, json={"is_admin": False})
+    assert response.status_code == 200
+
+    assert client.get("/api/admin/users", headers=headers).status_code == 403
+    assert _cached(user_id).is_admin is False
+
+
+def test_deleted_user_is_rejected(client, make_user):
+    _, admin_headers = make_user(is_admin=True)
+    user_id, headers = make_user()
+    _authenticate(client, headers, user_id)
+
+    assert client.delete(f"/api/admin/users/{user_id}", headers=admin_headers).status_code == 204
+    assert client.get("/api/user/profile", headers=headers).status_code == 401
+
+
+def _principal(**overrides) -> Principal:
+    values = dict(id=1, email="a@example.com", is_admin=False, is_active=True, token_version=0)
+    values.update(overrides)
+    return Principal(**values)
+
+
+def test_load_started_before_invalidation_is_not_stored():
+    cache = PrincipalCache(ttl=60, max_entries=8)
+
+    principal, generation = cache.get("a@example.com")
+    assert principal is None
+
+    # Alteração concorrente enquanto a carga do banco estava em andamento
+    cache.invalidate("a@example.com")
+    cache.put("a@example.com", _principal(), generation)
+
+    assert cache.get("a@example.com")[0] is None
+
+
+def test_entries_expire_after_ttl():
+    cache = PrincipalCache(ttl=0.05, max_entries=8)
+    _, generation = cache.get("a@example.com")
+    cache.put("a@example.com", _principal(), generation)
+    assert cache.get("a@example.com")[0] is not None
+
+    time.sleep(0.1)
+    assert cache.get("a@example.com")[0] is None
@@ -0,0 +1,22 @@
+"""
+Planos de execução das consultas das rotas (tests/query_plans.py): nenhuma
+consulta pode varrer por completo uma tabela grande.
+"""
+
+import asyncio
+
+from app.routers import admin, user
+from app.main import limiter as app_limiter
+from tests.query_plans import check_plans, format_plan
+
+
+def test_no_full_scans_on_big_tables():
+    try:
+        results = asyncio.run(check_plans(users=5, uploads=100, reports=10))
+    finally:
+        for limiter in (app_limiter, admin.limiter, user.limiter):
+            limiter.enabled = True
+
+    assert len(results) > 50
+    scans = [result for result in results if result.scans]
+    assert not scans, "Varredura completa de tabela grande:\n" + "\n".join(format_plan(r) for r in scans)
@@ -0,0 +1,112 @@
+"""
+Rotação de refresh tokens (app.auth.rotate_refresh_token): reuso de um
+token já rotacionado revoga a família inteira, sem afetar outras sessões.
+"""
+
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app import auth, models
+from app.database import AsyncSessionLocal, SessionLocal
+
+
+def _create_user() -> models.User:
+    db = SessionLocal()
+    try:
+        user = models.User(
+            email=f"{uuid.uuid4().hex}@example.com",
+            hashed_password="x",
+            full_name="Teste",
+            is_active=True
+        )
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        db.expunge(user)
+        return user
+    finally:
+        db.close()
+
+
+def _issue(user: models.User) -> str:
+    db = SessionLocal()
+    try:
+        token = auth.issue_refresh_token(db, user)
+        db.commit()
+        return token
+    finally:
+        db.close()
+
+
+def _rotate(token: str) -> str:
+    async def rotate():
+        async with AsyncSessionLocal() as db:
+            _, new_token = await auth.rotate_refresh_token(db, token)
+            return new_token
+    return asyncio.run(rotate())
+
+
+def _family_revoked(token: str) -> bool:
+    db = SessionLocal()
+    try:
+        family_id = db.query(models.RefreshToken.family_id).filter(
+            models.RefreshToken.token_hash == auth._refresh_token_hash(token)
+        ).scalar()
+        return all(
+            revoked_at is not None
+            for (revoked_at,) in db.query(models.RefreshToken.revoked_at).filter(
+                models.RefreshToken.family_id == family_id
+            )
+        )
+    finally:
+        db.close()
+
+
+def test_rotation_issues_new_token_and_consumes_old():
+    first = _issue(_create_user())
+    second = _rotate(first)
+
+    assert second != first
+    assert _rotate(second)
+
+
+def test_reuse_revokes_family():
+    user = _create_user()
+    first = _issue(user)
+    other_session = _issue(user)
+
+    second = _rotate(first)
+
+    # Token já rotacionado reapresentado: 401 e família revogada
+    with pytest.raises(HTTPException) as exc:
+        _rotate(first)
+    assert exc.value.status_code == 401
+    assert _family_revoked(first)
+
+    # O token legítimo da família também deixa de valer
+    with pytest.raises(HTTPException):
+        _rotate(second)
+
+    # Outra sessão (outra família) do mesmo usuário continua válida
+    assert not _family_revoked(other_session)
+    assert _rotate(other_session)
+
+
+def test_password_change_revokes_family():
+    user = _create_user()
+    token = _issue(user)
+
+    db = SessionLocal()
+    try:
+        auth.revoke_user_tokens(db.get(models.User, user.id))
+        db.commit()
+    finally:
+        db.close()
+
+    with pytest.raises(HTTPException) as exc:
+        _rotate(token)
+    assert exc.value.status_code == 401
+    assert _family_revoked(token)
@@ -0,0 +1,162 @@
+"""
+Cache de relatórios (app.utils.report_cache): single-flight, propagação de
+erros para quem espera e chave que muda com o catálogo e com os uploads.
+"""
+
+import random
+import threading
+import time
+
+from app import models
+from app.database import SessionLocal
+from app.utils.mapa_processor import MAPAProcessor
+from app.utils.report_cache import ReportCache, period_inputs_digest, report_cache
+from nfe_corpus import generate_nfe
+
+PERIOD = "Q3-2025"
+_THREADS = 8
+
+
+class CountingCompute:
+    """compute() que conta as chamadas e só termina quando liberado."""
+
+    def __init__(self, result=None, error: Exception = None):
+        self.calls = 0
+        self.release = threading.Event()
+        self.result = result if result is not None else {"rows": [1, 2, 3]}
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        assert self.release.wait(10)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _run_concurrently(cache: ReportCache, key, compute: CountingCompute):
+    """Dispara _THREADS chamadas com a mesma chave; libera o cálculo quando todas esperam."""
+    outcomes = [None] * _THREADS
+
+    def call(index):
+        try:
+            outcomes[index] = cache.get_or_compute(key, compute)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(_THREADS)]
+    for thread in threads:
+        thread.start()
+
+    deadline = time.monotonic() + 10
+    while cache.stats()["misses"] + cache.stats()["waits"] < _THREADS:
+        assert time.monotonic() < deadline, "chamadas não chegaram ao cache"
+        time.sleep(0.005)
+    compute.release.set()
+
+    for thread in threads:
+        thread.join(10)
+    return outcomes
+
+
+def test_concurrent_callers_compute_once():
+    cache = ReportCache(max_entries=8)
+    key = cache.make_key(1, PERIOD, 1, "digest")
+    compute = CountingCompute()
+
+    outcomes = _run_concurrently(cache, key, compute)
+
+    assert compute.calls == 1
+    assert outcomes == [compute.result] * _THREADS
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["waits"] == _THREADS - 1
+
+    # Resultado armazenado: próxima chamada é hit, e cópias são independentes
+    outcomes[0]["rows"].append(4)
+    assert cache.get_or_compute(key, CountingCompute()) == {"rows": [1, 2, 3]}
+    assert cache.stats()["hits"] == 1
+
+
+def test_error_reaches_waiting_callers_and_is_not_cached():
+    cache = ReportCache(max_entries=8)
+    key = cache.make_key(1, PERIOD, 1, "digest")
+    compute = CountingCompute(error=RuntimeError("falhou"))
+
+    outcomes = _run_concurrently(cache, key, compute)
+
+    assert compute.calls == 1
+    assert all(isinstance(outcome, RuntimeError) and str(outcome) == "falhou" for outcome in outcomes)
+
+    retry = CountingCompute()
+    retry.release.set()
+    assert cache.get_or_compute(key, retry) == retry.result
+    assert retry.calls == 1
+
+
+def test_new_key_replaces_previous_version():
+    cache = ReportCache(max_entries=8)
+    first, second = CountingCompute({"v": 1}), CountingCompute({"v": 2})
+    first.release.set()
+    second.release.set()
+
+    cache.get_or_compute(cache.make_key(1, PERIOD, 1, "a"), first)
+    assert cache.get_or_compute(cache.make_key(1, PERIOD, 2, "a"), second) == {"v": 2}
+    assert cache.stats()["entries"] == 1
+
+
+def _upload(client, headers, seed: int) -> int:
+    nfe = generate_nfe(random.Random(seed), numero=seed, items=2)
+    response = client.post("/api/user/upload", headers=headers, files={"file": ("nota.xml", nfe.xml, "text/xml")})
+    assert response.status_code == 201, response.text
+    upload_id = response.json()["id"]
+    assert client.patch(f"/api/user/uploads/{upload_id}", headers=headers, params={"period": PERIOD}).status_code == 200
+    return upload_id
+
+
+def _report(user_id: int) -> dict:
+    """Relatório do período; retorna o delta dos contadores do cache compartilhado."""
+    before = report_cache.stats()
+    db = SessionLocal()
+    try:
+        MAPAProcessor(db, user_id).report_period(PERIOD)
+    finally:
+        db.close()
+    after = report_cache.stats()
+    return {counter: after[counter] - before[counter] for counter in ("hits", "misses")}
+
+
+def test_catalog_and_uploads_change_the_key(client, make_user):
+    user_id, headers = make_user()
+    upload_id = _upload(client, headers, seed=10)
+
+    assert _report(user_id) == {"hits": 0, "misses": 1}
+    assert _report(user_id) == {"hits": 1, "misses": 0}
+
+    # Catálogo alterado (catalog_version)
+    response = client.post("/api/user/companies", headers=headers, json={
+        "company_name": "EMPRESA NOVA", "mapa_registration": "PR-12345"
+    })
+    assert response.status_code in (200, 201), response.text
+    assert _report(user_id) == {"hits": 0, "misses": 1}
+
+    # Novo upload no período
+    other_id = _upload(client, headers, seed=11)
+    assert _report(user_id) == {"hits": 0, "misses": 1}
+
+    # Upload excluído
+    assert client.delete(f"/api/user/uploads/{upload_id}", headers=headers).status_code == 204
+    assert _report(user_id) == {"hits": 0, "misses": 1}
+    assert _report(user_id) == {"hits": 1, "misses": 0}
+
+    # Conteúdo do upload trocado (content_sha256 no digest)
+    db = SessionLocal()
+    try:
+        digest = period_inputs_digest(db, user_id, PERIOD)
+        db.query(models.XMLUpload).filter(models.XMLUpload.id == other_id).update(
+            {models.XMLUpload.content_sha256: "0" * 64}
+        )
+        db.commit()
+        assert period_inputs_digest(db, user_id, PERIOD) != digest
+    finally:
+        db.close()
+    assert _report(user_id) == {"hits": 0, "misses": 1}
@@ -0,0 +1,102 @@
+"""
+Fatos de relatório (report_facts) acompanhando o ciclo de vida do upload:
+criados no upload, movidos com o período (PATCH), removidos na exclusão, e
+uploads já em dia (inclusive NF-e sem itens) fora de stale_uploads.
+"""
+
+import random
+import re
+
+from app import models
+from app.database import SessionLocal
+from app.utils.mapa_processor import MAPAProcessor
+from app.utils.report_facts import stale_uploads
+from nfe_corpus import generate_nfe
+
+PERIOD = "Q3-2025"
+
+
+def _upload(client, headers, xml: bytes) -> int:
+    response = client.post("/api/user/upload", headers=headers, files={"file": ("nota.xml", xml, "text/xml")})
+    assert response.status_code == 201, response.text
+    assert response.json()["status"] == "processed"
+    return response.json()["id"]
+
+
+def _facts(upload_id: int):
+    db = SessionLocal()
+    try:
+        return [
+            (fact.period, fact.product_name)
+            for fact in db.query(models.ReportFact).filter(
+                models.ReportFact.xml_upload_id == upload_id
+            ).order_by(models.ReportFact.position)
+        ]
+    finally:
+        db.close()
+
+
+def _stale(user_id: int):
+    db = SessionLocal()
+    try:
+        return [upload.id for upload in stale_uploads(db, user_id, PERIOD)]
+    finally:
+        db.close()
+
+
+def test_upload_patch_and_delete_keep_facts_in_sync(client, make_user):
+    user_id, headers = make_user()
+    nfe = generate_nfe(random.Random(1), numero=1, items=3)
+
+    upload_id = _upload(client, headers, nfe.xml)
+    assert _facts(upload_id) == [(None, name) for name in nfe.product_names]
+
+    response = client.patch(f"/api/user/uploads/{upload_id}", headers=headers, params={"period": PERIOD})
+    assert response.status_code == 200
+    assert _facts(upload_id) == [(PERIOD, name) for name in nfe.product_names]
+    assert _stale(user_id) == []
+
+    assert client.delete(f"/api/user/uploads/{upload_id}", headers=headers).status_code == 204
+    assert _facts(upload_id) == []
+
+
+def test_nfe_without_items_is_not_stale(client, make_user):
+    user_id, headers = make_user()
+    nfe = generate_nfe(random.Random(2), numero=2, items=1)
+    xml = re.sub(rb"<det nItem=.*?</det>", b"", nfe.xml)
+
+    upload_id = _upload(client, headers, xml)
+    client.patch(f"/api/user/uploads/{upload_id}", headers=headers, params={"period": PERIOD})
+
+    assert _facts(upload_id) == []
+    assert _stale(user_id) == []
+
+    db = SessionLocal()
+    try:
+        assert MAPAProcessor(db, user_id).refresh_period_facts(PERIOD) == 0
+    finally:
+        db.close()
+
+
+def test_missing_facts_marker_is_refreshed_once(client, make_user):
+    user_id, headers = make_user()
+    nfe = generate_nfe(random.Random(3), numero=3, items=2)
+    upload_id = _upload(client, headers, nfe.xml)
+    client.patch(f"/api/user/uploads/{upload_id}", headers=headers, params={"period": PERIOD})
+
+    # Documento gravado antes da marcação (banco migrado)
+    db = SessionLocal()
+    try:
+        db.query(models.NFeDocument).filter(
+            models.NFeDocument.xml_upload_id == upload_id
+        ).update({models.NFeDocument.facts_version: None})
+        db.commit()
+        assert _stale(user_id) == [upload_id]
+
+        assert MAPAProcessor(db, user_id).refresh_period_facts(PERIOD) == 1
+        assert MAPAProcessor(db, user_id).refresh_period_facts(PERIOD) == 0
+    finally:
+        db.close()
+
+    assert _stale(user_id) == []
+    assert _facts(upload_id) == [(PERIOD, name) for name in nfe.product_names]